@@ -0,0 +1,255 @@
+"""
+    Deterministic synthetic WiseAlpha market files.
+
+    Distributions of ratings, coupons, frequencies, countries and the other categorical columns
+    follow the shipped snapshots. The same seed and size always give the same file.
+
+        python benchmarks/market.py -n 1000000 -o /tmp/wisealpha_market_221109.csv.gz
+"""
+from __future__ import annotations
+from typing import Dict, Iterator, List
+from datetime import datetime
+import argparse
+import csv
+import sys
+from pathlib import Path
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.rating import MOODY_RATE_MAP, S_P_RATE_MAP
+from src.stream import open_output
+
+
+HEADER: List[str] = [
+    "Company", "Industry", "Ticker", "Type", "Market", "Seniority", "ISIN", "Currency", "State",
+    "Moody's", "S&P", "Fitch", "Country", "Ownership", "Maturity", "Next Payment", "Coupon Type",
+    "Coupon Frequency", "Coupon", "Current Yield", "YTM / YTC", "Price", "Available",
+]
+
+AS_OF = datetime(2022, 11, 9)
+"""Snapshot date of the generated market, maturities and payments are laid out from it."""
+
+CHUNK_SIZE = 100_000
+
+INDUSTRIES: Dict[str, float] = {
+    "Banks & Financials": 141,
+    "Energy, Utilities & Infrastructure": 57,
+    "Retail": 39,
+    "Property": 33,
+    "Entertainment, Media & Broadcasting": 33,
+    "Consumer & Food": 29,
+    "Cable & Telecoms": 15,
+    "Travel": 12,
+    "Healthcare": 12,
+    "Industrials": 12,
+    "Automotive": 9,
+    "Technology": 9,
+    "Transport": 6,
+}
+
+KINDS: Dict[tuple, float] = {
+    ("Bond", "Main Market"): 101,
+    ("Bond", "High Yield"): 24,
+    ("Perpetual", "Perpetuals"): 8,
+    ("Bond", "Special Situations"): 5,
+    ("Perpetual", "Main Market"): 3,
+    ("Loan", "Special Situations"): 2,
+}
+"""Type and market go together."""
+
+SENIORITIES: Dict[str, float] = {
+    "Unsecured": 232,
+    "Senior Secured": 126,
+    "Subordinated": 24,
+    "Unsecured, AT1": 18,
+    "Unsecured, PIK": 15,
+    "Second Lien Secured": 15,
+    "Super Senior Secured": 3,
+}
+
+CURRENCIES: Dict[str, float] = { "GBP": 394, "EUR": 36, "USD": 3 }
+
+STATES: Dict[str, float] = { "Open": 400, "Suspended": 33 }
+
+COUNTRIES: Dict[str, float] = {
+    "UK": 91,
+    "United Kingdom": 26,
+    "USA": 5,
+    "France": 3,
+    "Netherlands": 3,
+    "Spain": 3,
+    "United States": 2,
+    "Brazil": 2,
+    "Ireland": 2,
+    "India": 1,
+    "Latvia": 1,
+    "United Arab Emirates": 1,
+    "Hong Kong": 1,
+    "Germany": 1,
+}
+
+OWNERSHIPS: Dict[str, float] = {
+    "Public": 223,
+    "Private": 192,
+    "LLC": 6,
+    "Charitable Trust": 6,
+    "Trust": 3,
+    "Subsidiary": 3,
+}
+
+COUPON_TYPES: Dict[str, float] = {
+    "Fixed": 400,
+    "Payment-In-Kind": 15,
+    "Payment-In-Kind Toggle": 12,
+    "Floating": 6,
+}
+
+FREQUENCIES: Dict[str, float] = { "Biannual": 329, "Annual": 83, "Quarterly": 21 }
+
+FREQUENCY_MONTHS: Dict[str, int] = { "Annual": 12, "Biannual": 6, "Quarterly": 3 }
+
+RATING_SCORES: Dict[int, float] = {
+    3: 24, 4: 6, 5: 4, 6: 6, 7: 10, 8: 26, 9: 21, 10: 30,
+    11: 24, 12: 18, 13: 27, 14: 36, 15: 39, 16: 30, 17: 21, 18: 6, 19: 3,
+}
+"""Underlying credit quality, as a rating score, of bonds with at least one rating."""
+
+UNRATED = 0.25
+"""Share of bonds without any agency rating."""
+
+MISSING: Dict[str, float] = { "moodys": 0.2, "snp": 0.3, "fitch": 0.25 }
+"""Chance of each agency leaving a rated bond out."""
+
+FLOATING_INDEX: List[str] = ["L", "E", "S"]
+
+S_P_LETTERS: Dict[int, str] = { v: k for k, v in S_P_RATE_MAP.items() if v > 0 }
+
+MOODY_LETTERS: Dict[int, str] = { v: k for k, v in MOODY_RATE_MAP.items() if v > 0 }
+
+
+def _pick(rng: np.random.Generator, table: Dict[object, float], size: int)-> np.ndarray:
+    keys = list(table.keys())
+    weights = np.array(list(table.values()), dtype=np.float64)
+    idx = rng.choice(len(keys), size, p=weights / weights.sum())
+    values = np.empty(len(keys), dtype=object)
+    values[:] = keys
+
+    return values[idx]
+
+def _letters(rng: np.random.Generator, score: np.ndarray, letters: Dict[int, str], missing: float)-> np.ndarray:
+    """Agency rating within a notch of the underlying score, or empty when the agency did not rate."""
+    notch = np.clip(score + rng.integers(-1, 2, len(score)), 1, max(letters))
+    table = np.array([""] + [ letters.get(s, letters[max(letters)]) for s in range(1, max(letters) + 1) ], dtype=object)
+    out = table[notch]
+    out[(score == 0) | (rng.random(len(score)) < missing)] = ""
+
+    return out
+
+def _dates(days: np.ndarray)-> np.ndarray:
+    """Days after the as of date, formatted as dd-mm-yyyy by moving the characters of the ISO date."""
+    iso = np.datetime_as_string(np.datetime64(AS_OF, "D") + days.astype("timedelta64[D]"), unit="D").astype("U10")
+    chars = iso.view("U1").reshape(-1, 10)
+
+    return np.ascontiguousarray(chars[:, [8, 9, 7, 5, 6, 4, 0, 1, 2, 3]]).view("U10").reshape(-1)
+
+def _money(values: np.ndarray, decimals: int)-> np.ndarray:
+    return np.char.mod(f"%.{decimals}f", values)
+
+def chunk(rng: np.random.Generator, start: int, size: int)-> List[np.ndarray]:
+    """Columns of rows start to start + size, in the order of HEADER."""
+    row = np.arange(start, start + size)
+    issuer = rng.zipf(1.6, size) % max(size // 3, 1) + start // 3
+    company = np.char.add("Issuer ", issuer.astype(str))
+    ticker = np.char.add("SYN", np.char.zfill(row.astype(str), 8))
+    isin = np.char.add("XS", np.char.zfill(row.astype(str), 10))
+
+    kind = _pick(rng, KINDS, size)
+    bond_type = np.array([ k[0] for k in kind ], dtype=object)
+    market = np.array([ k[1] for k in kind ], dtype=object)
+
+    score = _pick(rng, RATING_SCORES, size).astype(np.int64)
+    score[rng.random(size) < UNRATED] = 0
+    moodys = _letters(rng, score, MOODY_LETTERS, MISSING["moodys"])
+    snp = _letters(rng, score, S_P_LETTERS, MISSING["snp"])
+    fitch = _letters(rng, score, S_P_LETTERS, MISSING["fitch"])
+
+    # Weaker credits pay more, and trade further from par.
+    quality = np.where(score == 0, 14, score)
+    coupon = np.round((1.5 + quality * 0.45 + rng.normal(0, 1.0, size)).clip(0.5, 15) * 8) / 8
+    coupon_type = _pick(rng, COUPON_TYPES, size)
+    floating = coupon_type == "Floating"
+    coupon_text = np.char.add(np.char.mod("%g", coupon), "%")
+    index = np.array(FLOATING_INDEX, dtype=object)[rng.integers(0, len(FLOATING_INDEX), size)]
+    coupon_text = np.where(floating, np.char.add(np.char.add(index.astype(str), "+"), coupon_text), coupon_text)
+
+    frequency = _pick(rng, FREQUENCIES, size)
+    months = np.array([ FREQUENCY_MONTHS[f] for f in frequency ])
+    maturity_days = rng.integers(-30, 30 * 365, size)
+    maturity_days = np.where(bond_type == "Perpetual", maturity_days + 20 * 365, maturity_days)
+    # Next payment is a whole number of periods before maturity, within one period of the as of date.
+    periods = np.maximum(maturity_days // (months * 30), 0)
+    next_days = np.where(periods > 0, maturity_days - periods * months * 30, maturity_days)
+    next_days = np.clip(next_days, 1, None)
+
+    price = np.round((100 - (quality - 8).clip(0, None) * 1.8 + rng.normal(0, 6, size)).clip(10, 130) * 8) / 8
+    years = np.maximum(maturity_days / 365, 0.25)
+    current_yield = np.where(maturity_days > 0, coupon / price * 100, 0)
+    ytm = np.where(maturity_days > 0, current_yield + (100 - price) / years, 0)
+
+    available = np.where(rng.random(size) < 0.55, 0, np.round(rng.lognormal(8, 2.5, size), 2))
+
+    return [
+        company,
+        _pick(rng, INDUSTRIES, size),
+        ticker,
+        bond_type,
+        market,
+        _pick(rng, SENIORITIES, size),
+        isin,
+        _pick(rng, CURRENCIES, size),
+        _pick(rng, STATES, size),
+        moodys,
+        snp,
+        fitch,
+        _pick(rng, COUNTRIES, size),
+        _pick(rng, OWNERSHIPS, size),
+        _dates(maturity_days),
+        _dates(next_days),
+        coupon_type,
+        frequency,
+        coupon_text,
+        _money(current_yield, 3),
+        _money(ytm, 3),
+        _money(price, 4),
+        _money(available, 4),
+    ]
+
+def generate(rows: int, seed: int = 0, chunk_size: int = CHUNK_SIZE)-> Iterator[List[np.ndarray]]:
+    """Columns of the synthetic market, chunk by chunk, each chunk has its own seed."""
+    seeds = np.random.SeedSequence(seed).spawn(-(-rows // chunk_size))
+    for i, s in enumerate(seeds):
+        start = i * chunk_size
+        yield chunk(np.random.default_rng(s), start, min(chunk_size, rows - start))
+
+def write_market(path: str, rows: int, seed: int = 0)-> None:
+    """Write a synthetic market file, "-" writes to stdout and .gz files are compressed."""
+    with open_output(path) as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(HEADER)
+        for columns in generate(rows, seed):
+            writer.writerows(zip(*[ c.tolist() for c in columns ]))
+
+def main()-> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--rows", type=int, default=1000)
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default=f"wisealpha_market_{AS_OF:%y%m%d}.csv")
+    args = parser.parse_args()
+
+    write_market(args.output, args.rows, args.seed)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
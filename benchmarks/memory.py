@@ -0,0 +1,134 @@
+"""
+    Memory held per bond, for each way a bond universe is kept in RAM.
+
+    Bytes are traced with tracemalloc and only count what is still allocated once the input is
+    released, so strings shared between bonds are counted once.
+
+    The dict layout cases rebuild bonds the way they were kept before slots and interning, a
+    plain dataclass with a __dict__, its own copy of every string and two datetimes per bond,
+    so the saving can be measured on the same machine.
+
+        python benchmarks/memory.py [-n 100000] [--max-bytes 800]
+"""
+from __future__ import annotations
+from typing import Callable, List
+from dataclasses import field, fields, make_dataclass
+from datetime import datetime
+import argparse
+import csv
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from market import AS_OF, write_market
+from src import clock
+from src.bond import Bond
+from src.columns import DATE_FIELDS, FIELDS
+from src.loader import load_columns
+from src.rating import Rating
+
+
+def retained(build: Callable[[], object])-> int:
+    """Bytes still allocated by build once it returns, while its result is kept alive."""
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    result = build()
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    return after - before
+
+def from_csv(file_path: str)-> List[Bond]:
+    """Bonds parsed from the CSV strings one by one, the rows are dropped as they are read."""
+    with open(file_path, newline="") as f:
+        reader = csv.reader(f)
+        next(reader)
+        return [ Bond(*row) for row in reader ]
+
+def _dict_bond_post_init(self)-> None:
+    """Parsing of Bond before slots: no interning, and new datetimes for every bond."""
+    self.maturity = datetime.strptime(self.maturity, "%d-%m-%Y")
+    self.next_payment = datetime.strptime(self.next_payment, "%d-%m-%Y")
+    self.coupon = Bond._prep_coupon(self, self.coupon)
+    self.current_yield = round(float(self.current_yield) / 100, 5)
+    self.ytm_ytc = round(float(self.ytm_ytc) / 100, 5)
+    self.price = round(float(self.price), 4)
+    self.available = round(float(self.available), 4)
+    self.country = Bond._prep_country(self, self.country)
+    self._rating = Rating.of(self.snp_rate, self.moodys_rate, self.fitch_rate)
+    self.id = Bond._generate_id(self, self.company, self.coupon, self.maturity)
+
+DictBond = make_dataclass(
+    "DictBond",
+    [ (f.name, f.type, f) for f in fields(Bond) if f.name != "_cache" ] + [("_cache", dict, field(default_factory=dict, init=False))],
+    namespace={ "__post_init__": _dict_bond_post_init })
+"""Bond as a plain dataclass with a __dict__, the layout before slots."""
+
+def dict_from_csv(file_path: str)-> list:
+    with open(file_path, newline="") as f:
+        reader = csv.reader(f)
+        next(reader)
+        return [ DictBond(*row) for row in reader ]
+
+def dict_from_columns(columns)-> list:
+    """Dict layout bonds from the columns, as rows() built them before dates were shared: two new datetimes per bond."""
+    values = []
+    for name in FIELDS:
+        col = columns.values(name)
+        values.append((col.astype(datetime) if name in DATE_FIELDS else col).tolist())
+
+    bonds = []
+    for row in zip(*values):
+        bond = DictBond.__new__(DictBond)
+        bond.__dict__.update(zip(FIELDS, row))
+        bond._rating = Rating.of(bond.snp_rate, bond.moodys_rate, bond.fitch_rate)
+        bond.id = Bond._generate_id(bond, bond.company, bond.coupon, bond.maturity)
+        bond._cache = {}
+        bonds.append(bond)
+
+    return bonds
+
+def main()-> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-bytes", type=float, default=None, help="fail when a materialized bond takes more than this")
+    args = parser.parse_args()
+
+    clock.set_as_of(AS_OF)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["BONDS_CACHE_DIR"] = tmp
+        file_path = str(Path(tmp) / f"wisealpha_market_{AS_OF:%y%m%d}.csv")
+        write_market(file_path, args.rows, args.seed)
+
+        columns = load_columns(file_path, False)
+        cases = [
+            ("Bond from CSV row", retained(lambda: from_csv(file_path))),
+            ("Bond from columns", retained(lambda: columns.rows(range(len(columns))))),
+            ("Dict bond from CSV row", retained(lambda: dict_from_csv(file_path))),
+            ("Dict bond from columns", retained(lambda: dict_from_columns(columns))),
+            ("BondColumns", retained(lambda: load_columns(file_path, False))),
+        ]
+
+    print(f"{'case':<24} {'bytes/bond':>12} {'MB':>10}")
+    for name, size in cases:
+        print(f"{name:<24} {size / args.rows:>12,.0f} {size / 2**20:>10.1f}")
+
+    over = [ name for name, size in cases[:2] if args.max_bytes is not None and size / args.rows > args.max_bytes ]
+    if len(over) > 0:
+        print(f"FAIL: over {args.max_bytes:.0f} bytes per bond: {', '.join(over)}")
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+"""
+    Benchmarks of the hot paths, over a synthetic market.
+
+    Every case runs once to warm up, then --repeat times, and reports the median wall time,
+    throughput in rows per second and peak memory allocated while it runs. Results can be saved
+    as a baseline, and later runs over the same inputs compared to it.
+
+        python benchmarks/run.py -n 100000 --save benchmarks/baseline.json
+        python benchmarks/run.py -n 100000 --baseline benchmarks/baseline.json
+"""
+from __future__ import annotations
+from typing import Callable, Dict, List
+from dataclasses import asdict, dataclass
+import argparse
+import gc
+import inspect
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import numpy as np
+from market import AS_OF, write_market
+from src import clock
+from src.__main__ import load_bonds_from_csv
+from src.bonds import Bonds
+from src.portfolio import Holdings, join
+from src.report import Report
+from src.risk import parallel, parse_scenario, stress
+
+
+FILTER_ARGS: Dict[str, tuple] = {
+    "only_country": ("GB",),
+    "only_coupon_gt": (0.06,),
+    "only_current_yield_gt": (0.07,),
+    "only_max_maturity_months": (36,),
+    "only_max_maturity_years": (5,),
+    "only_maturity_between": (AS_OF, AS_OF.replace(year=AS_OF.year + 5)),
+    "only_min_rating": ("BB-",),
+}
+"""Arguments of the filters that take any, every other only_* method is called without."""
+
+POSITIONS = 20_000
+"""Lots in the holdings of the portfolio case, drawn from the market with repeats."""
+
+STRESS_BONDS = 10_000
+"""Bonds repriced by the stress case."""
+
+STRESS_SCENARIOS = [ parallel(bp) for bp in range(-200, 201, 10) if bp != 0 ] + [
+    parse_scenario("steepener=2y:-50,10y:0,30y:50"),
+    parse_scenario("flattener=2y:50,10y:0,30y:-50"),
+    parse_scenario("short_up=1y:100,5y:25,10y:0"),
+    parse_scenario("belly=2y:0,5y:75,10y:0"),
+]
+"""Parallel shocks every 10 basis points up to 200 either way, and a few bucketed ones."""
+
+REGRESSION = 1.25
+"""A case slower than the baseline by more than this factor fails the comparison."""
+
+
+@dataclass
+class Result:
+
+    name: str
+
+    rows: int
+
+    seconds: float
+    """Median wall time of the repeats."""
+
+    peak_mb: float
+    """Peak memory allocated by the case, as traced by tracemalloc."""
+
+    @property
+    def rows_per_second(self)-> float:
+        return self.rows / self.seconds if self.seconds > 0 else float("inf")
+
+
+def measure(name: str, rows: int, setup: Callable[[], object], fn: Callable[[object], object], repeat: int)-> Result:
+    """
+        Run fn on a fresh setup value repeat times for the median time, then once more under tracemalloc.
+
+        A first untimed run pays for lazy imports and first use caches, such as pandas in to_df,
+        so they do not land in whichever case happens to run first.
+    """
+    fn(setup())
+
+    timings = []
+    for _ in range(repeat):
+        arg = setup()
+        gc.collect()
+        start = time.perf_counter()
+        fn(arg)
+        timings.append(time.perf_counter() - start)
+
+    arg = setup()
+    gc.collect()
+    tracemalloc.start()
+    fn(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return Result(name, rows, statistics.median(timings), peak / 2**20)
+
+def filters()-> List[str]:
+    return sorted(name for name, _ in inspect.getmembers(Bonds, inspect.isfunction) if name.startswith("only_"))
+
+def sorts()-> List[str]:
+    return sorted(name for name, _ in inspect.getmembers(Bonds, inspect.isfunction) if name.startswith("sort_by_"))
+
+def sample_holdings(columns, count: int, seed: int = 0)-> Holdings:
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(columns), count)
+    isin = np.asarray(columns["isin"]).astype(str)[idx]
+
+    return Holdings(isin, rng.integers(1, 100, count) * 100.0, np.full(count, np.nan))
+
+def run(file_path: str, repeat: int, paths: int)-> List[Result]:
+    clock.set_as_of(AS_OF)
+    base = load_bonds_from_csv(file_path, False)
+    columns = base.columns
+    rows = len(columns)
+
+    def fresh()-> Bonds:
+        return Bonds.from_columns(columns)
+
+    results = [
+        measure("load_bonds_from_csv", rows, lambda: None, lambda _: len(load_bonds_from_csv(file_path, False)), repeat),
+        measure("load_bonds_from_csv cached", rows, lambda: load_bonds_from_csv(file_path, True).columns, lambda _: len(load_bonds_from_csv(file_path, True)), repeat),
+    ]
+
+    for name in filters():
+        args = FILTER_ARGS.get(name, ())
+        results.append(measure(f"Bonds.{name}", rows, fresh, lambda b: len(getattr(b, name)(*args)), repeat))
+
+    for name in sorts():
+        results.append(measure(f"Bonds.{name}", rows, fresh, lambda b: getattr(b, name)("desc"), repeat))
+
+    spec = [("yield", "desc"), ("risk", "asc")]
+    results.append(measure("Bonds.sort_by yield:desc,risk:asc", rows, fresh, lambda b: b.sort_by(spec), repeat))
+    results.append(measure("Bonds.top 20 yield:desc,risk:asc", rows, fresh, lambda b: b.top(20, spec), repeat))
+
+    results.append(measure("Bonds.to_df", rows, fresh, lambda b: b.to_df(), repeat))
+    results.append(measure("Report.generate_report", rows, lambda: Report(fresh()), lambda r: r.generate_report("yield"), repeat))
+
+    holdings = sample_holdings(columns, POSITIONS)
+    results.append(measure(f"Portfolio.calendar {POSITIONS} positions", POSITIONS, lambda: join(holdings, columns), lambda p: p.calendar(), repeat))
+
+    universe = columns.take(np.arange(min(STRESS_BONDS, rows)))
+    cells = len(universe) * len(STRESS_SCENARIOS)
+    results.append(measure(f"stress {len(STRESS_SCENARIOS)} scenarios", cells, lambda: universe, lambda c: stress(c, STRESS_SCENARIOS), repeat))
+
+    maturity = columns.maturity_days()
+    ticker = str(columns["ticker"][int(np.argmax(maturity > 365))])
+    results.append(measure("Report.simulate", paths, lambda: Report(fresh()), lambda r: r.simulate(ticker, None, 1000, paths=paths), repeat))
+
+    return results
+
+def comparable(baseline: dict, rows: int | None, file: str | None, seed: int)-> str | None:
+    """Why results of this run can not be compared with the baseline, or None when they can."""
+    ran = { "rows": rows, "file": file, "seed": seed }
+    differ = [ f"{k} {baseline.get(k)} against {v}" for k, v in ran.items() if baseline.get(k) != v ]
+
+    return f"baseline taken with other inputs: {', '.join(differ)}" if len(differ) > 0 else None
+
+def compare(results: List[Result], baseline: dict)-> List[str]:
+    """Names of the cases that got slower than the baseline allows."""
+    before = { r["name"]: r for r in baseline["results"] }
+    return [ r.name for r in results if r.name in before and r.seconds > before[r.name]["seconds"] * REGRESSION ]
+
+def report(results: List[Result], baseline: dict | None)-> None:
+    before = {} if baseline is None else { r["name"]: r for r in baseline["results"] }
+    print(f"{'case':<40} {'median s':>10} {'rows/s':>14} {'peak MB':>10} {'vs baseline':>12}")
+    for r in results:
+        change = f"{r.seconds / before[r.name]['seconds']:.2f}x" if r.name in before and before[r.name]["seconds"] > 0 else ""
+        print(f"{r.name:<40} {r.seconds:>10.4f} {r.rows_per_second:>14,.0f} {r.peak_mb:>10.1f} {change:>12}")
+
+def main()-> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--rows", type=int, default=100_000, help="rows of the synthetic market")
+    parser.add_argument("-f", "--file", default=None, help="benchmark this market file instead of a synthetic one")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="timed runs of every case after a warm up run, the median is reported and compared")
+    parser.add_argument("--paths", type=int, default=10_000, help="paths of the simulate case")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", default=None, help="write the results to this baseline file")
+    parser.add_argument("--baseline", default=None, help="compare against this baseline file")
+    args = parser.parse_args()
+
+    rows = args.rows if args.file is None else None
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline is not None else None
+    mismatch = comparable(baseline, rows, args.file, args.seed) if baseline is not None else None
+    if mismatch is not None:
+        # Per case times scale with the rows, a baseline of another size says nothing.
+        print(f"FAIL: {mismatch}")
+        return 2
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["BONDS_CACHE_DIR"] = tmp
+
+        file_path = args.file
+        if file_path is None:
+            file_path = str(Path(tmp) / f"wisealpha_market_{AS_OF:%y%m%d}.csv")
+            write_market(file_path, args.rows, args.seed)
+
+        results = run(file_path, args.repeat, args.paths)
+
+    report(results, baseline)
+
+    if args.save is not None:
+        Path(args.save).write_text(json.dumps({
+            "rows": rows,
+            "file": args.file,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "results": [ { **asdict(r), "rows_per_second": r.rows_per_second } for r in results ],
+        }, indent=2) + "\n")
+
+    if baseline is not None:
+        slower = compare(results, baseline)
+        if len(slower) > 0:
+            print(f"FAIL: slower than the baseline by more than {REGRESSION}x: {', '.join(slower)}")
+            return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+    Startup budget of the bonds CLI.
+
+    Runs `python -m src --help` a few times in fresh interpreters and fails when the best run
+    takes longer than the budget, or when importing the CLI pulls in a heavy dependency.
+
+        python benchmarks/startup.py [--budget-ms 150] [--runs 10]
+"""
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ["numpy", "pandas", "pycountry"]
+"""Must only be imported by the subcommands that use them."""
+
+
+def best_of(args: list, runs: int)-> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+def heavy_imports()-> list:
+    code = f"import sys, src.__main__; print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, capture_output=True, text=True)
+
+    return out.stdout.split()
+
+def main()-> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=150.0)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    baseline = best_of(["-c", "pass"], args.runs)
+    help_time = best_of(["-m", "src", "--help"], args.runs)
+    loaded = heavy_imports()
+
+    print(f"interpreter     {baseline * 1000:8.1f} ms")
+    print(f"bonds --help    {help_time * 1000:8.1f} ms  (budget {args.budget_ms:.0f} ms)")
+
+    failed = False
+    if help_time * 1000 > args.budget_ms:
+        print("FAIL: bonds --help is over budget")
+        failed = True
+
+    if len(loaded) > 0:
+        print(f"FAIL: importing the CLI loads {', '.join(loaded)}")
+        failed = True
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -19,6 +19,9 @@ setup(
 	url="https://github.com/MihaiBlebea/bonds-calculator",
     packages = ["src"],
     install_requires = required,
+    extras_require = {
+        "export": ["pyarrow"]
+    },
     entry_points = {
         "console_scripts": [
             "bonds = src.__main__:main"
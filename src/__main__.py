@@ -1,66 +1,142 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
 import click
-import csv
-from src.report import Report
-from src.bond import Bond
-from src.bonds import Bonds, bonds
+from datetime import datetime
+from src import clock, timings
 
+if TYPE_CHECKING:
+    from src.bonds import Bonds
 
-def load_bonds_from_csv(file_path: str)-> Bonds:
+# Subcommands import numpy, pandas and the rest of the package on first use, so
+# --help and argument errors answer without paying for them.
+
+
+def load_bonds_from_csv(file_path: str, use_cache: bool = True)-> Bonds:
     """Read CSV file, and return content as bonds collection."""
-    b = bonds()
-    with open(file_path, newline="") as csvfile:
-        spamreader = csv.reader(csvfile, delimiter=",", quotechar="\"")
-        [ b.append(Bond(*row)) for i, row in enumerate(spamreader) if i != 0 ]
+    from src.bonds import Bonds
+    from src.loader import load_columns
+
+    return Bonds.scan(lambda plan: load_columns(file_path, use_cache, plan))
+
+def screen_options(fn):
+    """Options of the filter subcommand, shared with batch and stress."""
+    options = [
+        click.option("-b", "--based", help="bond based in country", default=None),
+        click.option("-c", "--coupon", help="coupon must be greater than", default=None, type=float),
+        click.option("-cy", "--current-yield", help="current yield must be greater than", default=None, type=float),
+        click.option("-mm", "--maturity-months", help="max maturity in months", default=None, type=int),
+        click.option("-my", "--maturity-years", help="max maturity in years", default=None, type=int),
+        click.option("-ig", "--investment-grade", help="only investment grade bonds", default=False, is_flag=True),
+        click.option("-hg", "--high-yield-grade", help="only high yield grade bonds", default=False, is_flag=True),
+        click.option("-p", "--premium", help="only premium price bonds", default=False, is_flag=True),
+        click.option("-d", "--discount", help="only discount price bonds", default=False, is_flag=True),
+        click.option("-a", "--available", help="only available bonds", default=False, is_flag=True),
+        click.option("--where", help="filter expression, such as \"coupon > 0.07 and (country == 'GB' or rating <= 'BBB-') and not suspended\". Ratings compare by quality: <= 'BBB-' is BBB- or worse, >= 'BBB-' BBB- or better", default=None),
+    ]
+    for option in reversed(options):
+        fn = option(fn)
+
+    return fn
+
+EXPORT_FORMATS = ["csv", "jsonl", "parquet", "feather", "arrow"]
+"""Same as src.export.FORMATS, kept here so --help does not import the package."""
+
+def format_option(fn):
+    return click.option(
+        "-f",
+        "--format",
+        "fmt",
+        help="output file format, guessed from the --output suffix and csv otherwise. Parquet and Arrow need pyarrow",
+        default=None,
+        type=click.Choice(EXPORT_FORMATS))(fn)
 
-    return b
+def write_output(df, output: str, fmt: str)-> None:
+    """Write a DataFrame to the output file, in its format."""
+    from src.export import ExportError, export
+
+    try:
+        export(df, output, fmt)
+    except ExportError as e:
+        raise click.ClickException(str(e))
 
 @click.command()
-@click.option("-s", "--sort", help="sort by", required=False, type=str)
+@click.option("-s", "--sort", help="sort by length, maturity, score, yield or risk, several keys as yield:desc,risk:asc", required=False, type=str)
 @click.option("-a", "--asc", help="sort ascending", required=False, type=bool, is_flag=True)
+@click.option("-n", "--top", help="only the first N bonds of the sort", required=False, default=None, type=click.IntRange(min=1))
+@click.option("--raw", help="print raw numbers, without formatting money, percentages and maturities", default=False, is_flag=True)
+@click.option("-o", "--output", help="output file, always written with raw numbers", required=False, default=None)
+@format_option
 @click.argument("file")
-def report(file, sort: str, asc: bool):
+@click.pass_obj
+def report(obj: dict, file, sort: str, asc: bool, top: int, raw: bool, output: str, fmt: str):
+    from src.report import Report
+
     click.echo(f"Generating report")
 
     direction = "desc"
     if asc:
         direction = "asc"
 
-    df = Report(load_bonds_from_csv(file)).generate_report(sort, direction)
-    
-    click.echo(df)
+    r = Report(load_bonds_from_csv(file, obj["cache"]))
+    try:
+        df = r.generate_report(sort, direction, top)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--sort")
+
+    with timings.stage("write", len(df)):
+        if output is not None:
+            write_output(df, output, fmt)
+
+        click.echo(df if raw else r.format(df))
 
 
 @click.command()
 @click.option("-t", "--ticker", help="ticker to compare with", required=False, default=None, type=str)
 @click.option("-i", "--isin", help="ticker to compare with", required=False, default=None, type=str)
 @click.option("-a", "--amount", help="amount invested", required=True, default=0, type=int)
-@click.option("-r", "--reinvest", help="reinvest the ", default=True, type=bool, is_flag=True)
+@click.option("-r/-R", "--reinvest/--no-reinvest", help="reinvest the coupons, or keep them as cash", default=True)
+@click.option("-n", "--paths", help="number of simulated paths", default=10_000, type=click.IntRange(min=1))
+@click.option("-w", "--workers", help="worker processes to spread the paths across", default=1, type=click.IntRange(min=1))
+@click.option("--seed", help="random seed, the same seed gives the same results", default=0, type=int)
+@click.option("--price-volatility", help="reinvest coupons in the bond along a price path with this volatility", default=None, type=float)
 @click.argument("file")
-def simulate(file, ticker: str, isin: str, amount: int, reinvest: bool):
+@click.pass_obj
+def simulate(
+    obj: dict,
+    file,
+    ticker: str,
+    isin: str,
+    amount: int,
+    reinvest: bool,
+    paths: int,
+    workers: int,
+    seed: int,
+    price_volatility: float):
+    from src.report import Report
+
     click.echo(f"Simulate holding this bond to maturity")
 
     if ticker is None and isin is None:
-        click.ClickException("Please supply ticker (-t) or isin (-i) flags.")
+        raise click.ClickException("Please supply ticker (-t) or isin (-i) flags.")
 
-    df = Report(load_bonds_from_csv(file)).simulate(ticker, isin, amount, reinvest)
+    report = Report(load_bonds_from_csv(file, obj["cache"]))
+    bond = report.find(ticker, isin)
+    click.echo(f"{bond.company} matures in {bond.get_maturity_years()} years and {bond.get_maturity_months() % 12} months")
+
+    df = report.simulate(ticker, isin, amount, reinvest, paths, workers, seed, price_volatility)
     
     click.echo(df)
 
 
 @click.command()
 @click.option("-o", "--output", help="output file", required=False, default=None)
-@click.option("-b", "--based", help="bond based in country", default=None)
-@click.option("-c", "--coupon", help="coupon must be greater than", default=None, type=float)
-@click.option("-cy", "--current-yield", help="current yield must be greater than", default=None, type=float)
-@click.option("-mm", "--maturity-months", help="max maturity in months", default=None, type=int)
-@click.option("-my", "--maturity-years", help="max maturity in years", default=None, type=int)
-@click.option("-ig", "--investment-grade", help="only investment grade bonds", default=False, is_flag=True)
-@click.option("-hg", "--high-yield-grade", help="only high yield grade bonds", default=False, is_flag=True)
-@click.option("-p", "--premium", help="only premium price bonds", default=False, is_flag=True)
-@click.option("-d", "--discount", help="only discount price bonds", default=False, is_flag=True)
-@click.option("-a", "--available", help="only available bonds", default=False, is_flag=True)
+@screen_options
+@click.option("--stream", help="filter in constant memory, writing matches as they are found. FILE can be - for stdin or a .gz file", default=False, is_flag=True)
+@format_option
 @click.argument("file")
+@click.pass_obj
 def filter(
+    obj: dict,
     file: str, 
     output: str, 
     based: str, 
@@ -72,57 +148,420 @@ def filter(
     high_yield_grade: bool, 
     premium: bool, 
     discount: bool, 
-    available: bool)-> None:
+    available: bool,
+    where: str,
+    stream: bool,
+    fmt: str)-> None:
+
+    from src.bonds import screen
+
+    try:
+        b = screen(
+            load_bonds_from_csv(file, obj["cache"]),
+            based,
+            coupon,
+            current_yield,
+            maturity_months,
+            maturity_years,
+            investment_grade,
+            high_yield_grade,
+            premium,
+            discount,
+            available,
+            where)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+    if stream:
+        from src.export import ExportError, format_of
+        from src.stream import stream_filter
+
+        try:
+            count = stream_filter(file, output, b.plan, format_of(output, fmt))
+        except ExportError as e:
+            raise click.ClickException(str(e))
+
+        click.echo(f"{count} bonds found", err=True)
+        return
+
+    df = b.to_df()
+    if df is None:
+        click.echo(click.style("No bounds found", bg="red"))
+        exit(0)
+
+    with timings.stage("write", len(df)):
+        if output is not None:
+            write_output(df, output, fmt)
 
-    b = load_bonds_from_csv(file)
+        click.echo(df)
+
+@click.command()
+@click.option("-a", "--amount", help="amount to invest", required=True, type=float)
+@click.option("-ic", "--issuer-cap", help="max share of the amount in one issuer", default=1.0, type=float)
+@click.option("-nc", "--industry-cap", help="max share of the amount in one industry", default=1.0, type=float)
+@click.option("-mr", "--max-risk", help="max average risk score", default=None, type=float)
+@click.option("-r", "--min-rating", help="min rating, such as BBB- or Baa3", default=None, type=str)
+@click.option("-b", "--based", help="bond based in country", default=None)
+@click.option("-o", "--output", help="output file", required=False, default=None)
+@format_option
+@click.argument("file")
+@click.pass_obj
+def optimize(
+    obj: dict,
+    file: str,
+    amount: float,
+    issuer_cap: float,
+    industry_cap: float,
+    max_risk: float,
+    min_rating: str,
+    based: str,
+    output: str,
+    fmt: str)-> None:
+    from src import optimizer
+
+    b = load_bonds_from_csv(file, obj["cache"]).only_bond_type().only_available()
+
+    if min_rating is not None:
+        try:
+            b = b.only_min_rating(min_rating)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--min-rating")
 
     if based is not None:
         b = b.only_country(based)
 
-    if coupon is not None:
-        b = b.only_coupon_gt(coupon)
+    try:
+        allocation = optimizer.optimize(b, amount, issuer_cap, industry_cap, max_risk)
+    except optimizer.InfeasibleError as e:
+        raise click.ClickException(str(e))
 
-    if current_yield is not None:
-        b = b.only_current_yield_gt(current_yield)
+    df = allocation.to_df()
 
-    if investment_grade:
-        b = b.only_investment_grade()
-    elif high_yield_grade:
-        b = b.only_high_yield_grade()
+    click.echo(f"Invested {allocation.total():,.2f} of {amount:,.2f}, expected yield {allocation.expected_yield():.2%}, average risk {allocation.average_risk():.2f}")
 
-    if premium:
-        b = b.only_premium_price()
-    elif discount:
-        b = b.only_discount_price()
+    with timings.stage("write", len(df)):
+        if output is not None:
+            write_output(df, output, fmt)
 
-    if maturity_months is not None:
-        b = b.only_max_maturity_months(maturity_months)
-    elif maturity_years is not None:
-        b = b.only_max_maturity_years(maturity_years)
+        click.echo(df)
 
-    if available:
-        b = b.only_available()
+@click.command()
+@click.option("-o", "--output", help="output file, written snapshot by snapshot as results arrive", required=False, default=None)
+@format_option
+@click.option("-w", "--workers", help="worker processes loading and screening snapshots", default=1, type=click.IntRange(min=1))
+@screen_options
+@click.argument("pattern")
+@click.pass_obj
+def batch(obj: dict, pattern: str, output: str, fmt: str, workers: int, **options)-> None:
+    """
+        Screen every snapshot in a directory or matching a glob, such as "data/wisealpha_market_22*.csv".
 
-    df = b.to_df()
-    if df is None:
-        click.echo(click.style("No bounds found", bg="red"))
-        exit(0)
+        Matches of all snapshots are merged in date order, with a Snapshot column taken from the
+        file name. Maturities count from each snapshot's date, unless --as-of is given.
+    """
+    from src import batch as batches
+    from src.bonds import Bonds, screen
 
-    if output is not None:
-        df.to_csv(output, index=False)
+    try:
+        # Compile the screen once up front, so a bad expression fails before any snapshot is loaded.
+        screen(Bonds(), **options)
+    except ValueError as e:
+        raise click.UsageError(str(e))
 
-    click.echo(df)
+    files = batches.snapshot_files(pattern)
+    if len(files) == 0:
+        raise click.ClickException(f"No snapshots found in {pattern}")
 
-@click.group()
-def cli():
+    as_of = clock.as_of() if clock.is_set() else None
+    if output is None:
+        df = batches.batch_frame(files, options, workers, obj["cache"], as_of)
+        if df is None:
+            click.echo(click.style("No bounds found", bg="red"))
+            exit(0)
+
+        click.echo(df)
+        return
+
+    from src.export import ExportError, open_writer
+
+    count = 0
+    try:
+        with open_writer(output, fmt) as writer:
+            for path, df in batches.batch_screen(files, options, workers, obj["cache"], as_of):
+                found = 0 if df is None else len(df)
+                if found > 0:
+                    writer.write(df)
+
+                count += found
+                click.echo(f"{path}: {found} bonds", err=True)
+    except ExportError as e:
+        raise click.ClickException(str(e))
+
+    click.echo(f"{count} bonds found in {len(files)} snapshots", err=True)
+
+@click.command()
+@click.option("-H", "--holdings", "holdings_path", help="CSV of holdings with ISIN, Nominal and optionally Purchase Price columns", required=True)
+@click.option("-g", "--group-by", help="group the cash flow calendar by some of month, currency and issuer", default="month,currency,issuer")
+@click.option("--positions", help="print each bond held with its cost, value, accrued interest and profit, instead of the calendar", default=False, is_flag=True)
+@click.option("-o", "--output", help="output file", required=False, default=None)
+@format_option
+@click.argument("files", metavar="FILE...", nargs=-1, required=True)
+@click.pass_obj
+def portfolio(obj: dict, files: tuple, holdings_path: str, group_by: str, positions: bool, output: str, fmt: str)-> None:
+    """
+        Join holdings against one or more snapshots, and project their coupons and redemptions.
+
+        With several snapshots each is taken as of its date, unless --as-of is given, and the
+        results are stacked with a Snapshot column.
+    """
+    from pandas import concat
+    from src import portfolio as portfolios
+    from src.batch import SNAPSHOT_NAME, snapshot_date
+    from src.loader import load_columns
+
+    try:
+        holdings = portfolios.load_holdings(holdings_path)
+    except (OSError, ValueError) as e:
+        raise click.BadParameter(str(e), param_hint="--holdings")
+
+    by = [ k.strip() for k in group_by.split(",") if k.strip() != "" ]
+    unknown = [ k for k in by if k not in portfolios.GROUPS ]
+    if len(unknown) > 0:
+        raise click.BadParameter(f"unknown group: {', '.join(unknown)}, expected some of {', '.join(portfolios.GROUPS)}", param_hint="--group-by")
+
+    pinned = clock.as_of() if clock.is_set() else None
+    frames = []
+    for file in files:
+        if len(files) > 1 and pinned is None and SNAPSHOT_NAME.search(file) is not None:
+            clock.set_as_of(snapshot_date(file))
+
+        p = portfolios.join(holdings, load_columns(file, obj["cache"]))
+        nominal = p.nominal()
+        value, cost = float((p.columns["price"] * nominal).sum() / 100), float(p.cost().sum())
+        click.echo(f"{file}: {len(p.columns)} bonds held, value {value:,.2f}, cost {cost:,.2f}, profit {value - cost:,.2f}", err=True)
+        if len(p.missing()) > 0:
+            click.echo(f"{file}: not found: {', '.join(p.missing())}", err=True)
+
+        df = p.positions() if positions else p.calendar(by)
+        if len(files) > 1:
+            df.insert(0, "Snapshot", file)
+        frames.append(df)
+
+    df = concat(frames, ignore_index=True)
+    with timings.stage("write", len(df)):
+        if output is not None:
+            write_output(df, output, fmt)
+
+        click.echo(df)
+
+@click.command()
+@click.option("-H", "--holdings", "holdings_path", help="CSV of holdings to stress, instead of 100 nominal of every bond screened", default=None)
+@click.option("--shift", "shifts", help="parallel shocks in basis points, such as -100,-50,50,100", default=None)
+@click.option("--bucket", "buckets", help="bucketed shock in basis points by tenor, such as steepener=2y:-25,10y:25. Can be repeated", multiple=True)
+@click.option("--scenarios", "scenarios_path", help="JSON file mapping scenario names to basis points, or to basis points by tenor", default=None)
+@click.option("--per-bond", help="print the stressed price and P&L of every bond under every scenario", default=False, is_flag=True)
+@click.option("--measures", help="print the duration, convexity and DV01 of every bond instead of the scenarios", default=False, is_flag=True)
+@click.option("-o", "--output", help="output file", required=False, default=None)
+@format_option
+@screen_options
+@click.argument("file")
+@click.pass_obj
+def stress(
+    obj: dict,
+    file: str,
+    holdings_path: str,
+    shifts: str,
+    buckets: tuple,
+    scenarios_path: str,
+    per_bond: bool,
+    measures: bool,
+    output: str,
+    fmt: str,
+    **options)-> None:
+    """
+        Reprice screened bonds or holdings under parallel and bucketed yield shocks.
+
+        Prices move from the listed yield to maturity, every cash flow discounted at the yield
+        plus the shock at its tenor. Without a scenario, parallel shocks of -200 to +200 basis
+        points are applied. P&L is summed by scenario and currency.
+    """
+    from src import risk
+    from src.bonds import screen
+
+    try:
+        scenarios = risk.load_scenarios(scenarios_path) if scenarios_path is not None else []
+        scenarios += risk.parse_shifts(shifts) if shifts is not None else []
+        scenarios += [ risk.parse_scenario(b) for b in buckets ]
+    except (OSError, ValueError) as e:
+        raise click.BadParameter(str(e))
+
+    if len(scenarios) == 0:
+        scenarios = [ risk.parallel(bp) for bp in risk.DEFAULT_SHIFTS ]
+
+    try:
+        columns = screen(load_bonds_from_csv(file, obj["cache"]), **options).columns
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+    nominal = None
+    if holdings_path is not None:
+        from src import portfolio as portfolios
+
+        try:
+            p = portfolios.join(portfolios.load_holdings(holdings_path), columns)
+        except (OSError, ValueError) as e:
+            raise click.BadParameter(str(e), param_hint="--holdings")
+
+        if len(p.missing()) > 0:
+            click.echo(f"not found or screened out: {', '.join(p.missing())}", err=True)
+        columns, nominal = p.columns, p.nominal()
+
+    result = risk.stress(columns, scenarios, nominal)
+    click.echo(f"{len(columns)} bonds under {len(scenarios)} scenarios, {result.unpriced()} without a yield or cash flows left out", err=True)
+
+    df = result.risk() if measures else result.per_bond() if per_bond else result.summary()
+    with timings.stage("write", len(df)):
+        if output is not None:
+            write_output(df, output, fmt)
+
+        click.echo(df)
+
+@click.command()
+@click.option("-k", "--key",help="join the snapshots on this field", default="isin", type=click.Choice(["isin", "id", "ticker"]))
+@click.option("-pm", "--price-move", help="smallest price move to report", default=0.5, type=float)
+@click.option("-ym", "--yield-move", help="smallest yield move to report, in basis points", default=10.0, type=float)
+@click.option("-o", "--output", help="output file", required=False, default=None)
+@format_option
+@click.option("--apply", help="cache NEW by applying its changed rows to the cached OLD, instead of parsing it all", default=False, is_flag=True)
+@click.argument("old")
+@click.argument("new")
+@click.pass_obj
+def diff(obj: dict, old: str, new: str, key: str, price_move: float, yield_move: float, output: str, fmt: str, apply: bool)-> None:
+    """Changes from the OLD to the NEW snapshot: added and removed bonds, price and yield moves, rating and availability changes."""
+    from src.diff import diff_rows
+    from src.loader import load_columns, read_rows
+
+    if apply and not obj["cache"]:
+        raise click.UsageError("--apply only writes to the cache, it can not be used with --no-cache")
+
+    result = diff_rows(read_rows(old), read_rows(new), key, price_move, yield_move / 10_000)
+    click.echo(f"{result.count('added')} added, {result.count('removed')} removed, {result.modified} modified, {result.unchanged} unchanged", err=True)
+
+    if apply:
+        load_columns(old, obj["cache"])
+        load_columns(new, obj["cache"], base_path=old)
+
+    df = result.to_df()
+    with timings.stage("write", len(df)):
+        if output is not None:
+            write_output(df, output, fmt)
+
+        click.echo(df)
+
+@click.command()
+@click.option("-h", "--host", help="address to listen on", default="127.0.0.1")
+@click.option("-p", "--port", help="port to listen on", default=8080, type=int)
+@click.option("-s", "--socket", "socket_path", help="listen on this unix socket instead of host and port", default=None)
+@click.option("--poll", help="seconds between checks of FILE for changes", default=2.0, type=float)
+@click.argument("file")
+@click.pass_obj
+def serve(obj: dict, file: str, host: str, port: int, socket_path: str, poll: float)-> None:
+    """Answer filter, report and simulate queries over HTTP, reloading FILE when it changes."""
+    from src import server
+
+    server.serve(file, host, port, socket_path, obj["cache"], poll)
+
+@click.command()
+@click.option("-s", "--screens", "screens_path", help="JSON file of saved screens, mapping names to filter options", required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("-o", "--output", help="append events to this JSON Lines file instead of stdout", default=None)
+@click.option("--poll", help="seconds between scans of DIR", default=2.0, type=float)
+@click.option("--replay", help="ingest every snapshot already in DIR in date order, not only the newest", default=False, is_flag=True)
+@click.option("--once", help="ingest what DIR holds and exit", default=False, is_flag=True)
+@click.argument("directory", metavar="DIR", type=click.Path(exists=True, file_okay=False))
+def watch(directory: str, screens_path: str, output: str, poll: float, replay: bool, once: bool)-> None:
+    """
+        Watch DIR for new or changed snapshots, and emit match, update and unmatch events of saved screens as JSON Lines.
+
+        Only the rows that changed since the previous snapshot are parsed and screened.
+    """
+    from src import watch as watcher
+
+    try:
+        watcher.load_screens(screens_path)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--screens")
+
+    watcher.watch(directory, screens_path, output, poll, replay, once)
+
+@click.group(name="cache")
+def cache_group():
+    """Manage the cache of parsed market snapshots."""
     pass
 
+@click.command()
+def clear():
+    from src import cache
+
+    removed = cache.clear()
+    click.echo(f"Removed {removed} cached snapshots from {cache.cache_dir()}")
+
+cache_group.add_command(clear, "clear")
+
+@click.group()
+@click.option("--no-cache", help="always parse the CSV file, ignore cached snapshots", default=False, is_flag=True)
+@click.option("--as-of", help="compute maturities as of this date, defaults to now", default=None, type=click.DateTime(["%Y-%m-%d", "%d-%m-%Y"]))
+@click.option("--timings", "show_timings", help="print wall time, CPU time, allocations and rows of each stage to stderr", default=False, is_flag=True)
+@click.option("--timings-format", help="print the timings as a table or JSON", default="table", type=click.Choice(["table", "json"]))
+@click.option("--timings-alloc/--timings-no-alloc", help="trace allocations of each stage, which slows allocation heavy stages down", default=True)
+@click.option("--profile", help="write cProfile stats of the run to this file", default=None, type=click.Path(dir_okay=False, writable=True))
+@click.option("--profile-memory", help="write a tracemalloc snapshot of the run to this file", default=None, type=click.Path(dir_okay=False, writable=True))
+@click.pass_context
+def cli(
+    ctx,
+    no_cache: bool,
+    as_of: datetime,
+    show_timings: bool,
+    timings_format: str,
+    timings_alloc: bool,
+    profile: str,
+    profile_memory: str):
+    ctx.obj = { "cache": not no_cache }
+    if as_of is not None:
+        clock.set_as_of(as_of)
+
+    # Resources are released after the subcommand returns, last in first out.
+    if show_timings:
+        timings.enable(timings_alloc)
+        ctx.call_on_close(lambda: timings.print_report(timings_format))
+
+    if profile_memory is not None:
+        ctx.with_resource(timings.trace_memory(profile_memory))
+
+    if profile is not None:
+        ctx.with_resource(timings.profile(profile))
+
 cli.add_command(filter, "filter")
 
 cli.add_command(report, "report")
 
 cli.add_command(simulate, "simulate")
 
+cli.add_command(optimize, "optimize")
+
+cli.add_command(batch, "batch")
+
+cli.add_command(diff, "diff")
+
+cli.add_command(portfolio, "portfolio")
+
+cli.add_command(stress, "stress")
+
+cli.add_command(serve, "serve")
+
+cli.add_command(watch, "watch")
+
+cli.add_command(cache_group, "cache")
+
 def main():
     cli()
 
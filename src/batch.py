@@ -0,0 +1,103 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Tuple
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+import glob
+import re
+from src import clock, timings
+from src.bonds import Bonds, screen
+from src.loader import load_columns
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
+
+SNAPSHOT_NAME = re.compile(r"wisealpha_market_(\d{6})\.csv")
+"""Daily snapshots are named after their date, as wisealpha_market_YYMMDD.csv."""
+
+AHEAD = 2
+"""Snapshots queued per worker. Results are yielded in order, so this bounds how many wait in memory."""
+
+
+def snapshot_date(path: str)-> datetime:
+    """Date of a snapshot, parsed from its file name."""
+    match = SNAPSHOT_NAME.search(Path(path).name)
+    if match is None:
+        raise ValueError(f"not a snapshot file name, expected wisealpha_market_YYMMDD.csv: {path}")
+
+    return datetime.strptime(match.group(1), "%y%m%d")
+
+def snapshot_files(pattern: str)-> List[str]:
+    """Snapshots in a directory or matching a glob, oldest first."""
+    if Path(pattern).is_dir():
+        pattern = str(Path(pattern) / "wisealpha_market_*.csv*")
+
+    files = [ f for f in glob.glob(pattern) if SNAPSHOT_NAME.search(Path(f).name) is not None ]
+
+    return sorted(files, key=lambda f: (snapshot_date(f), f))
+
+def screen_snapshot(path: str, options: Dict[str, object], use_cache: bool = True, as_of: datetime | None = None)-> DataFrame | None:
+    """
+        Load and screen one snapshot, returning the matches with a leading Snapshot column.
+
+        Maturities count from the snapshot date, unless an as of date is given.
+    """
+    date = snapshot_date(path)
+    clock.set_as_of(date if as_of is None else as_of)
+
+    with timings.stage("snapshot") as s:
+        b = screen(Bonds.scan(lambda plan: load_columns(path, use_cache, plan)), **options)
+        df = b.to_df()
+        s.rows = 0 if df is None else len(df)
+
+    if df is not None:
+        df.insert(0, "Snapshot", date)
+
+    return df
+
+def _ordered(submit: Callable[[str], Future], files: List[str], ahead: int)-> Iterator[Future]:
+    """Futures in file order, with at most ahead of them submitted and not yet consumed."""
+    pending = deque()
+    remaining = iter(files)
+    for path in remaining:
+        pending.append(submit(path))
+        if len(pending) >= ahead:
+            break
+
+    while len(pending) > 0:
+        yield pending.popleft()
+        path = next(remaining, None)
+        if path is not None:
+            pending.append(submit(path))
+
+def batch_screen(
+    files: List[str],
+    options: Dict[str, object],
+    workers: int = 1,
+    use_cache: bool = True,
+    as_of: datetime | None = None)-> Iterator[Tuple[str, DataFrame | None]]:
+    """
+        Screen many snapshots on a process pool, yielding each file and its matches in file order.
+
+        Only a couple of snapshots per worker are in flight at once, so memory stays bounded
+        however many files there are.
+    """
+    if workers <= 1:
+        for path in files:
+            yield path, screen_snapshot(path, options, use_cache, as_of)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        submit = lambda path: pool.submit(screen_snapshot, path, options, use_cache, as_of)
+        for path, future in zip(files, _ordered(submit, files, workers * AHEAD)):
+            yield path, future.result()
+
+def batch_frame(files: List[str], options: Dict[str, object], workers: int = 1, use_cache: bool = True, as_of: datetime | None = None)-> DataFrame | None:
+    """Matches of every snapshot merged into one DataFrame, oldest snapshot first."""
+    from pandas import concat
+
+    frames = [ df for _, df in batch_screen(files, options, workers, use_cache, as_of) if df is not None ]
+
+    return concat(frames, ignore_index=True) if len(frames) > 0 else None
@@ -1,26 +1,60 @@
-from typing import Dict, List
-from dataclasses import dataclass, field
+from __future__ import annotations
+from typing import List
+from dataclasses import dataclass, field, fields
 from datetime import datetime
+from functools import lru_cache
 from math import floor
-import pycountry
+import sys
+from src import clock
+from src.countries import ALIASES, COUNTRIES
 from src.rating import Rating
 
 
-def all_countries()-> Dict[str, str]:
-    countries = {}
-    for country in pycountry.countries:
-        countries[country.name] = country.alpha_2
+CATEGORICAL_FIELDS: List[str] = [
+    "industry",
+    "type",
+    "market",
+    "seniority",
+    "currency",
+    "state",
+    "moodys_rate",
+    "snp_rate",
+    "fitch_rate",
+    "country",
+    "ownership",
+    "coupon_type",
+    "coupon_frequency",
+]
+"""Fields with a handful of distinct values, bonds share one string per value."""
 
-    return countries
 
-COUNTRIES = all_countries()
+def prep_country(value: str)-> str:
+    """Normalise a country name to its alpha 2 code."""
+    if value in ALIASES:
+        return ALIASES[value]
 
-@dataclass
+    return COUNTRIES[value] if value in COUNTRIES else value
+
+def company_slug(company: str)-> str:
+    return company.replace(" ", "_").replace(",", "").replace(".", "").lower().strip()
+
+def coupon_slug(coupon: float)-> str:
+    return str(round(coupon * 100, 2)).replace(".", "_")
+
+@lru_cache(maxsize=4096)
+def parse_date(value: str)-> datetime:
+    """Parse a dd-mm-yyyy date. Bonds maturing on the same day share the datetime."""
+    return datetime.strptime(value, "%d-%m-%Y")
+
+@dataclass(slots=True)
 class Bond:
     """
         Bond is a single bond model.
 
         Yields presented are estimated returns calculations. Pre-tax and fees. Prices can go up or down.
+
+        Bonds have slots rather than a __dict__, and categorical fields hold interned strings,
+        so a universe of millions of bonds pays for each distinct value once.
     """
 
     company: str
@@ -76,9 +110,15 @@ class Bond:
 
     id: str = field(default="", init=False)
 
+    _cache: dict | None = field(default=None, init=False, repr=False, compare=False)
+    """Derived metrics, valid for one as of date. Created on first use."""
+
     def __post_init__(self)-> None:
-        self.maturity = datetime.strptime(self.maturity, "%d-%m-%Y")
-        self.next_payment = datetime.strptime(self.next_payment, "%d-%m-%Y")
+        for name in CATEGORICAL_FIELDS:
+            setattr(self, name, sys.intern(getattr(self, name)))
+
+        self.maturity = parse_date(self.maturity)
+        self.next_payment = parse_date(self.next_payment)
         self.coupon = self._prep_coupon(self.coupon)
         self.current_yield = round(float(self.current_yield) / 100, 5)
         self.ytm_ytc = round(float(self.ytm_ytc) / 100, 5)
@@ -86,9 +126,22 @@ class Bond:
         self.available = round(float(self.available), 4)
         self.country = self._prep_country(self.country)
 
-        self._rating = Rating(self.snp_rate)
+        self._rating = Rating.of(self.snp_rate, self.moodys_rate, self.fitch_rate)
         self.id = self._generate_id(self.company, self.coupon, self.maturity)
 
+    @classmethod
+    def from_values(cls, **values)-> Bond:
+        """Build a bond from already parsed field values, skipping the string parsing."""
+        bond = cls.__new__(cls)
+        for name, value in values.items():
+            setattr(bond, name, value)
+
+        bond._rating = Rating.of(bond.snp_rate, bond.moodys_rate, bond.fitch_rate)
+        bond.id = bond._generate_id(bond.company, bond.coupon, bond.maturity)
+        bond._cache = None
+
+        return bond
+
     def _prep_coupon(self, value)-> float:
         coupon = value.replace("%", "")
         if "+" in coupon:
@@ -97,32 +150,28 @@ class Bond:
         return float(coupon) / 100
 
     def _prep_country(self, value: str)-> str:
-        if value == "UK":
-            return "GB"
-
-        if value == "USA":
-            return "US"
-
-        return COUNTRIES[value] if value in COUNTRIES else value
+        return prep_country(value)
 
     def _generate_id(self, company: str, coupon: float, maturity: datetime)-> str:
-        company_name = company.replace(" ", "_").replace(",", "").replace(".", "").lower().strip()
-        rate = str(round(coupon * 100, 2)).replace(".", "_")
         maturity_date = maturity.strftime("%d_%m_%Y")
-        return f"{company_name}-{rate}-{maturity_date}"
+        return f"{company_slug(company)}-{coupon_slug(coupon)}-{maturity_date}"
 
     def _calc_percentage_diff(self, initial: float, current: float)-> float:
         return abs(initial - current) / current
 
-    def get_properties(self)-> List[str]:   
-        return [i for i in self.__dict__.keys() if i[:1] != "_"]
+    def get_properties(self)-> List[str]:
+        """Public field names, in declaration order."""
+        return list(PROPERTIES)
 
+    @clock.cached
     def get_maturity_months(self)-> int:
-        return floor((self.maturity - datetime.now()).days / 30)
+        return floor((self.maturity - clock.as_of()).days / 30)
 
+    @clock.cached
     def get_maturity_years(self)-> int:
-        return floor((self.maturity - datetime.now()).days / 365)
+        return floor((self.maturity - clock.as_of()).days / 365)
 
+    @clock.cached
     def get_total_yield(self, amount_invested: int = None)-> float:
         """Get the total amount of money returned at maturity, including intermediate coupons and final principal return."""
         amount_invested = self.price if amount_invested is None else amount_invested
@@ -130,6 +179,7 @@ class Bond:
 
         return (yield_per_month * self.get_maturity_months()) + amount_invested
 
+    @clock.cached
     def get_maturity_growth(self)-> float:
         """Get the growth % between the initial price of a bond and the total money returned at maturity."""
         return self._calc_percentage_diff(self.price, self.get_total_yield())
@@ -137,6 +187,7 @@ class Bond:
     def get_rating_score(self)-> str:
         return self._rating.get_score()
 
+    @clock.cached
     def get_risk_score(self)-> float:
         risk = 0
         if self.get_maturity_years() > 0:
@@ -166,7 +217,7 @@ class Bond:
                 raise Exception("could not figure out coupon payout")
 
     def is_rate(self, rate: str)-> bool:
-        return self._rating == Rating(rate)
+        return self._rating == Rating.of(rate)
 
     def is_a_rate(self)-> bool:
         return self._rating.is_a_rate()
@@ -200,3 +251,6 @@ class Bond:
 
     def is_secured(self)-> bool:
         return "Secured" in self.seniority
+
+
+PROPERTIES: List[str] = [ f.name for f in fields(Bond) if f.name[:1] != "_" ]
@@ -1,9 +1,57 @@
 from __future__ import annotations
-from typing import List, Callable
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Tuple
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
-from pandas import DataFrame
+import numpy as np
+from src import timings
 from src.bond import Bond
+from src.cashflow import Schedule, schedule, solve_ytm
+from src.columns import BondColumns, FIELDS, RATING_FIELDS, maturity_cutoff
+from src.expression import compile_where, literal
+from src.index import Indexes
+from src.rating import rate_score
+from src.query import Predicate, evaluate
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
+
+SORT_KEYS: Dict[str, Callable[[BondColumns], np.ndarray]] = {
+    "length": lambda c: c.maturity_months(),
+    "maturity": lambda c: c["maturity"],
+    "score": lambda c: c.rating_score(),
+    "yield": lambda c: c.total_yield(),
+    "risk": lambda c: c.risk_score(),
+}
+"""Sort keys by name, each computed once into an array over the whole collection."""
+
+SortSpec = List[Tuple[str, str]]
+
+
+def parse_sort(value: str, direction: str = "desc")-> SortSpec:
+    """
+        Parse a sort such as "yield:desc,risk:asc" into (key, direction) pairs, most significant first.
+
+        Keys without a direction take the given default.
+    """
+    spec = []
+    for part in value.split(","):
+        name, _, order = part.strip().partition(":")
+        order = order or direction
+        if name not in SORT_KEYS:
+            raise ValueError(f"unknown sort key: {name}, expected one of {', '.join(SORT_KEYS)}")
+        if order not in ["asc", "desc"]:
+            raise ValueError(f"unknown sort direction: {order}, expected asc or desc")
+
+        spec.append((name, order))
+
+    return spec
+
+def _ordered(key: np.ndarray, direction: str)-> np.ndarray:
+    """Key array that sorts ascending in the wanted direction, with missing values last either way."""
+    if np.issubdtype(key.dtype, np.datetime64):
+        key = np.where(np.isnat(key), np.nan, key.astype(np.int64).astype(np.float64))
+
+    return -key if direction == "desc" else key
 
 
 def bonds(*bonds: List[Bond])-> Bonds:
@@ -16,139 +64,441 @@ def bonds(*bonds: List[Bond])-> Bonds:
     if isinstance(bonds[0], list):
         bonds = bonds[0]
 
-    for b in bonds:
-        assert isinstance(b, Bond), "Not instance of Bond class"
-        bonds.append(b)
+    for bond in bonds:
+        b.append(bond)
 
     return b
 
-class Bonds(list):
-    """Bonds is a collection of Bond models."""
-    
+class Bonds:
+    """
+        Bonds is a collection of Bond models.
+
+        The collection is backed by a columnar store, so filters and sorts run as vectorized
+        operations over NumPy arrays. Bond models are only materialized when accessed.
+
+        Filters are lazy: each only_* call records a predicate, and the whole chain is evaluated
+        in one fused pass the first time the result is used.
+
+        Lookups and threshold filters go through indexes built on first use. Any change to the
+        collection (append, sort, +) replaces the columns, and with them the indexes.
+    """
+
     def __init__(self, *data: List[Bond]):
-        super(Bonds, self).__init__(data)
+        self._columns = BondColumns.empty()
+        self._rows: List[Bond | None] = []
+        self._pending: List[Bond] = []
+        self._plan: List[Predicate] = []
+        self._source: Callable[[List[Predicate]], BondColumns] | None = None
+        self._indexes: Indexes | None = None
+        for b in data:
+            self.append(b)
+
+    @classmethod
+    def from_columns(cls, columns: BondColumns, rows: List[Bond | None] = None, indexes: Indexes = None)-> Bonds:
+        """Collection over existing columns, sharing indexes already built on them when given."""
+        b = cls()
+        b._set(columns, [None] * len(columns) if rows is None else rows)
+        b._indexes = indexes
+
+        return b
+
+    @classmethod
+    def scan(cls, source: Callable[[List[Predicate]], BondColumns])-> Bonds:
+        """
+            Lazy collection loaded on first use.
+
+            The source receives the recorded predicates, so it can push them down into the loader.
+        """
+        b = cls()
+        b._source = source
+
+        return b
+
+    def _set(self, columns: BondColumns, rows: List[Bond | None])-> None:
+        self._columns = columns
+        self._rows = rows
+        self._indexes = None
+
+    def _resolve(self)-> None:
+        if self._source is not None:
+            columns = self._source(self._plan)
+            self._source = None
+            self._set(columns, [None] * len(columns))
+        elif len(self._plan) > 0:
+            idx = evaluate(self._columns, self._plan, self._indexes)
+            self._set(self._columns.take(idx), [ self._rows[i] for i in idx ])
+
+        self._plan = []
+
+    def _flush(self)-> None:
+        self._resolve()
+        if len(self._pending) == 0:
+            return
+
+        self._set(self._columns.concat(BondColumns.from_bonds(self._pending)), self._rows + self._pending)
+        self._pending = []
+
+    @property
+    def columns(self)-> BondColumns:
+        self._flush()
+        return self._columns
+
+    @property
+    def plan(self)-> List[Predicate]:
+        """Filter steps recorded but not evaluated yet."""
+        return list(self._plan)
+
+    @property
+    def indexes(self)-> Indexes:
+        self._flush()
+        if self._indexes is None:
+            self._indexes = Indexes(self._columns)
+
+        return self._indexes
+
+    def _materialize(self)-> List[Bond]:
+        self._flush()
+        missing = [ i for i, b in enumerate(self._rows) if b is None ]
+        if len(missing) > 0:
+            with timings.stage("bond construction", len(missing)):
+                for i, b in zip(missing, self._columns.rows(missing)):
+                    self._rows[i] = b
+
+        return self._rows
+
+    def __len__(self)-> int:
+        self._resolve()
+        return len(self._rows) + len(self._pending)
+
+    def __iter__(self)-> Iterator[Bond]:
+        return iter(self._materialize())
+
+    def __getitem__(self, key: int | slice)-> Bond | Bonds:
+        self._flush()
+        if isinstance(key, slice):
+            return self._take(np.arange(len(self))[key])
+
+        if self._rows[key] is None:
+            self._rows[key] = self._columns.rows([key if key >= 0 else len(self) + key])[0]
+
+        return self._rows[key]
 
     def __add__(self, bonds: Bonds)-> Bonds:
-        res = Bonds()
-        for b in self:
-            res.append(b)
+        return Bonds.from_columns(self.columns.concat(bonds.columns), self._rows + bonds._rows)
+
+    def append(self, bond: Bond)-> None:
+        assert isinstance(bond, Bond), "Not instance of Bond class"
+        self._resolve()
+        self._pending.append(bond)
+
+    def sort(self, key: Callable[[Bond], object], reverse: bool = False)-> None:
+        rows = self._materialize()
+        self._reorder(np.array(sorted(range(len(rows)), key=lambda i: key(rows[i]), reverse=reverse), dtype=np.int64))
+
+    def _take(self, idx: np.ndarray)-> Bonds:
+        return Bonds.from_columns(self._columns.take(idx), [ self._rows[i] for i in idx ])
+
+    def _reorder(self, idx: np.ndarray)-> None:
+        self._set(self._columns.take(idx), [ self._rows[i] for i in idx ])
+
+    def _sort_by_key(self, key: np.ndarray, direction: str)-> None:
+        """Stable sort by a precomputed key array, equal keys keep their order in both directions."""
+        self._flush()
+        with timings.stage("sort", len(key)):
+            self._reorder(np.argsort(_ordered(key, direction), kind="stable"))
+
+    def _order(self, spec: SortSpec, count: int | None = None)-> np.ndarray:
+        """
+            Row positions in sort order, or only the first count of them.
+
+            With a count, the rows that can make the cut are picked by partitioning on the most
+            significant key, and only those are sorted. Ties with the last row that made it are
+            kept as candidates, so the result is the same as slicing the full stable sort.
+        """
+        columns = self.columns
+        keys = [ _ordered(np.asarray(SORT_KEYS[name](columns)), direction) for name, direction in spec ]
+        n = len(columns)
+        idx = np.arange(n)
+        if count is not None and count <= 0:
+            return idx[:0]
+
+        if count is not None and count < n:
+            primary = keys[0]
+            kth = primary[np.argpartition(primary, count - 1)[count - 1]]
+            if not np.issubdtype(primary.dtype, np.floating) or not np.isnan(kth):
+                idx = np.flatnonzero(primary <= kth)
+
+        # lexsort is stable and takes the most significant key last.
+        order = idx[np.lexsort([ k[idx] for k in reversed(keys) ])]
+
+        return order if count is None else order[:count]
+
+    def sort_by(self, spec: SortSpec)-> None:
+        """Stable sort on several keys, such as [("yield", "desc"), ("risk", "asc")]."""
+        self._flush()
+        with timings.stage("sort", len(self._columns)):
+            self._reorder(self._order(spec))
+
+    def top(self, count: int, spec: SortSpec)-> Bonds:
+        """The first count bonds of the sort, without sorting the whole collection."""
+        with timings.stage("top", count) as s:
+            idx = self._order(spec, count)
+            s.rows = len(idx)
+
+            return self._take(idx)
+
+    def _only_this(self, predicate: Predicate)-> Bonds:
+        """Record a filter step, returning a new lazy collection."""
+        if self._source is None and len(self._plan) == 0:
+            # Appended bonds are concatenated first, which also drops indexes built without them.
+            self._flush()
+            if self._indexes is None:
+                # Share one index set, so indexes built while evaluating the child stay with this collection.
+                self._indexes = Indexes(self._columns)
+
+        b = Bonds()
+        b._set(self._columns, self._rows)
+        b._indexes, b._source = self._indexes, self._source
+        b._plan = self._plan + [predicate]
 
-        for b in bonds:
-            res.append(b)
+        return b
 
-        return res
-    
-    def _only_this(self, cb: Callable[[Bond], bool])-> Bonds:
-        res = bonds()
-        for b in self:
-            if cb(b):
-                res.append(b)
+    def where(
+        self,
+        name: str,
+        fields: List[str],
+        fn: Callable[[BondColumns], np.ndarray],
+        cost: int = 1,
+        seek: Callable[[Indexes], np.ndarray] = None)-> Bonds:
+        return self._only_this(Predicate(name, tuple(fields), fn, cost, seek=seek))
+
+    def query(self, expression: str)-> Bonds:
+        """Bonds matching a filter expression, such as "coupon > 0.07 and (country == 'GB' or rating <= 'BBB-')"."""
+        b = self
+        for predicate in compile_where(expression):
+            b = b._only_this(predicate)
 
-        return res
+        return b
 
     def to_df(self)-> DataFrame | None:
+        """Typed DataFrame of the bonds, with datetime64 dates and category dtype categorical fields."""
+        from src.export import frame
+
         if len(self) == 0:
             return None
 
-        keys = self[0].get_properties()
-        columns = [ attr.title() for attr in keys ]
-        data = []
-        for b in self:
-            data.append([ getattr(b, k) for k in keys ])
+        columns = self.columns
 
-        return DataFrame(data, columns=columns)
+        with timings.stage("dataframe build", len(columns)):
+            return frame(columns, FIELDS + ["id"])
 
     def to_tickers(self)-> List[str]:
-        return [ b.ticker for b in self ]
-    
+        return self.columns["ticker"].tolist()
+
     def to_company_names(self)-> List[str]:
-        return [ b.company for b in self ]
+        return self.columns["company"].tolist()
 
     def only_secured_seniority(self)-> Bonds:
-        return self._only_this(lambda b: "Secured" in b.seniority)
+        return self.where("secured_seniority", ["seniority"], lambda c: c["seniority"].contains("Secured"))
 
     def only_bond_type(self)-> Bonds:
-        return self._only_this(lambda b: b.type == "Bond")
+        return self.where("bond_type", ["type"], lambda c: c["type"].eq("Bond"))
 
     def only_gbp_currency(self)-> Bonds:
-        return self._only_this(lambda b: b.currency == "GBP")
+        return self.where("gbp_currency", ["currency"], lambda c: c["currency"].eq("GBP"))
 
     def only_uk_based(self)-> Bonds:
-        return self._only_this(lambda b: b.country == "GB")
+        return self.where("uk_based", ["country"], lambda c: c["country"].eq("GB"))
 
     def only_country(self, value: str)-> Bonds:
-        return self._only_this(lambda b: b.country == value)
+        return self.where("country", ["country"], lambda c: c["country"].eq(value))
 
     def only_public_companies(self)-> Bonds:
-        return self._only_this(lambda b: b.ownership == "Public")
+        return self.where("public_companies", ["ownership"], lambda c: c["ownership"].eq("Public"))
 
     def only_private_companies(self)-> Bonds:
-        return self._only_this(lambda b: b.ownership == "Private")
+        return self.where("private_companies", ["ownership"], lambda c: c["ownership"].eq("Private"))
 
     def only_fixed_coupon(self)-> Bonds:
-        return self._only_this(lambda b: b.coupon_type == "Fixed")
+        return self.where("fixed_coupon", ["coupon_type"], lambda c: c["coupon_type"].eq("Fixed"))
 
     def only_coupon_gt(self, value: float)-> Bonds:
-        return self._only_this(lambda b: b.coupon > value)
+        return self.where("coupon_gt", ["coupon"], lambda c: c["coupon"] > value,
+            seek=lambda ix: ix.sorted("coupon").gt(value))
 
     def only_current_yield_gt(self, value: float)-> Bonds:
-        return self._only_this(lambda b: b.current_yield > value)
+        return self.where("current_yield_gt", ["current_yield"], lambda c: c["current_yield"] > value,
+            seek=lambda ix: ix.sorted("current_yield").gt(value))
 
-    def only_available(self)-> Bonds:
-        return self._only_this(lambda b: b.available > 0)
-    
     def only_max_maturity_months(self, months: int)-> Bonds:
-        return self._only_this(lambda b: b.get_maturity_months() < months)
+        return self.where("max_maturity_months", ["maturity"], lambda c: c.maturity_months() < months, 3,
+            seek=lambda ix: ix.sorted("maturity").lt(maturity_cutoff(30 * months)))
+
+    def only_maturity_between(self, start: datetime, end: datetime)-> Bonds:
+        low, high = np.datetime64(start, "us"), np.datetime64(end, "us")
+        return self.where("maturity_between", ["maturity"], lambda c: (c["maturity"] >= low) & (c["maturity"] <= high),
+            seek=lambda ix: ix.sorted("maturity").between(low, high))
 
     def only_max_maturity_years(self, years: int)-> Bonds:
-        return self._only_this(lambda b: b.get_maturity_years() < years)
+        return self.where("max_maturity_years", ["maturity"], lambda c: c.maturity_years() < years, 3,
+            seek=lambda ix: ix.sorted("maturity").lt(maturity_cutoff(365 * years)))
 
     def only_investment_grade(self)-> Bonds:
-        return self._only_this(lambda b: b.is_investment_grade())
+        return self.where("investment_grade", RATING_FIELDS, lambda c: c.is_investment_grade(), 2)
 
     def only_high_yield_grade(self)-> Bonds:
-        return self._only_this(lambda b: b.is_high_yield_grade())
+        return self.where("high_yield_grade", RATING_FIELDS, lambda c: c.is_high_yield_grade(), 2)
+
+    def only_min_rating(self, rate: str)-> Bonds:
+        """Rated bonds at least as good as the given rate, such as "BBB-" or "Baa3"."""
+        limit = rate_score(rate)
+        return self.where("min_rating", RATING_FIELDS, lambda c: (0 < c.rating_score()) & (c.rating_score() <= limit), 2)
 
     def only_premium_price(self)-> Bonds:
-        return self._only_this(lambda b: b.is_premium())
+        return self.where("premium_price", ["price"], lambda c: c["price"] > 100,
+            seek=lambda ix: ix.sorted("price").gt(100))
 
     def only_discount_price(self)-> Bonds:
-        return self._only_this(lambda b: b.is_discount())
+        return self.where("discount_price", ["price"], lambda c: c["price"] < 100,
+            seek=lambda ix: ix.sorted("price").lt(100))
 
     def only_available(self)-> Bonds:
-        return self._only_this(lambda b: b.is_available())
+        return self.where("available", ["available"], lambda c: c["available"] > 0)
 
     def sort_by_maturity(self, direction = "desc")-> None:
-        self.sort(key=lambda x: x.maturity, reverse=True if direction == "desc" else False)
+        self._sort_by_key(SORT_KEYS["maturity"](self.columns), direction)
 
     def sort_by_length(self, direction = "desc")-> None:
-        self.sort(key=lambda x: x.get_maturity_months(), reverse=True if direction == "desc" else False)
+        self._sort_by_key(SORT_KEYS["length"](self.columns), direction)
 
     def sort_by_rating_score(self, direction = "desc")-> None:
-        self.sort(key=lambda x: x.get_rating_score(), reverse=True if direction == "desc" else False)
+        self._sort_by_key(SORT_KEYS["score"](self.columns), direction)
 
     def sort_by_total_yield(self, direction = "desc")-> None:
-        self.sort(key=lambda x: x.get_total_yield(), reverse=True if direction == "desc" else False)
+        self._sort_by_key(SORT_KEYS["yield"](self.columns), direction)
 
     def sort_by_risk_score(self, direction = "desc")-> None:
-        self.sort(key=lambda x: x.get_risk_score(), reverse=True if direction == "desc" else False)
+        self._sort_by_key(SORT_KEYS["risk"](self.columns), direction)
+
+    def cash_flows(self)-> Schedule:
+        """Remaining coupons and redemption of every bond, as of the clock date."""
+        return schedule(self.columns)
+
+    def yields_to_maturity(self, prices: np.ndarray = None)-> np.ndarray:
+        """Solve yield to maturity for every bond, from the listed clean prices unless others are given."""
+        return solve_ytm(self.cash_flows(), self.columns["price"] if prices is None else prices)
 
     def first(self, count: int = 1)-> Bonds:
-        b = bonds()
-        [ b.append(bond) for bond in self[0:count] ]
+        return self[0:count]
 
-        return b
+    def _find_by(self, field: str, value: str)-> Bond | None:
+        pos = self.indexes.unique(field).get(value)
+        return self[pos] if pos is not None else None
 
     def find_by_ticker(self, ticker: str)-> Bond | None:
-        for b in self:
-            if b.ticker == ticker:
-                return b
-
-        return None
+        return self._find_by("ticker", ticker)
 
     def find_by_isin(self, isin: str)-> Bond | None:
-        for b in self:
-            if b.isin == isin:
-                return b
+        return self._find_by("isin", isin)
+
+    def find_by_id(self, id: str)-> Bond | None:
+        return self._find_by("id", id)
+
+    def find_by_isins(self, isins: List[str])-> Bonds:
+        """Batch lookup, bonds come back in the order of the ISINs asked for and missing ones are skipped."""
+        return self._take(np.array(self.indexes.unique("isin").get_many(isins), dtype=np.int64))
+
+
+def screen_expression(
+    based: str = None,
+    coupon: float = None,
+    current_yield: float = None,
+    maturity_months: int = None,
+    maturity_years: int = None,
+    investment_grade: bool = False,
+    high_yield_grade: bool = False,
+    premium: bool = False,
+    discount: bool = False,
+    available: bool = False)-> str | None:
+    """
+        Filter expression of the filter subcommand options, every option given is ANDed.
+
+        Options that can never hold together are rejected rather than one of them being dropped,
+        an expression such as "investment_grade or high_yield_grade" says what was meant.
+    """
+    if investment_grade and high_yield_grade:
+        raise ValueError("investment grade and high yield grade exclude each other, use an expression such as 'investment_grade or high_yield_grade'")
+
+    if premium and discount:
+        raise ValueError("premium and discount exclude each other, use an expression such as 'premium or discount'")
+
+    terms = []
+    if based is not None:
+        terms.append(f"country == {literal(based)}")
+
+    if coupon is not None:
+        terms.append(f"coupon > {coupon!r}")
+
+    if current_yield is not None:
+        terms.append(f"current_yield > {current_yield!r}")
+
+    if investment_grade:
+        terms.append("investment_grade")
+
+    if high_yield_grade:
+        terms.append("high_yield_grade")
+
+    if premium:
+        terms.append("premium")
+
+    if discount:
+        terms.append("discount")
+
+    if maturity_months is not None:
+        terms.append(f"maturity_months < {maturity_months!r}")
+
+    if maturity_years is not None:
+        terms.append(f"maturity_years < {maturity_years!r}")
+
+    if available:
+        terms.append("available > 0")
+
+    return " and ".join(terms) if len(terms) > 0 else None
+
+def screen(
+    b: Bonds,
+    based: str = None,
+    coupon: float = None,
+    current_yield: float = None,
+    maturity_months: int = None,
+    maturity_years: int = None,
+    investment_grade: bool = False,
+    high_yield_grade: bool = False,
+    premium: bool = False,
+    discount: bool = False,
+    available: bool = False,
+    where: str = None)-> Bonds:
+    """
+        Apply the filter subcommand options, returning the lazy filtered collection.
+
+        The options and the where expression compile to the same kind of predicates.
+    """
+    expression = screen_expression(
+        based,
+        coupon,
+        current_yield,
+        maturity_months,
+        maturity_years,
+        investment_grade,
+        high_yield_grade,
+        premium,
+        discount,
+        available)
+
+    if expression is not None:
+        b = b.query(expression)
+
+    if where is not None:
+        b = b.query(where)
 
-        return None
\ No newline at end of file
+    return b
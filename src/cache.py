@@ -0,0 +1,159 @@
+from __future__ import annotations
+from typing import Dict, Tuple
+from pathlib import Path
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+from src.columns import BondColumns, Categorical
+
+
+CACHE_VERSION = 3
+"""Bump when the parsed column layout changes, so older snapshots are rebuilt."""
+
+
+def cache_dir()-> Path:
+    """Directory holding parsed snapshots, override with BONDS_CACHE_DIR."""
+    default = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "bonds"
+    return Path(os.environ.get("BONDS_CACHE_DIR", default))
+
+def file_hash(file_path: str)-> str:
+    """Hash of the content of a market file, decompressed when it ends in .gz."""
+    h = hashlib.sha256()
+    with (gzip.open if file_path.endswith(".gz") else open)(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+def snapshot_key(file_path: str)-> Dict[str, object]:
+    """Key identifying a parsed snapshot: path, size and mtime of the source file, read without opening it."""
+    stat = os.stat(file_path)
+    return {
+        "version": CACHE_VERSION,
+        "path": str(Path(file_path).resolve()),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+    }
+
+def _entry_dir(file_path: str)-> Path:
+    name = hashlib.sha256(str(Path(file_path).resolve()).encode()).hexdigest()[:24]
+    return cache_dir() / name
+
+def _to_fixed_width(values: np.ndarray)-> np.ndarray:
+    """Store strings as fixed width unicode, which NumPy can memory map."""
+    return values.astype(str) if len(values) > 0 else np.empty(0, dtype="U1")
+
+def save_snapshot(file_path: str, columns: BondColumns, key: Dict[str, object] = None, row_hashes: np.ndarray = None)-> None:
+    """Save parsed columns, and the hash of each raw row when given, so a later version of the file can be applied incrementally."""
+    entry = _entry_dir(file_path)
+    tmp = entry.with_name(f"{entry.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    meta = {
+        "key": snapshot_key(file_path) if key is None else key,
+        "sha256": file_hash(file_path),
+        "categories": {},
+    }
+    for field, col in columns.data.items():
+        if isinstance(col, Categorical):
+            meta["categories"][field] = col.categories.tolist()
+            np.save(tmp / f"{field}.npy", col.codes)
+        elif col.dtype == object:
+            np.save(tmp / f"{field}.npy", _to_fixed_width(col))
+        else:
+            np.save(tmp / f"{field}.npy", col)
+
+    if row_hashes is not None:
+        np.save(tmp / "_row_hash.npy", row_hashes)
+
+    (tmp / "meta.json").write_text(json.dumps(meta))
+
+    # Swap the whole entry in at once, so readers never see a half written snapshot.
+    old = entry.with_name(f"{entry.name}.{os.getpid()}.old")
+    if entry.exists():
+        entry.rename(old)
+    tmp.rename(entry)
+    shutil.rmtree(old, ignore_errors=True)
+
+def _read_meta(entry: Path)-> dict | None:
+    try:
+        return json.loads((entry / "meta.json").read_text())
+    except (OSError, ValueError):
+        return None
+
+def _write_meta(entry: Path, meta: dict)-> None:
+    tmp = entry / f"meta.json.{os.getpid()}.tmp"
+    tmp.write_text(json.dumps(meta))
+    os.replace(tmp, entry / "meta.json")
+
+def load_snapshot(file_path: str, key: Dict[str, object] = None)-> BondColumns | None:
+    """
+        Load a parsed snapshot with its arrays memory mapped, or None when missing or stale.
+
+        The file is only hashed when its size matches but its mtime does not, then a matching
+        hash keeps the snapshot and records the new mtime.
+    """
+    key = snapshot_key(file_path) if key is None else key
+    entry = _entry_dir(file_path)
+    meta = _read_meta(entry)
+    if meta is None or meta["key"].get("version") != CACHE_VERSION:
+        return None
+
+    if meta["key"] != key:
+        if meta["key"]["size"] != key["size"] or meta.get("sha256") != file_hash(file_path):
+            return None
+
+        # Touched or copied over with the same contents.
+        meta["key"] = key
+        try:
+            _write_meta(entry, meta)
+        except OSError:
+            pass
+
+    return _load_columns(entry, meta)
+
+def load_previous(file_path: str)-> Tuple[BondColumns, np.ndarray] | None:
+    """
+        Columns and raw row hashes of the snapshot last cached for this path, even when the file
+        changed since. None when there is none, or it has no row hashes.
+    """
+    entry = _entry_dir(file_path)
+    meta = _read_meta(entry)
+    if meta is None or meta["key"].get("version") != CACHE_VERSION or not (entry / "_row_hash.npy").exists():
+        return None
+
+    try:
+        return _load_columns(entry, meta), np.load(entry / "_row_hash.npy")
+    except (OSError, ValueError):
+        return None
+
+def _load_columns(entry: Path, meta: dict)-> BondColumns:
+    data = {}
+    for path in entry.glob("*.npy"):
+        field = path.stem
+        if field.startswith("_"):
+            continue
+
+        col = np.load(path, mmap_mode="r")
+        if field in meta["categories"]:
+            data[field] = Categorical(np.array(meta["categories"][field], dtype=object), col)
+        else:
+            data[field] = col
+
+    return BondColumns(data)
+
+def clear()-> int:
+    """Remove every cached snapshot, return how many were removed."""
+    root = cache_dir()
+    if not root.exists():
+        return 0
+
+    entries = [ p for p in root.iterdir() if p.is_dir() ]
+    for p in entries:
+        shutil.rmtree(p, ignore_errors=True)
+
+    return len(entries)
@@ -0,0 +1,273 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import datetime
+import numpy as np
+from src import clock
+from src.columns import BondColumns
+
+
+COUPON_COUNTS: dict = {
+    "Annual": 1,
+    "Biannual": 2,
+    "Quarterly": 4,
+}
+"""Coupon payouts per year, by coupon frequency. Same table as Bond.get_coupon_count."""
+
+FACE = 100.0
+"""Prices are quoted per 100 nominal."""
+
+NAT = np.iinfo(np.int64).min
+"""NaT as an int64 count of months or days."""
+
+
+def coupon_counts(columns: BondColumns)-> np.ndarray:
+    frequency = columns["coupon_frequency"]
+    unknown = [ f for f in frequency.categories if f not in COUPON_COUNTS ]
+    if len(unknown) > 0:
+        raise Exception(f"could not figure out coupon payout: {unknown}")
+
+    return frequency.map(COUPON_COUNTS, np.int64)
+
+def add_months(dates: np.ndarray, months: np.ndarray, day: np.ndarray)-> np.ndarray:
+    """Shift dates by a number of months, landing on the given day of month or the month end."""
+    month = dates.astype("datetime64[M]").astype(np.int64) + months
+
+    return month_day(np.where(np.isnat(dates), NAT, month), day)
+
+def month_day(month: np.ndarray, day: np.ndarray)-> np.ndarray:
+    """
+        Dates on the given zero based day of months counted from 1970, or on the month end. NAT months give NaT.
+
+        Month starts come from a table over the range spanned, numpy's month to day conversion
+        is slow and the same few hundred months repeat across every bond.
+    """
+    month = np.asarray(month, dtype=np.int64)
+    nat = month == NAT
+    if nat.all():
+        return np.full(month.shape, np.datetime64("NaT"), dtype="datetime64[D]")
+
+    low = month[~nat].min()
+    index = np.where(nat, 0, month - low)
+    starts = np.arange(low, month[~nat].max() + 2).astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+    start = starts[index]
+    days_in_month = starts[index + 1] - start
+    dates = (start + np.minimum(day, days_in_month - 1)).astype("datetime64[D]")
+
+    return np.where(nat, np.datetime64("NaT"), dates) if nat.any() else dates
+
+def day_of_month(dates: np.ndarray)-> np.ndarray:
+    """Zero based day of month."""
+    return (dates - dates.astype("datetime64[M]").astype("datetime64[D]")).astype(np.int64)
+
+
+@dataclass
+class Schedule:
+    """
+        Remaining cash flows of many bonds, per 100 nominal, as 2D arrays with one row per bond.
+
+        Columns past a bond's last cash flow are padded with zero amounts and masked out.
+    """
+
+    settlement: np.datetime64
+
+    frequency: np.ndarray
+    """Coupons per year."""
+
+    dates: np.ndarray
+
+    amounts: np.ndarray
+
+    mask: np.ndarray
+
+    times: np.ndarray
+    """Years from settlement to each cash flow, actual/365."""
+
+    accrued: np.ndarray
+    """Accrued interest at settlement."""
+
+    def __len__(self)-> int:
+        return len(self.frequency)
+
+    def take(self, idx: np.ndarray)-> Schedule:
+        return Schedule(
+            self.settlement,
+            self.frequency[idx],
+            self.dates[idx],
+            self.amounts[idx],
+            self.mask[idx],
+            self.times[idx],
+            self.accrued[idx],
+        )
+
+    def discount_factors(self, ytm: np.ndarray)-> np.ndarray:
+        f = self.frequency[:, None]
+        return np.where(self.mask, (1 + np.asarray(ytm, dtype=np.float64)[:, None] / f) ** (-f * self.times), 0)
+
+    def dirty_price(self, ytm: np.ndarray)-> np.ndarray:
+        return (self.amounts * self.discount_factors(ytm)).sum(axis=1)
+
+    def clean_price(self, ytm: np.ndarray)-> np.ndarray:
+        return self.dirty_price(ytm) - self.accrued
+
+    def _dirty_price_and_slope(self, ytm: np.ndarray):
+        f = self.frequency[:, None]
+        discount = self.discount_factors(ytm)
+        pv = self.amounts * discount
+        slope = -(pv * self.times / (1 + ytm[:, None] / f)).sum(axis=1)
+
+        return pv.sum(axis=1), slope
+
+
+def schedule(columns: BondColumns, as_of: datetime = None)-> Schedule:
+    """Generate every remaining coupon and the redemption of each bond, from its next payment date and frequency."""
+    settlement = np.datetime64(clock.as_of() if as_of is None else as_of, "D")
+    frequency = coupon_counts(columns)
+    step = 12 // frequency
+    maturity = columns["maturity"].astype("datetime64[D]")
+    next_payment = columns["next_payment"].astype("datetime64[D]")
+    day = day_of_month(maturity)
+
+    # Start one period before the next payment, so the accrual period around settlement is covered.
+    first = add_months(next_payment, -step, day)
+    span = (maturity.astype("datetime64[M]") - first.astype("datetime64[M]")).astype(np.int64)
+    periods = np.maximum(-(-span // step), 0) + 1
+    width = int(periods.max()) if len(periods) > 0 else 1
+
+    j = np.arange(width)[None, :]
+    regular_dates = add_months(first[:, None], j * step[:, None], day[:, None])
+    coupon_dates = np.where(regular_dates > maturity[:, None], maturity[:, None], regular_dates)
+    in_schedule = j < periods[:, None]
+
+    last_paid = np.where(in_schedule & (coupon_dates <= settlement), coupon_dates, np.datetime64("NaT"))
+    following = np.where(in_schedule & (coupon_dates > settlement), coupon_dates, np.datetime64("NaT"))
+    previous = np.max(np.where(np.isnat(last_paid), np.datetime64("1900-01-01"), last_paid), axis=1)
+    upcoming = np.min(np.where(np.isnat(following), np.datetime64("9999-12-31"), following), axis=1)
+
+    coupon = columns["coupon"] * FACE / frequency
+    period = (upcoming - previous).astype(np.float64)
+    elapsed = (settlement - previous).astype(np.float64)
+    has_previous = (in_schedule & (coupon_dates <= settlement)).any(axis=1)
+    accrued = np.where(has_previous & (upcoming <= maturity) & (elapsed < period), coupon * elapsed / period, 0)
+
+    mask = in_schedule & (coupon_dates > settlement)
+    # Guard against the maturity clamp producing the same date twice.
+    mask[:, 1:] &= coupon_dates[:, 1:] != coupon_dates[:, :-1]
+    amounts = np.where(mask, coupon[:, None], 0.0)
+
+    # A maturity off the coupon cycle ends with a short stub period, paying a part of the coupon.
+    period_start = np.concatenate([first[:, None], coupon_dates[:, :-1]], axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        stub = (coupon_dates - period_start).astype(np.float64) / (regular_dates - period_start).astype(np.float64)
+    amounts = np.where(mask & (regular_dates > maturity[:, None]), amounts * np.nan_to_num(stub), amounts)
+
+    is_redemption = mask & (coupon_dates == maturity[:, None])
+    amounts = amounts + np.where(is_redemption, FACE, 0.0)
+    times = np.where(mask, (coupon_dates - settlement).astype(np.float64) / 365, 0.0)
+
+    return Schedule(settlement, frequency.astype(np.float64), coupon_dates, amounts, mask, times, accrued)
+
+@dataclass
+class Flows:
+    """
+        Remaining cash flows of many bonds, per 100 nominal, as flat arrays with one entry per payment.
+
+        Same payments as the Schedule grid, without the padding up to the longest bond.
+    """
+
+    settlement: np.datetime64
+
+    frequency: np.ndarray
+    """Coupons per year, per bond."""
+
+    bond: np.ndarray
+    """Row of the bond paying, flows of a bond are contiguous and in date order."""
+
+    dates: np.ndarray
+
+    amounts: np.ndarray
+
+    redemption: np.ndarray
+    """Principal part of each amount."""
+
+    def __len__(self)-> int:
+        return len(self.bond)
+
+    def times(self)-> np.ndarray:
+        """Years from settlement to each payment, actual/365 like Schedule.times."""
+        return (self.dates - self.settlement).astype(np.float64) / 365
+
+def flows(columns: BondColumns, as_of: datetime = None)-> Flows:
+    """Every remaining coupon and redemption, generated like schedule, only for the periods each bond has."""
+    settlement = np.datetime64(clock.as_of() if as_of is None else as_of, "D")
+    frequency = coupon_counts(columns)
+    step = 12 // frequency
+    maturity = columns["maturity"].astype("datetime64[D]")
+    next_payment = columns["next_payment"].astype("datetime64[D]")
+    day = day_of_month(maturity)
+
+    first = add_months(next_payment, -step, day)
+    span = (maturity.astype("datetime64[M]") - first.astype("datetime64[M]")).astype(np.int64)
+    periods = np.maximum(-(-span // step), 0) + 1
+
+    bond = np.repeat(np.arange(len(periods)), periods)
+    starts = np.cumsum(periods) - periods
+    j = np.arange(len(bond)) - np.repeat(starts, periods)
+    first_month = first.astype("datetime64[M]").astype(np.int64)
+    regular_dates = month_day(first_month[bond] + j * step[bond], day[bond])
+    dates = np.minimum(regular_dates, maturity[bond])
+
+    keep = dates > settlement
+    # Same guard as schedule, against the maturity clamp producing the same date twice.
+    keep[1:] &= (dates[1:] != dates[:-1]) | (bond[1:] != bond[:-1])
+
+    coupon = (columns["coupon"] * FACE / frequency)[bond]
+    period_start = np.where(j > 0, np.concatenate([first[:1], dates[:-1]]), first[bond])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        stub = (dates - period_start).astype(np.float64) / (regular_dates - period_start).astype(np.float64)
+    amounts = np.where(regular_dates > maturity[bond], coupon * np.nan_to_num(stub), coupon)
+
+    redemption = np.where(dates == maturity[bond], FACE, 0.0)
+    bond, dates, amounts, redemption = bond[keep], dates[keep], amounts[keep], redemption[keep]
+
+    return Flows(settlement, frequency.astype(np.float64), bond, dates, amounts + redemption, redemption)
+
+def solve_ytm(sched: Schedule, clean_prices: np.ndarray, tol: float = 1e-10, max_iter: int = 100)-> np.ndarray:
+    """
+        Yield to maturity for every bond at once, with Newton steps safeguarded by bisection.
+
+        Each bond keeps a bracket around its root, a Newton step that leaves the bracket is
+        replaced by its midpoint. Converged bonds drop out, so later iterations only price the
+        few that are left. Bonds without remaining cash flows get NaN.
+    """
+    dirty = np.asarray(clean_prices, dtype=np.float64) + sched.accrued
+    ytm = np.full(len(sched), np.nan)
+    todo = np.flatnonzero(sched.mask.any(axis=1))
+    ytm[todo] = 0.05
+    lo = -0.99 * sched.frequency
+    hi = np.full(len(sched), 100.0)
+
+    for _ in range(max_iter):
+        if len(todo) == 0:
+            break
+
+        price, slope = sched.take(todo)._dirty_price_and_slope(ytm[todo])
+        diff = price - dirty[todo]
+
+        # Price falls as yield rises, a positive difference means the root is above.
+        lo[todo] = np.where(diff > 0, ytm[todo], lo[todo])
+        hi[todo] = np.where(diff <= 0, ytm[todo], hi[todo])
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = ytm[todo] - diff / slope
+
+        bisect = ~np.isfinite(step) | (step <= lo[todo]) | (step >= hi[todo])
+        new = np.where(bisect, (lo[todo] + hi[todo]) / 2, step)
+        converged = np.abs(new - ytm[todo]) < tol
+        ytm[todo] = new
+        todo = todo[~converged]
+
+    return ytm
+
+def price_from_yield(sched: Schedule, ytm: np.ndarray)-> np.ndarray:
+    """Clean price per 100 nominal for the given yields to maturity."""
+    return sched.clean_price(np.asarray(ytm, dtype=np.float64))
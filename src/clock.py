@@ -0,0 +1,77 @@
+from __future__ import annotations
+from typing import Callable, Iterator
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+import threading
+
+
+_as_of: datetime | None = None
+
+_version: int = 0
+
+_local = threading.local()
+
+
+def as_of()-> datetime:
+    """
+        Date every maturity based metric is computed against.
+
+        Defaults to the time of the first call, so a long run gives the same answers from start
+        to end, even when it crosses midnight. A date fixed for the current thread wins.
+    """
+    global _as_of
+    fixed = getattr(_local, "as_of", None)
+    if fixed is not None:
+        return fixed
+
+    if _as_of is None:
+        _as_of = datetime.now()
+
+    return _as_of
+
+def set_as_of(value: datetime | None)-> None:
+    """Fix the as of date, or pass None to take the current time on next use. Invalidates cached metrics."""
+    global _as_of, _version
+    _as_of = value
+    _version += 1
+
+@contextmanager
+def fixed(value: datetime)-> Iterator[datetime]:
+    """Compute against this as of date in the current thread only, other threads keep theirs."""
+    previous = getattr(_local, "as_of", None)
+    _local.as_of = value
+    try:
+        yield value
+    finally:
+        _local.as_of = previous
+
+def is_set()-> bool:
+    """Whether the as of date was fixed, or taken from the clock on first use."""
+    return _as_of is not None
+
+def version()-> int:
+    """Changes every time the as of date is set."""
+    return _version
+
+def cached(method: Callable)-> Callable:
+    """Cache a method result per instance and as of date, in the instance's _cache dict, created on first use."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        cache = self._cache
+        if cache is None:
+            cache = self._cache = {}
+
+        # Compare the date itself rather than the version, a thread may have fixed its own.
+        date = as_of()
+        if cache.get("as_of") != date:
+            cache.clear()
+            cache["as_of"] = date
+
+        key = (method.__name__, *args, *sorted(kwargs.items()))
+        if key not in cache:
+            cache[key] = method(self, *args, **kwargs)
+
+        return cache[key]
+
+    return wrapper
@@ -0,0 +1,247 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Dict, List, Sequence
+from dataclasses import dataclass
+from datetime import datetime
+import numpy as np
+from src import clock
+from src.bond import Bond, CATEGORICAL_FIELDS
+from src.rating import score_table
+
+if TYPE_CHECKING:
+    from src.risk import Sensitivities
+
+
+NUMERIC_FIELDS: List[str] = ["coupon", "current_yield", "ytm_ytc", "price", "available"]
+
+DATE_FIELDS: List[str] = ["maturity", "next_payment"]
+
+RATING_FIELDS: List[str] = ["snp_rate", "moodys_rate", "fitch_rate"]
+
+STRING_FIELDS: List[str] = ["company", "ticker", "isin", "id"]
+
+FIELDS: List[str] = [
+    "company",
+    "industry",
+    "ticker",
+    "type",
+    "market",
+    "seniority",
+    "isin",
+    "currency",
+    "state",
+    "moodys_rate",
+    "snp_rate",
+    "fitch_rate",
+    "country",
+    "ownership",
+    "maturity",
+    "next_payment",
+    "coupon_type",
+    "coupon_frequency",
+    "coupon",
+    "current_yield",
+    "ytm_ytc",
+    "price",
+    "available",
+]
+"""Bond fields, in the same order as the Bond dataclass and the CSV columns."""
+
+
+def maturity_cutoff(days: int, now: datetime = None)-> np.datetime64:
+    """Earliest maturity that is at least the given number of days away."""
+    now = clock.as_of() if now is None else now
+    return np.datetime64(now, "us") + np.timedelta64(days, "D")
+
+
+@dataclass
+class Categorical:
+    """Categorical column, stored as integer codes into a small array of distinct values."""
+
+    categories: np.ndarray
+
+    codes: np.ndarray
+
+    @classmethod
+    def from_values(cls, values: Sequence[str])-> Categorical:
+        """
+            Factorize values with a dict, then sort the few distinct ones. Sorting every value,
+            as np.unique does, is far slower on object arrays.
+        """
+        index: Dict[str, int] = {}
+        codes = np.fromiter((index.setdefault(v, len(index)) for v in values), dtype=np.int32, count=len(values))
+        categories = np.empty(len(index), dtype=object)
+        categories[:] = list(index)
+        order = np.argsort(categories, kind="stable")
+        rank = np.empty(len(order), dtype=np.int32)
+        rank[order] = np.arange(len(order), dtype=np.int32)
+
+        return cls(categories[order], rank[codes])
+
+    def __len__(self)-> int:
+        return len(self.codes)
+
+    def code_of(self, value: str)-> int:
+        idx = np.searchsorted(self.categories, value)
+        if idx < len(self.categories) and self.categories[idx] == value:
+            return int(idx)
+
+        return -1
+
+    def eq(self, value: str)-> np.ndarray:
+        return self.codes == self.code_of(value)
+
+    def contains(self, value: str)-> np.ndarray:
+        """Mask of rows whose value contains the given substring."""
+        hits = np.array([ value in c for c in self.categories ], dtype=bool)
+        return hits[self.codes] if len(hits) > 0 else np.zeros(len(self), dtype=bool)
+
+    def map(self, table: Dict[str, object], dtype)-> np.ndarray:
+        """Map every row through a per-category lookup, computing each distinct value once."""
+        lookup = np.array([ table[c] for c in self.categories ], dtype=dtype)
+        return lookup[self.codes] if len(lookup) > 0 else np.zeros(len(self), dtype=dtype)
+
+    def take(self, idx: np.ndarray)-> Categorical:
+        return Categorical(self.categories, self.codes[idx])
+
+    def decode(self)-> np.ndarray:
+        return self.categories[self.codes] if len(self.categories) > 0 else np.empty(0, dtype=object)
+
+    def concat(self, other: Categorical)-> Categorical:
+        if np.array_equal(self.categories, other.categories):
+            return Categorical(self.categories, np.concatenate([self.codes, other.codes]))
+
+        return Categorical.from_values(np.concatenate([self.decode(), other.decode()]))
+
+
+class BondColumns:
+    """
+        Columnar store of a bond universe: NumPy arrays for numbers and dates, codes for categories.
+
+        Columns are never modified in place, derived metrics are cached per as of date.
+    """
+
+    def __init__(self, data: Dict[str, np.ndarray | Categorical]):
+        self.data = data
+        self._cache = {}
+
+    def __len__(self)-> int:
+        return len(next(iter(self.data.values()))) if len(self.data) > 0 else 0
+
+    def __getitem__(self, field: str)-> np.ndarray | Categorical:
+        return self.data[field]
+
+    @classmethod
+    def empty(cls)-> BondColumns:
+        return cls.from_bonds([])
+
+    @classmethod
+    def from_bonds(cls, bonds: Sequence[Bond])-> BondColumns:
+        data = {}
+        for field in NUMERIC_FIELDS:
+            data[field] = np.array([ getattr(b, field) for b in bonds ], dtype=np.float64)
+
+        for field in DATE_FIELDS:
+            data[field] = np.array([ getattr(b, field) for b in bonds ], dtype="datetime64[us]")
+
+        for field in CATEGORICAL_FIELDS:
+            data[field] = Categorical.from_values([ getattr(b, field) for b in bonds ])
+
+        for field in STRING_FIELDS:
+            data[field] = np.array([ getattr(b, field) for b in bonds ], dtype=object)
+
+        return cls(data)
+
+    def select(self, fields: Sequence[str])-> BondColumns:
+        return BondColumns({ k: self.data[k] for k in fields })
+
+    def take(self, idx: np.ndarray)-> BondColumns:
+        return BondColumns({ k: v.take(idx) for k, v in self.data.items() })
+
+    def concat(self, other: BondColumns)-> BondColumns:
+        data = {}
+        for k, v in self.data.items():
+            if isinstance(v, Categorical):
+                data[k] = v.concat(other.data[k])
+            else:
+                data[k] = np.concatenate([v, other.data[k]])
+
+        return BondColumns(data)
+
+    def values(self, field: str)-> np.ndarray:
+        """Get a column as a plain array, decoding categorical codes."""
+        col = self.data[field]
+        return col.decode() if isinstance(col, Categorical) else col
+
+    def rows(self, idx: Sequence[int])-> List[Bond]:
+        """Materialize Bond models for the given row positions."""
+        idx = np.asarray(idx, dtype=np.int64)
+        columns = []
+        for field in FIELDS:
+            col = self.values(field)[idx]
+            if field in DATE_FIELDS:
+                # Convert each distinct date once, bonds maturing on the same day share the datetime.
+                dates, inverse = np.unique(col, return_inverse=True)
+                col = dates.astype(datetime).astype(object)[inverse.reshape(-1)]
+
+            columns.append(col.tolist())
+
+        return [ Bond.from_values(**dict(zip(FIELDS, values))) for values in zip(*columns) ]
+
+    @clock.cached
+    def rating_score(self)-> np.ndarray:
+        snp, moodys, fitch = [ self.data[f] for f in RATING_FIELDS ]
+        table = score_table(snp.categories.tolist(), moodys.categories.tolist(), fitch.categories.tolist())
+        if table.size == 0:
+            return np.zeros(len(self), dtype=np.int64)
+
+        return table[snp.codes, moodys.codes, fitch.codes]
+
+    def is_investment_grade(self)-> np.ndarray:
+        score = self.rating_score()
+        return (0 < score) & (score <= 10)
+
+    def is_high_yield_grade(self)-> np.ndarray:
+        return self.rating_score() > 10
+
+    @clock.cached
+    def maturity_days(self, now: datetime = None)-> np.ndarray:
+        now = clock.as_of() if now is None else now
+        return (self.data["maturity"] - np.datetime64(now, "us")) // np.timedelta64(1, "D")
+
+    def maturity_months(self, now: datetime = None)-> np.ndarray:
+        return self.maturity_days(now) // 30
+
+    def maturity_years(self, now: datetime = None)-> np.ndarray:
+        return self.maturity_days(now) // 365
+
+    @clock.cached
+    def total_yield(self, now: datetime = None)-> np.ndarray:
+        price = self.data["price"]
+        yield_per_month = (price * self.data["current_yield"]) / 12
+
+        return (yield_per_month * self.maturity_months(now)) + price
+
+    def maturity_growth(self, now: datetime = None)-> np.ndarray:
+        """Growth between the price and the total money returned at maturity, as a fraction of the latter."""
+        total = self.total_yield(now)
+        return np.abs(self.data["price"] - total) / total
+
+    @clock.cached
+    def risk_score(self, now: datetime = None)-> np.ndarray:
+        years = self.maturity_years(now)
+        score = self.rating_score()
+
+        risk = np.where(years > 0, np.round(years / 3, 0), 0)
+        risk = risk + np.where(self.data["ownership"].eq("Public"), 0, 2)
+        risk = risk + np.where(self.data["seniority"].contains("Secured"), 0, 10)
+        risk = risk + np.where((7 < score) & (score <= 16), 5, 0)
+        risk = risk + np.where(((16 < score) & (score <= 19)) | (score == 0), 20, 0)
+
+        return risk
+
+    @clock.cached
+    def sensitivities(self)-> Sensitivities:
+        """Durations, convexity and DV01 at the listed yield, see src.risk."""
+        from src.risk import sensitivities
+
+        return sensitivities(self)
@@ -0,0 +1,148 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Dict, List
+from dataclasses import dataclass, field
+import numpy as np
+from src import timings
+from src.columns import BondColumns, FIELDS, RATING_FIELDS
+from src.loader import parse_columns, row_hashes
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
+
+KEYS: List[str] = ["isin", "id", "ticker"]
+"""Fields snapshots can be joined on."""
+
+YIELD_FIELDS: List[str] = ["current_yield", "ytm_ytc"]
+
+AVAILABILITY_FIELDS: List[str] = ["state"]
+
+OTHER_FIELDS: List[str] = [ f for f in FIELDS if f not in ["price", "available", *YIELD_FIELDS, *RATING_FIELDS, *AVAILABILITY_FIELDS] ]
+
+CHANGE_COLUMNS: List[str] = ["Change", "Key", "Ticker", "Company", "Field", "Old", "New"]
+
+
+@dataclass
+class Change:
+    kind: str
+
+    key: str
+
+    ticker: str
+
+    company: str
+
+    field: str | None = None
+
+    old: object = None
+
+    new: object = None
+
+
+@dataclass
+class Diff:
+    """Changes between two snapshots, rows are matched on a key field."""
+
+    changes: List[Change] = field(default_factory=list)
+
+    unchanged: int = 0
+    """Matched rows with identical raw content, never parsed or compared."""
+
+    modified: int = 0
+    """Matched rows whose raw content differs, including moves under the thresholds."""
+
+    def count(self, kind: str)-> int:
+        return len([ c for c in self.changes if c.kind == kind ])
+
+    def to_df(self)-> DataFrame:
+        from pandas import DataFrame
+
+        return DataFrame(
+            [ [c.kind, c.key, c.ticker, c.company, c.field, c.old, c.new] for c in self.changes ],
+            columns=CHANGE_COLUMNS)
+
+
+def join_keys(rows: List[List[str]], key: str)-> List[str]:
+    """
+        Join key of every row. A key shared by several rows, such as an ISIN listed both open
+        and suspended, is numbered by occurrence so each row still gets its own.
+    """
+    if key not in KEYS:
+        raise ValueError(f"unknown key: {key}, expected one of {', '.join(KEYS)}")
+
+    values = parse_columns(rows, [key]).values(key).tolist()
+    seen: Dict[str, int] = {}
+    keys = []
+    for v in values:
+        n = seen.get(v, 0)
+        seen[v] = n + 1
+        keys.append(v if n == 0 else f"{v}#{n + 1}")
+
+    return keys
+
+def _differs(old: np.ndarray, new: np.ndarray)-> np.ndarray:
+    if old.dtype.kind == "f":
+        return ~((old == new) | (np.isnan(old) & np.isnan(new)))
+
+    return old != new
+
+def _moves(old: BondColumns, new: BondColumns, keys: List[str], price_move: float, yield_move: float)-> List[Change]:
+    """Field changes of matched rows, old and new are aligned row by row."""
+    changes = []
+    ticker, company = new.values("ticker").tolist(), new.values("company").tolist()
+
+    def add(kind: str, name: str, mask: np.ndarray):
+        idx = np.flatnonzero(mask)
+        before, after = old.values(name)[idx].tolist(), new.values(name)[idx].tolist()
+        changes.extend(Change(kind, keys[i], ticker[i], company[i], name, b, a) for i, b, a in zip(idx.tolist(), before, after))
+
+    add("price", "price", np.abs(new["price"] - old["price"]) >= price_move)
+    for name in YIELD_FIELDS:
+        add("yield", name, np.abs(new[name] - old[name]) >= yield_move)
+
+    for name in RATING_FIELDS:
+        add("rating", name, _differs(old.values(name), new.values(name)))
+
+    add("availability", "available", (old["available"] > 0) != (new["available"] > 0))
+    for name in AVAILABILITY_FIELDS:
+        add("availability", name, _differs(old.values(name), new.values(name)))
+
+    for name in OTHER_FIELDS:
+        add("changed", name, _differs(old.values(name), new.values(name)))
+
+    return changes
+
+def diff_rows(old_rows: List[List[str]], new_rows: List[List[str]], key: str = "isin", price_move: float = 0.5, yield_move: float = 0.001)-> Diff:
+    """
+        Compare two snapshots given as raw CSV rows.
+
+        Rows are joined on the key, and matched rows with the same raw hash are skipped without
+        being parsed. Only added, removed and modified rows are parsed. Price and yield moves
+        smaller than the thresholds are left out, yields are fractions, so 0.001 is 10bp.
+    """
+    with timings.stage("diff") as s:
+        old_keys, new_keys = join_keys(old_rows, key), join_keys(new_rows, key)
+        old_hash, new_hash = row_hashes(old_rows).tolist(), row_hashes(new_rows).tolist()
+        old_pos = dict(zip(old_keys, range(len(old_keys))))
+        new_pos = set(new_keys)
+
+        added = [ i for i, k in enumerate(new_keys) if k not in old_pos ]
+        removed = [ i for i, k in enumerate(old_keys) if k not in new_pos ]
+        matched = [ (old_pos[k], i) for i, k in enumerate(new_keys) if k in old_pos ]
+        modified = [ (o, n) for o, n in matched if old_hash[o] != new_hash[n] ]
+
+        result = Diff(unchanged=len(matched) - len(modified), modified=len(modified))
+        for kind, rows, idx, keys in [("removed", old_rows, removed, old_keys), ("added", new_rows, added, new_keys)]:
+            if len(idx) > 0:
+                columns = parse_columns([ rows[i] for i in idx ], ["ticker", "company"])
+                for i, t, c in zip(idx, columns.values("ticker").tolist(), columns.values("company").tolist()):
+                    result.changes.append(Change(kind, keys[i], t, c))
+
+        if len(modified) > 0:
+            old = parse_columns([ old_rows[o] for o, _ in modified ])
+            new = parse_columns([ new_rows[n] for _, n in modified ])
+            result.changes += _moves(old, new, [ new_keys[n] for _, n in modified ], price_move, yield_move)
+
+        s.rows = len(result.changes)
+
+    return result
@@ -0,0 +1,214 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Dict, Iterator, List
+from contextlib import contextmanager
+from pathlib import Path
+from src.columns import BondColumns, Categorical
+from src.stream import json_lines, open_output
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
+
+FORMATS: List[str] = ["csv", "jsonl", "parquet", "feather", "arrow"]
+"""Export formats, feather and arrow are both the Arrow IPC file format."""
+
+BINARY_FORMATS: List[str] = ["parquet", "feather", "arrow"]
+"""Formats written with pyarrow, which is optional and only imported when one is used."""
+
+SUFFIXES: Dict[str, str] = {
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".feather": "feather",
+    ".arrow": "arrow",
+    ".ipc": "arrow",
+}
+
+INTERNAL: List[str] = ["Id"]
+"""Columns kept out of every export, the generated id only serves lookups and joins."""
+
+
+class ExportError(Exception):
+    pass
+
+
+def format_of(path: str | None, fmt: str | None = None)-> str:
+    """Export format, the given one or else guessed from the file suffix, ignoring .gz. Defaults to csv."""
+    if fmt is not None:
+        return fmt
+
+    if path is None:
+        return "csv"
+
+    suffixes = [ s.lower() for s in Path(path).suffixes if s.lower() != ".gz" ]
+
+    return SUFFIXES.get(suffixes[-1], "csv") if len(suffixes) > 0 else "csv"
+
+def exported(df: DataFrame)-> DataFrame:
+    """The frame without its internal columns."""
+    internal = [ c for c in INTERNAL if c in df.columns ]
+    return df.drop(columns=internal) if len(internal) > 0 else df
+
+def frame(columns: BondColumns, keys: List[str])-> DataFrame:
+    """
+        Typed DataFrame of the columns, built from the arrays without touching single rows.
+
+        Dates stay datetime64 and numbers stay floats, categorical codes are handed to pandas
+        as they are, so categorical columns keep their category dtype.
+    """
+    from pandas import Categorical as PandasCategorical, DataFrame
+
+    data = {}
+    for key in keys:
+        col = columns.data[key]
+        if isinstance(col, Categorical):
+            col = PandasCategorical.from_codes(col.codes, categories=col.categories)
+
+        data[key.title()] = col
+
+    return DataFrame(data)
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ExportError("Parquet and Arrow exports need pyarrow, install it with: pip install pyarrow")
+
+    return pyarrow
+
+
+class TextWriter:
+    """CSV or JSON Lines, appended frame by frame. A None or "-" path writes to stdout."""
+
+    def __init__(self, f, fmt: str):
+        self._f = f
+        self._fmt = fmt
+        self._header = True
+
+    def write(self, df: DataFrame)-> None:
+        df = exported(df)
+        if self._fmt == "csv":
+            df.to_csv(self._f, header=self._header, index=False)
+        else:
+            # Same encoding as the streaming writer, whatever path produced the frame.
+            self._f.writelines(json_lines([ str(c) for c in df.columns ], [ df[c].to_numpy() for c in df.columns ]))
+
+        self._header = False
+
+    def close(self)-> None:
+        pass
+
+
+class ArrowWriter:
+    """
+        Parquet or Arrow IPC file, appended frame by frame.
+
+        Categorical columns become dictionary columns with int32 indices, so frames with different
+        categories share one schema. Parquet is written row group by row group. The IPC file format
+        allows only one dictionary per column, so those frames are kept until close and written
+        with their dictionaries unified.
+    """
+
+    def __init__(self, path: str, fmt: str):
+        self._pa = _pyarrow()
+        self._path = path
+        self._fmt = fmt
+        self._schema = None
+        self._writer = None
+        self._tables = []
+
+    def _table(self, df: DataFrame):
+        pa = self._pa
+        table = pa.Table.from_pandas(exported(df), preserve_index=False)
+        if self._schema is None:
+            fields = []
+            for f in table.schema:
+                if pa.types.is_dictionary(f.type):
+                    f = f.with_type(pa.dictionary(pa.int32(), f.type.value_type))
+
+                fields.append(f)
+
+            self._schema = pa.schema(fields)
+
+        return table.cast(self._schema)
+
+    def write(self, df: DataFrame)-> None:
+        table = self._table(df)
+        if self._fmt != "parquet":
+            self._tables.append(table)
+            return
+
+        if self._writer is None:
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(self._path, self._schema)
+
+        self._writer.write_table(table)
+
+    def close(self)-> None:
+        try:
+            if self._fmt == "parquet":
+                if self._writer is not None:
+                    self._writer.close()
+                return
+
+            if len(self._tables) == 0:
+                return
+
+            table = self._pa.concat_tables(self._tables).unify_dictionaries().combine_chunks()
+            with self._pa.ipc.new_file(self._path, table.schema) as writer:
+                writer.write_table(table)
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self)-> None:
+        """Give up on the file, removing what was written of it, a truncated file is no export."""
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+            self._writer = None
+
+        self._tables = []
+        Path(self._path).unlink(missing_ok=True)
+
+
+@contextmanager
+def open_writer(path: str | None, fmt: str | None = None)-> Iterator[TextWriter | ArrowWriter]:
+    """
+        Writer of frames to path, in the given format or the one of its suffix.
+
+        Parquet and Arrow files need a path, CSV and JSON Lines go to stdout without one and are
+        compressed for a .gz path. Nothing is written for Parquet and Arrow until the first frame,
+        and their file is removed when writing fails part way.
+    """
+    fmt = format_of(path, fmt)
+    if fmt not in FORMATS:
+        raise ExportError(f"unknown format: {fmt}, expected one of {', '.join(FORMATS)}")
+
+    if fmt in BINARY_FORMATS:
+        if path is None or path == "-":
+            raise ExportError(f"{fmt} output needs a file, it can not be written to stdout")
+
+        writer = ArrowWriter(path, fmt)
+        try:
+            yield writer
+        except BaseException:
+            writer.abort()
+            raise
+
+        writer.close()
+        return
+
+    with open_output(path) as f:
+        writer = TextWriter(f, fmt)
+        yield writer
+        writer.close()
+
+def export(df: DataFrame, path: str | None, fmt: str | None = None)-> None:
+    """Write a DataFrame in the given format, or the one of the path's suffix."""
+    with open_writer(path, fmt) as writer:
+        writer.write(df)
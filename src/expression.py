@@ -0,0 +1,522 @@
+from __future__ import annotations
+from typing import Callable, Dict, List, Tuple
+from dataclasses import dataclass
+from datetime import datetime
+import math
+import operator
+import re
+import numpy as np
+from src.columns import BondColumns, Categorical, CATEGORICAL_FIELDS, DATE_FIELDS, FIELDS, NUMERIC_FIELDS, RATING_FIELDS, maturity_cutoff
+from src.index import Indexes
+from src.query import Predicate
+from src.rating import MOODY_RATE_MAP, S_P_RATE_MAP, rate_score
+from src.risk import RISK_FIELDS
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+@dataclass
+class Term:
+    """A compiled sub expression: how to compute it over columns, and what it needs."""
+
+    kind: str
+    """One of num, date, cat, str, bool, rating, or lit for a constant."""
+
+    fn: Callable[[BondColumns], object] | None
+
+    fields: Tuple[str, ...] = ()
+
+    cost: int = 1
+
+    value: object = None
+    """Value of a constant."""
+
+    seek: Callable[[Indexes], np.ndarray] | None = None
+
+    column: str | None = None
+    """Name of the raw column or metric, when the term is just that."""
+
+
+METRICS: Dict[str, Tuple[Tuple[str, ...], int, Callable[[BondColumns], np.ndarray]]] = {
+    "maturity_days": (("maturity",), 3, lambda c: c.maturity_days()),
+    "maturity_months": (("maturity",), 3, lambda c: c.maturity_months()),
+    "maturity_years": (("maturity",), 3, lambda c: c.maturity_years()),
+    "total_yield": (("price", "current_yield", "maturity"), 3, lambda c: c.total_yield()),
+    "maturity_growth": (("price", "current_yield", "maturity"), 3, lambda c: c.maturity_growth()),
+    "rating_score": (tuple(RATING_FIELDS), 2, lambda c: c.rating_score()),
+    "risk_score": (("maturity", *RATING_FIELDS, "ownership", "seniority"), 4, lambda c: c.risk_score()),
+    "duration": (tuple(RISK_FIELDS), 6, lambda c: c.sensitivities().macaulay_duration),
+    "modified_duration": (tuple(RISK_FIELDS), 6, lambda c: c.sensitivities().modified_duration),
+    "convexity": (tuple(RISK_FIELDS), 6, lambda c: c.sensitivities().convexity),
+    "dv01": (tuple(RISK_FIELDS), 6, lambda c: c.sensitivities().dv01),
+}
+"""Derived numeric metrics, with the columns they read and their cost."""
+
+FLAGS: Dict[str, Tuple[Tuple[str, ...], int, Callable[[BondColumns], np.ndarray]]] = {
+    "investment_grade": (tuple(RATING_FIELDS), 2, lambda c: c.is_investment_grade()),
+    "high_yield_grade": (tuple(RATING_FIELDS), 2, lambda c: c.is_high_yield_grade()),
+    "rated": (tuple(RATING_FIELDS), 2, lambda c: c.rating_score() > 0),
+    "premium": (("price",), 1, lambda c: c["price"] > 100),
+    "discount": (("price",), 1, lambda c: c["price"] < 100),
+    "suspended": (("state",), 1, lambda c: c["state"].eq("Suspended")),
+    "open": (("state",), 1, lambda c: c["state"].eq("Open")),
+    "secured": (("seniority",), 1, lambda c: c["seniority"].contains("Secured")),
+    "public": (("ownership",), 1, lambda c: c["ownership"].eq("Public")),
+    "fixed_coupon": (("coupon_type",), 1, lambda c: c["coupon_type"].eq("Fixed")),
+}
+"""Named conditions, each a boolean column."""
+
+FLAG_SEEKS: Dict[str, Callable[[Indexes], np.ndarray]] = {
+    "premium": lambda ix: ix.sorted("price").gt(100),
+    "discount": lambda ix: ix.sorted("price").lt(100),
+}
+
+AMBIGUOUS_RATINGS: List[str] = sorted(r for r in S_P_RATE_MAP if r in MOODY_RATE_MAP and S_P_RATE_MAP[r] != MOODY_RATE_MAP[r])
+"""Ratings spelled the same by S&P and Moody's for different grades, such as C."""
+
+COMPARISONS: Dict[str, Callable] = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+FLIPPED: Dict[str, str] = { "==": "==", "!=": "!=", "<": ">", "<=": ">=", ">": "<", ">=": "<=" }
+"""Same comparison with its sides swapped."""
+
+ARITHMETIC: Dict[str, Callable] = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+}
+
+SEEKS: Dict[str, str] = { ">": "gt", ">=": "ge", "<": "lt", "<=": "le" }
+
+KEYWORDS: List[str] = ["and", "or", "not", "in", "contains"]
+
+TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<num>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+      | (?P<str>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+      | (?P<op>==|!=|<=|>=|<|>|\(|\)|\[|\]|,|\+|-|\*|/)
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    )""", re.VERBOSE)
+
+
+def tokenize(text: str)-> List[Tuple[str, object, int, int]]:
+    """Tokens as (kind, value, start, end), kind is num, str, op, name or a keyword."""
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        if text[pos:].strip() == "":
+            break
+
+        match = TOKEN.match(text, pos)
+        if match is None:
+            raise ExpressionError(f"unexpected character at {pos + 1}: {text[pos:].lstrip()[:10]!r}")
+
+        kind = match.lastgroup
+        raw = match.group(kind)
+        start = match.start(kind)
+        if kind == "num":
+            value = float(raw)
+        elif kind == "str":
+            value = re.sub(r"\\(.)", r"\1", raw[1:-1])
+        elif kind == "name" and raw.lower() in KEYWORDS:
+            kind = value = raw.lower()
+        else:
+            value = raw
+
+        tokens.append((kind, value, start, match.end()))
+        pos = match.end()
+
+    return tokens
+
+
+def _merge(*terms: Term)-> Tuple[Tuple[str, ...], int]:
+    fields = []
+    for t in terms:
+        fields += [ f for f in t.fields if f not in fields ]
+
+    return tuple(fields), max([ t.cost for t in terms ] + [1])
+
+def _column(name: str)-> Term:
+    if name in METRICS:
+        fields, cost, fn = METRICS[name]
+        return Term("num", fn, fields, cost, column=name)
+
+    if name in FLAGS:
+        fields, cost, fn = FLAGS[name]
+        return Term("bool", fn, fields, cost, seek=FLAG_SEEKS.get(name), column=name)
+
+    if name == "rating":
+        return Term("rating", lambda c: c.rating_score(), tuple(RATING_FIELDS), 2, column=name)
+
+    if name in NUMERIC_FIELDS:
+        kind = "num"
+    elif name in DATE_FIELDS:
+        kind = "date"
+    elif name in CATEGORICAL_FIELDS:
+        kind = "cat"
+    elif name in FIELDS + ["id"]:
+        kind = "str"
+    else:
+        names = sorted(FIELDS + ["id", "rating"] + list(METRICS) + list(FLAGS))
+        raise ExpressionError(f"unknown name: {name}, expected one of {', '.join(names)}")
+
+    return Term(kind, lambda c: c[name], (name,), column=name)
+
+def _date(value: object)-> np.datetime64:
+    for fmt in ["%Y-%m-%d", "%d-%m-%Y"]:
+        try:
+            return np.datetime64(datetime.strptime(str(value), fmt), "us")
+        except ValueError:
+            pass
+
+    raise ExpressionError(f"invalid date: {value!r}, expected YYYY-MM-DD")
+
+def _by_category(cat: Categorical, test: Callable[[np.ndarray], np.ndarray])-> np.ndarray:
+    """Evaluate a test once per category, then spread it over the rows."""
+    if len(cat.categories) == 0:
+        return np.zeros(len(cat), dtype=bool)
+
+    return np.asarray(test(cat.categories), dtype=bool)[cat.codes]
+
+def _seek(term: Term, op: str, value: object)-> Callable[[Indexes], np.ndarray] | None:
+    """Answer a comparison of a column with a constant from a sorted index, where one fits."""
+    name = term.column
+    if name in Indexes.SORTED and op in SEEKS:
+        return lambda ix: getattr(ix.sorted(name), SEEKS[op])(value)
+
+    if name in Indexes.SORTED and op == "==":
+        return lambda ix: ix.sorted(name).between(value, value)
+
+    # Whole months or years below a limit are maturities before a cutoff date.
+    days = { "maturity_months": 30, "maturity_years": 365 }.get(name)
+    if days is not None and op in ["<", "<="]:
+        limit = math.ceil(value) if op == "<" else math.floor(value) + 1
+        return lambda ix: ix.sorted("maturity").lt(maturity_cutoff(days * limit))
+
+    return None
+
+def _compare(left: Term, op: str, right: Term)-> Term:
+    if left.kind == "lit" and right.kind != "lit":
+        left, right, op = right, left, FLIPPED[op]
+
+    if left.kind == "lit":
+        raise ExpressionError("a comparison needs a field or metric on one side")
+
+    fields, cost = _merge(left, right)
+    compare = COMPARISONS[op]
+    fn, seek = None, None
+
+    if right.kind == "lit":
+        value = right.value
+        if left.kind == "num":
+            if not isinstance(value, float):
+                raise ExpressionError(f"{left.column} is a number, it can not be compared with {value!r}")
+            fn = lambda c: compare(left.fn(c), value)
+            seek = _seek(left, op, value)
+        elif left.kind == "date":
+            value = _date(value)
+            fn = lambda c: compare(left.fn(c), value)
+            seek = _seek(left, op, value)
+        elif left.kind == "rating":
+            # Lower scores are better ratings, so quality comparisons flip: <= is this rating or worse.
+            limit = _rating_score(value)
+            score_compare = COMPARISONS[FLIPPED[op]]
+            fn = lambda c: (left.fn(c) > 0) & score_compare(left.fn(c), limit)
+        elif left.kind == "cat":
+            if not isinstance(value, str):
+                raise ExpressionError(f"{left.column} compares with a string, not {value!r}")
+            fn = lambda c: _by_category(left.fn(c), lambda categories: compare(categories, value))
+        elif left.kind == "str":
+            if not isinstance(value, str):
+                raise ExpressionError(f"{left.column} compares with a string, not {value!r}")
+            fn = lambda c: np.asarray(compare(left.fn(c), value), dtype=bool)
+        else:
+            raise ExpressionError(f"a condition can not be compared with {value!r}")
+    else:
+        kinds = { left.kind, right.kind }
+        if kinds == { "rating" }:
+            score_compare = COMPARISONS[FLIPPED[op]]
+            fn = lambda c: (left.fn(c) > 0) & (right.fn(c) > 0) & score_compare(left.fn(c), right.fn(c))
+        elif "rating" in kinds:
+            raise ExpressionError("rating compares with a rating such as 'BBB-', use rating_score to compare with numbers")
+        elif kinds == { "num" } or kinds == { "date" }:
+            fn = lambda c: compare(left.fn(c), right.fn(c))
+        elif kinds <= { "cat", "str" }:
+            fn = lambda c: np.asarray(compare(_plain(left.fn(c)), _plain(right.fn(c))), dtype=bool)
+        else:
+            raise ExpressionError(f"{left.column or left.kind} can not be compared with {right.column or right.kind}")
+
+    return Term("bool", fn, fields, cost, seek=seek)
+
+def _rating_score(value: object)-> int:
+    if not isinstance(value, str):
+        raise ExpressionError(f"rating compares with a rating such as 'BBB-', not {value!r}")
+
+    if value in AMBIGUOUS_RATINGS:
+        raise ExpressionError(f"rating '{value}' is a different grade for S&P and Moody's, compare snp_rate, moodys_rate or fitch_rate with it instead")
+
+    try:
+        return rate_score(value)
+    except ValueError as e:
+        raise ExpressionError(str(e))
+
+def _plain(value: object)-> np.ndarray:
+    return value.decode() if isinstance(value, Categorical) else value
+
+def _member(left: Term, values: List[object])-> Term:
+    if left.kind == "cat":
+        fn = lambda c: _by_category(left.fn(c), lambda categories: np.isin(categories, values))
+    elif left.kind == "str":
+        fn = lambda c: np.isin(left.fn(c), values)
+    elif left.kind == "num":
+        fn = lambda c: np.isin(left.fn(c), values)
+    elif left.kind == "date":
+        dates = [ _date(v) for v in values ]
+        fn = lambda c: np.isin(left.fn(c), dates)
+    elif left.kind == "rating":
+        scores = [ _rating_score(v) for v in values ]
+        fn = lambda c: np.isin(left.fn(c), scores)
+    else:
+        raise ExpressionError("in needs a field or metric on its left")
+
+    return Term("bool", fn, left.fields, left.cost)
+
+def _contains(left: Term, value: object)-> Term:
+    if not isinstance(value, str):
+        raise ExpressionError(f"contains needs a string, not {value!r}")
+
+    if left.kind == "cat":
+        fn = lambda c: left.fn(c).contains(value)
+    elif left.kind == "str":
+        # Only the few free text fields get here, categorical ones test each category once.
+        fn = lambda c: np.fromiter((value in v for v in left.fn(c)), dtype=bool, count=len(c))
+    else:
+        raise ExpressionError("contains needs a text field on its left")
+
+    return Term("bool", fn, left.fields, left.cost)
+
+def _condition(term: Term)-> Term:
+    """A term used as a condition. Numbers are true when set and not zero, like in Python."""
+    if term.kind == "bool":
+        return term
+
+    if term.kind == "num":
+        return Term("bool", lambda c: _truthy(term.fn(c)), term.fields, term.cost)
+
+    raise ExpressionError(f"{term.column or repr(term.value)} is not a condition")
+
+def _truthy(values: np.ndarray)-> np.ndarray:
+    return (values != 0) & ~np.isnan(values) if values.dtype.kind == "f" else values != 0
+
+
+class Parser:
+    """
+        Recursive descent parser, compiling while it parses. Lowest precedence first:
+
+            or, and, not, comparisons (== != < <= > >= in contains), + -, * /, unary -
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def peek(self)-> str | None:
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def peek_op(self)-> str | None:
+        kind = self.peek()
+        if kind == "op":
+            return self.tokens[self.pos][1]
+
+        return kind if kind in KEYWORDS else None
+
+    def take(self, expected: str = None)-> Tuple[str, object, int, int]:
+        if self.pos >= len(self.tokens):
+            raise ExpressionError(f"unexpected end of expression{'' if expected is None else f', expected {expected}'}")
+
+        token = self.tokens[self.pos]
+        if expected is not None and expected not in [token[0], token[1]]:
+            raise ExpressionError(f"expected {expected} at {token[2] + 1}, found {self.text[token[2]:token[3]]!r}")
+
+        self.pos += 1
+        return token
+
+    def conjuncts(self)-> List[Tuple[str, Term]]:
+        """Top level conjuncts of the whole expression, each with its source text."""
+        if len(self.tokens) == 0:
+            raise ExpressionError("empty expression")
+
+        parts = []
+        while True:
+            start = self.tokens[self.pos][2] if self.pos < len(self.tokens) else len(self.text)
+            term = _condition(self.negation())
+            end = self.tokens[self.pos - 1][3]
+            parts.append((self.text[start:end], term))
+            if self.peek_op() != "and":
+                break
+            self.take()
+
+        if self.peek_op() == "or":
+            # An or at the top binds looser than and, so the whole expression is one predicate.
+            self.pos = 0
+            return [ (self.text.strip(), self.expression()) ]
+
+        if self.pos < len(self.tokens):
+            token = self.tokens[self.pos]
+            raise ExpressionError(f"unexpected {self.text[token[2]:token[3]]!r} at {token[2] + 1}")
+
+        return parts
+
+    def expression(self)-> Term:
+        term = self.disjunction()
+        if self.pos < len(self.tokens):
+            token = self.tokens[self.pos]
+            raise ExpressionError(f"unexpected {self.text[token[2]:token[3]]!r} at {token[2] + 1}")
+
+        return term
+
+    def disjunction(self)-> Term:
+        term = self.conjunction()
+        while self.peek_op() == "or":
+            self.take()
+            left, right = _condition(term), _condition(self.conjunction())
+            term = Term("bool", lambda c, l=left, r=right: l.fn(c) | r.fn(c), *_merge(left, right))
+
+        return term
+
+    def conjunction(self)-> Term:
+        term = self.negation()
+        while self.peek_op() == "and":
+            self.take()
+            left, right = _condition(term), _condition(self.negation())
+            term = Term("bool", lambda c, l=left, r=right: l.fn(c) & r.fn(c), *_merge(left, right))
+
+        return term
+
+    def negation(self)-> Term:
+        if self.peek_op() == "not":
+            self.take()
+            term = _condition(self.negation())
+            return Term("bool", lambda c: ~term.fn(c), term.fields, term.cost)
+
+        return self.comparison()
+
+    def comparison(self)-> Term:
+        left = self.sum()
+        op = self.peek_op()
+        if op in COMPARISONS:
+            self.take()
+            return _compare(left, op, self.sum())
+
+        if op == "in":
+            self.take()
+            return _member(left, self.values())
+
+        if op == "contains":
+            self.take()
+            right = self.sum()
+            if right.kind != "lit":
+                raise ExpressionError("contains needs a constant string")
+            return _contains(left, right.value)
+
+        return left
+
+    def values(self)-> List[object]:
+        self.take("[")
+        values = []
+        while self.peek_op() != "]":
+            term = self.unary()
+            if term.kind != "lit":
+                raise ExpressionError("in needs a list of constants, such as ['GB', 'FR']")
+            values.append(term.value)
+            if self.peek_op() != ",":
+                break
+            self.take()
+
+        self.take("]")
+        return values
+
+    def sum(self)-> Term:
+        term = self.product()
+        while self.peek_op() in ["+", "-"]:
+            op = self.take()[1]
+            term = _arithmetic(term, op, self.product())
+
+        return term
+
+    def product(self)-> Term:
+        term = self.unary()
+        while self.peek_op() in ["*", "/"]:
+            op = self.take()[1]
+            term = _arithmetic(term, op, self.unary())
+
+        return term
+
+    def unary(self)-> Term:
+        if self.peek_op() == "-":
+            self.take()
+            return _arithmetic(Term("lit", None, value=0.0), "-", self.unary())
+
+        return self.atom()
+
+    def atom(self)-> Term:
+        kind, value, start, end = self.take()
+        if kind in ["num", "str"]:
+            return Term("lit", None, value=value)
+
+        if kind == "name":
+            return _column(value)
+
+        if value == "(":
+            term = self.disjunction()
+            self.take(")")
+            return term
+
+        raise ExpressionError(f"unexpected {self.text[start:end]!r} at {start + 1}")
+
+def _arithmetic(left: Term, op: str, right: Term)-> Term:
+    compute = ARITHMETIC[op]
+    if left.kind == "lit" and right.kind == "lit":
+        if not isinstance(left.value, float) or not isinstance(right.value, float):
+            raise ExpressionError(f"{op} needs numbers")
+        return Term("lit", None, value=compute(left.value, right.value))
+
+    for t in [left, right]:
+        if t.kind not in ["num", "lit"] or (t.kind == "lit" and not isinstance(t.value, float)):
+            raise ExpressionError(f"{op} needs numbers, not {t.column or repr(t.value)}")
+
+    fields, cost = _merge(left, right)
+    lhs = (lambda c: left.value) if left.kind == "lit" else left.fn
+    rhs = (lambda c: right.value) if right.kind == "lit" else right.fn
+
+    return Term("num", lambda c: compute(lhs(c), rhs(c)), fields, cost)
+
+def compile_where(text: str)-> List[Predicate]:
+    """
+        Compile a filter expression, such as "coupon > 0.07 and (country == 'GB' or rating <= 'BBB-') and not suspended".
+
+        The expression is parsed once into closures over whole columns, so every operator is one
+        NumPy operation. Each top level conjunct becomes its own predicate, so the plan can order
+        them, seek them through the sorted indexes and push them into the CSV parse.
+
+        Names are the bond fields, the METRICS and the FLAGS. Ratings compare by credit quality,
+        "rating <= 'BBB-'" is BBB- or worse, "rating >= 'BBB-'" BBB- or better, and unrated bonds
+        never match. S&P and Moody's spell C for different grades, so a rating of 'C' is refused.
+        Dates compare with 'YYYY-MM-DD' strings. Raises ExpressionError, a ValueError, when the
+        expression is invalid.
+    """
+    return [ Predicate(name, term.fields, term.fn, term.cost, seek=term.seek) for name, term in Parser(text).conjuncts() ]
+
+def literal(value: str)-> str:
+    """Quote a string for an expression."""
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
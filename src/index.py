@@ -0,0 +1,88 @@
+from __future__ import annotations
+from typing import Dict, Iterable, List
+import numpy as np
+from src.columns import BondColumns
+
+
+class HashIndex:
+    """Unique hash index, maps a value to the position of its first row."""
+
+    def __init__(self, values: np.ndarray):
+        n = len(values)
+        # Walk backwards so the first occurrence of a duplicated value wins, like a linear scan.
+        self._positions: Dict[str, int] = dict(zip(values[::-1].tolist(), range(n - 1, -1, -1)))
+
+    def __len__(self)-> int:
+        return len(self._positions)
+
+    def get(self, value: str)-> int | None:
+        return self._positions.get(value)
+
+    def get_many(self, values: Iterable[str])-> List[int]:
+        """Positions of every value found, in the order they were asked for."""
+        positions = [ self._positions.get(v) for v in values ]
+        return [ p for p in positions if p is not None ]
+
+
+class SortedIndex:
+    """Sorted index over a numeric or date column, threshold and range queries are bisections."""
+
+    def __init__(self, values: np.ndarray):
+        self._order = np.argsort(values, kind="stable")
+        self._values = np.asarray(values)[self._order]
+        # NaN and NaT sort last and never match a comparison, keep them out of every range.
+        self._end = len(self._values)
+        if np.issubdtype(self._values.dtype, np.floating):
+            self._end -= int(np.count_nonzero(np.isnan(self._values)))
+        elif np.issubdtype(self._values.dtype, np.datetime64):
+            self._end -= int(np.count_nonzero(np.isnat(self._values)))
+
+    def _positions(self, start: int, end: int)-> np.ndarray:
+        """Row positions in a slice of the sorted order, back in row order."""
+        return np.sort(self._order[start:end])
+
+    def gt(self, value)-> np.ndarray:
+        return self._positions(np.searchsorted(self._values, value, side="right"), self._end)
+
+    def ge(self, value)-> np.ndarray:
+        return self._positions(np.searchsorted(self._values, value, side="left"), self._end)
+
+    def lt(self, value)-> np.ndarray:
+        return self._positions(0, np.searchsorted(self._values, value, side="left"))
+
+    def le(self, value)-> np.ndarray:
+        return self._positions(0, np.searchsorted(self._values, value, side="right"))
+
+    def between(self, low, high)-> np.ndarray:
+        """Rows with low <= value <= high."""
+        return self._positions(
+            np.searchsorted(self._values, low, side="left"),
+            np.searchsorted(self._values, high, side="right"),
+        )
+
+
+class Indexes:
+    """Lazily built indexes over one columnar store, thrown away with it when the collection changes."""
+
+    UNIQUE = ["isin", "ticker", "id"]
+
+    SORTED = ["coupon", "current_yield", "price", "maturity"]
+
+    def __init__(self, columns: BondColumns):
+        self._columns = columns
+        self._unique: Dict[str, HashIndex] = {}
+        self._sorted: Dict[str, SortedIndex] = {}
+
+    def unique(self, field: str)-> HashIndex:
+        assert field in self.UNIQUE, f"No unique index on {field}"
+        if field not in self._unique:
+            self._unique[field] = HashIndex(np.asarray(self._columns[field]))
+
+        return self._unique[field]
+
+    def sorted(self, field: str)-> SortedIndex:
+        assert field in self.SORTED, f"No sorted index on {field}"
+        if field not in self._sorted:
+            self._sorted[field] = SortedIndex(self._columns[field])
+
+        return self._sorted[field]
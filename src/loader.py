@@ -0,0 +1,221 @@
+from __future__ import annotations
+from typing import IO, Callable, Dict, Iterator, List
+from contextlib import contextmanager
+from datetime import datetime
+import csv
+import gzip
+import hashlib
+import io
+import sys
+import numpy as np
+from src import cache, query, timings
+from src.bond import prep_country, company_slug, coupon_slug
+from src.columns import BondColumns, Categorical, CATEGORICAL_FIELDS, FIELDS
+from src.query import Predicate
+
+
+DATE_FORMAT = "%d-%m-%Y"
+
+ISO_ORDER = [6, 7, 8, 9, 2, 3, 4, 5, 0, 1]
+"""Character positions that turn a dd-mm-YYYY string into YYYY-mm-dd."""
+
+ID_DATE_ORDER = [8, 9, 7, 5, 6, 4, 0, 1, 2, 3]
+"""Character positions that turn a YYYY-mm-dd string back into dd-mm-YYYY."""
+
+
+def parse_dates(values: List[str])-> np.ndarray:
+    """Parse a whole column of dd-mm-YYYY dates at once."""
+    arr = np.asarray(values, dtype="U10")
+    if len(arr) == 0:
+        return np.empty(0, dtype="datetime64[us]")
+
+    if np.all(np.char.str_len(arr) == 10):
+        chars = arr.view("U1").reshape(-1, 10)[:, ISO_ORDER]
+        return np.ascontiguousarray(chars).view("U10").ravel().astype("datetime64[D]").astype("datetime64[us]")
+
+    # Dates without zero padding are rare, fall back to strptime for those columns.
+    return np.array([ datetime.strptime(v, DATE_FORMAT) for v in values ], dtype="datetime64[us]")
+
+def parse_coupons(values: List[str])-> np.ndarray:
+    """Parse coupons such as "4.25%" or floating "L+5.375%" into fractions."""
+    if len(values) == 0:
+        return np.empty(0, dtype=np.float64)
+
+    arr = np.char.replace(np.asarray(values, dtype=str), "%", "")
+    parts = np.char.partition(arr, "+")
+    arr = np.where(parts[:, 1] == "+", parts[:, 2], parts[:, 0])
+
+    return arr.astype(np.float64) / 100
+
+def parse_floats(values: List[str], scale: float = 1, decimals: int = 4)-> np.ndarray:
+    return np.round(np.asarray(values, dtype=str).astype(np.float64) / scale, decimals)
+
+def generate_ids(company: Categorical, coupon: np.ndarray, maturity: np.ndarray)-> np.ndarray:
+    """Vectorized version of Bond._generate_id."""
+    companies = company.map({ c: company_slug(c) for c in company.categories }, object)
+
+    rates, rate_codes = np.unique(coupon, return_inverse=True)
+    rates = np.array([ coupon_slug(r) for r in rates.tolist() ], dtype=object)[rate_codes.reshape(-1)]
+
+    iso = np.datetime_as_string(maturity, unit="D").astype("U10")
+    if len(iso) > 0:
+        chars = iso.view("U1").reshape(-1, 10)[:, ID_DATE_ORDER]
+        iso = np.char.replace(np.ascontiguousarray(chars).view("U10").ravel(), "-", "_")
+
+    return companies + "-" + rates + "-" + iso.astype(object)
+
+def parse_country(values: List[str])-> Categorical:
+    country = Categorical.from_values(list(values))
+    return Categorical.from_values(country.map({ c: prep_country(c) for c in country.categories }, object))
+
+def parse_categorical(values: List[str])-> Categorical:
+    return Categorical.from_values(list(values))
+
+def parse_strings(values: List[str])-> np.ndarray:
+    return np.array(values, dtype=object)
+
+PARSERS: Dict[str, Callable[[List[str]], np.ndarray | Categorical]] = {
+    **{ field: parse_categorical for field in CATEGORICAL_FIELDS },
+    "country": parse_country,
+    "company": parse_strings,
+    "ticker": parse_strings,
+    "isin": parse_strings,
+    "maturity": parse_dates,
+    "next_payment": parse_dates,
+    "coupon": parse_coupons,
+    "current_yield": lambda values: parse_floats(values, 100, 5),
+    "ytm_ytc": lambda values: parse_floats(values, 100, 5),
+    "price": parse_floats,
+    "available": parse_floats,
+}
+"""Column parsers, keyed by Bond field."""
+
+
+def parse_columns(rows: List[List[str]], fields: List[str] = None)-> BondColumns:
+    """Parse raw CSV rows into a columnar store, one whole column at a time."""
+    fields = FIELDS + ["id"] if fields is None else fields
+    raw = dict(zip(FIELDS, zip(*rows))) if len(rows) > 0 else { f: () for f in FIELDS }
+
+    data = { field: PARSERS[field](raw[field]) for field in fields if field in PARSERS }
+    if "id" in fields:
+        data["id"] = generate_ids(
+            Categorical.from_values(parse_strings(raw["company"])),
+            data["coupon"] if "coupon" in data else parse_coupons(raw["coupon"]),
+            data["maturity"] if "maturity" in data else parse_dates(raw["maturity"]),
+        )
+
+    return BondColumns(data)
+
+def parse_columns_where(rows: List[List[str]], plan: List[Predicate])-> BondColumns:
+    """
+        Parse raw CSV rows, pushing the simple predicates of a query plan down into the parse.
+
+        Only the columns those predicates read are parsed for every row, the remaining columns
+        are parsed just for the rows that passed.
+    """
+    pushed = [ p for p in plan if p.pushdown ]
+    if len(pushed) > 0:
+        fields = sorted({ f for p in pushed for f in p.fields })
+        idx = query.evaluate(parse_columns(rows, fields), pushed)
+        rows = [ rows[i] for i in idx ]
+
+    return query.apply(parse_columns(rows), [ p for p in plan if not p.pushdown ])
+
+@contextmanager
+def open_input(path: str)-> Iterator[IO[str]]:
+    """Open a market file for reading, "-" reads stdin and .gz files are decompressed on the fly."""
+    if path == "-":
+        yield io.TextIOWrapper(sys.stdin.buffer, newline="")
+    elif path.endswith(".gz"):
+        with gzip.open(path, "rt", newline="") as f:
+            yield f
+    else:
+        with open(path, newline="") as f:
+            yield f
+
+def read_rows(file_path: str)-> List[List[str]]:
+    """Raw CSV rows, without the header. Files ending in .gz are decompressed."""
+    with timings.stage("csv read") as s, open_input(file_path) as csvfile:
+        reader = csv.reader(csvfile, delimiter=",", quotechar="\"")
+        next(reader, None)
+        rows = list(reader)
+        s.rows = len(rows)
+
+    return rows
+
+def row_hashes(rows: List[List[str]])-> np.ndarray:
+    """64 bit hash of every raw row, the same across runs, so rows can be matched without parsing them."""
+    with timings.stage("row hash", len(rows)):
+        digests = ( hashlib.blake2b("\x1f".join(row).encode(), digest_size=8).digest() for row in rows )
+        return np.frombuffer(b"".join(digests), dtype=np.uint64)
+
+def apply_rows(universe: BondColumns, universe_hashes: np.ndarray, rows: List[List[str]], hashes: np.ndarray = None)-> BondColumns:
+    """
+        Columns of rows, reusing the parsed universe for every row it already holds unchanged.
+
+        Rows are matched on their raw hash, only new and changed rows are parsed. The result is
+        in the order of rows, the same as parsing them all.
+    """
+    hashes = row_hashes(rows) if hashes is None else hashes
+    with timings.stage("apply rows") as s:
+        position = dict(zip(universe_hashes.tolist(), range(len(universe_hashes))))
+        pos = np.fromiter((position.get(h, -1) for h in hashes.tolist()), dtype=np.int64, count=len(hashes))
+        kept, changed = np.flatnonzero(pos >= 0), np.flatnonzero(pos < 0)
+        s.rows = len(changed)
+        if len(changed) == 0:
+            return universe.take(pos)
+
+        merged = universe.take(pos[kept]).concat(parse_columns([ rows[i] for i in changed ]))
+
+        return merged.take(np.argsort(np.concatenate([kept, changed]), kind="stable"))
+
+def load_columns_from_csv(file_path: str, plan: List[Predicate] = None)-> BondColumns:
+    """Read CSV file, and parse it into a columnar store, keeping only rows matching the plan."""
+    rows = read_rows(file_path)
+
+    with timings.stage("parse") as s:
+        columns = parse_columns(rows) if plan is None else parse_columns_where(rows, plan)
+        s.rows = len(columns)
+
+    return columns
+
+def load_columns(file_path: str, use_cache: bool = True, plan: List[Predicate] = None, base_path: str = None)-> BondColumns:
+    """
+        Load a parsed market snapshot, reusing the binary cache unless the source file changed.
+
+        When a query plan is given only the matching rows are returned. Without the cache its
+        predicates are pushed down into the CSV parse, with the cache they run over the memory
+        mapped columns so unused columns are never read.
+
+        A changed file is applied incrementally to what was cached for it before, or for
+        base_path when given, so only its new and changed rows are parsed.
+    """
+    if not use_cache:
+        return load_columns_from_csv(file_path, plan)
+
+    with timings.stage("cache load") as s:
+        key = cache.snapshot_key(file_path)
+        columns = cache.load_snapshot(file_path, key)
+        s.rows = None if columns is None else len(columns)
+
+    if columns is not None:
+        return query.apply(columns, plan or [])
+
+    # The file changed since it was cached: parse only the rows that are new or changed.
+    rows = read_rows(file_path)
+    hashes = row_hashes(rows)
+    previous = cache.load_previous(file_path if base_path is None else base_path)
+    if previous is not None:
+        columns = apply_rows(*previous, rows, hashes)
+    else:
+        with timings.stage("parse", len(rows)):
+            columns = parse_columns(rows)
+
+    try:
+        with timings.stage("cache save", len(columns)):
+            cache.save_snapshot(file_path, columns, key, hashes)
+    except OSError:
+        # A read only cache directory only costs us the speed up.
+        pass
+
+    return query.apply(columns, plan or [])
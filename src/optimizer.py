@@ -0,0 +1,141 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+from dataclasses import dataclass
+import numpy as np
+from src.bonds import Bonds
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
+
+BISECTION_STEPS = 60
+
+MAX_PENALTY = 1e6
+"""Largest penalty on excess risk tried, a risk limit still broken past it can not be met."""
+
+
+class InfeasibleError(ValueError):
+    pass
+
+
+@dataclass
+class Allocation:
+    """Cash invested in each bond of the universe it was optimized over."""
+
+    bonds: Bonds
+
+    cash: np.ndarray
+
+    def total(self)-> float:
+        return float(self.cash.sum())
+
+    def expected_yield(self)-> float:
+        total = self.total()
+        return float((self.cash * self.bonds.columns["ytm_ytc"]).sum() / total) if total > 0 else 0.0
+
+    def average_risk(self)-> float:
+        total = self.total()
+        return float((self.cash * self.bonds.columns.risk_score()).sum() / total) if total > 0 else 0.0
+
+    def to_df(self)-> DataFrame:
+        from pandas import DataFrame
+
+        columns = self.bonds.columns
+        held = np.flatnonzero(self.cash > 0.005)
+        held = held[np.argsort(-self.cash[held], kind="stable")]
+        total = self.total()
+
+        return DataFrame({
+            "Ticker": columns["ticker"][held],
+            "Company": columns["company"][held],
+            "Industry": columns.values("industry")[held],
+            "Price": columns["price"][held],
+            "Yield": columns["ytm_ytc"][held],
+            "Risk": columns.risk_score()[held],
+            "Amount": self.cash[held].round(2),
+            "Nominal": (self.cash[held] / columns["price"][held] * 100).round(2),
+            "Weight": (self.cash[held] / total).round(4) if total > 0 else 0.0,
+        })
+
+
+def _fill(order: np.ndarray, capacity: np.ndarray, issuer: np.ndarray, issuer_left: np.ndarray, industry: np.ndarray, industry_left: np.ndarray, amount: float)-> np.ndarray:
+    """Greedy fill in the given order, every bond takes as much as its caps still allow."""
+    cash = np.zeros(len(capacity))
+    issuer_left = issuer_left.copy()
+    industry_left = industry_left.copy()
+    left = amount
+    for i in order.tolist():
+        x = min(capacity[i], issuer_left[issuer[i]], industry_left[industry[i]], left)
+        if x <= 0:
+            continue
+
+        cash[i] = x
+        issuer_left[issuer[i]] -= x
+        industry_left[industry[i]] -= x
+        left -= x
+        if left <= 0:
+            break
+
+    return cash
+
+def optimize(
+    b: Bonds,
+    amount: float,
+    issuer_cap: float = 1.0,
+    industry_cap: float = 1.0,
+    max_risk: float | None = None)-> Allocation:
+    """
+        Allocate cash to maximise the expected yield (YTM/YTC) of the portfolio.
+
+        Each bond can take at most its available nominal at its price, and each issuer and industry
+        at most its cap, as a share of the amount. Without a risk limit a greedy fill by yield is
+        optimal. The average risk score limit is handled by Lagrangian relaxation: bonds are ranked
+        by yield minus a penalty on their excess risk, the penalty is bisected, and the last
+        infeasible and first feasible fills are blended so the limit holds exactly. As long as each
+        issuer sits in a single industry this is the LP optimum.
+
+        Raises InfeasibleError when the risk limit can not be met.
+    """
+    columns = b.columns
+    yields = np.asarray(columns["ytm_ytc"], dtype=np.float64)
+    risk = np.asarray(columns.risk_score(), dtype=np.float64)
+    capacity = np.asarray(columns["available"] * columns["price"] / 100, dtype=np.float64)
+
+    issuers, issuer = np.unique(np.asarray(columns["company"], dtype=object), return_inverse=True)
+    industry = columns["industry"].codes
+    issuer_left = np.full(len(issuers), issuer_cap * amount)
+    industry_left = np.full(len(columns["industry"].categories), industry_cap * amount)
+
+    def fill(penalty: float)-> np.ndarray:
+        excess = risk - max_risk if max_risk is not None else np.zeros(len(risk))
+        score = yields - penalty * excess
+        order = np.argsort(-score, kind="stable")
+        order = order[score[order] > 0]
+        return _fill(order, capacity, issuer.reshape(-1), issuer_left, industry, industry_left, amount)
+
+    def excess_risk(cash: np.ndarray)-> float:
+        return float((cash * (risk - max_risk)).sum())
+
+    cash = fill(0.0)
+    if max_risk is None or excess_risk(cash) <= 0:
+        return Allocation(b, cash)
+
+    low, high = 0.0, 1.0
+    while excess_risk(fill(high)) > 0:
+        if high >= MAX_PENALTY:
+            raise InfeasibleError(f"no allocation keeps the average risk score at most {max_risk}")
+
+        low, high = high, high * 2
+
+    for _ in range(BISECTION_STEPS):
+        mid = (low + high) / 2
+        if excess_risk(fill(mid)) > 0:
+            low = mid
+        else:
+            high = mid
+
+    infeasible, feasible = fill(low), fill(high)
+    over, under = excess_risk(infeasible), excess_risk(feasible)
+    theta = under / (under - over) if over != under else 0.0
+
+    return Allocation(b, theta * infeasible + (1 - theta) * feasible)
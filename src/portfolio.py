@@ -0,0 +1,197 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Dict, List, Sequence
+from dataclasses import dataclass
+import csv
+import numpy as np
+from src import timings
+from src.cashflow import FACE, Flows, Schedule, flows, schedule
+from src.columns import BondColumns
+from src.stream import open_input
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
+
+HOLDING_COLUMNS: Dict[str, str] = {
+    "isin": "isin",
+    "nominal": "nominal",
+    "amount": "nominal",
+    "purchase_price": "purchase_price",
+    "price": "purchase_price",
+}
+"""Accepted holdings file headers, lower cased with spaces as underscores, and the column each one fills."""
+
+GROUPS: Dict[str, str] = {
+    "month": "Month",
+    "currency": "Currency",
+    "issuer": "Issuer",
+}
+"""Keys the cash flow calendar can be grouped by, and their column names."""
+
+
+@dataclass
+class Holdings:
+    """Positions held, one per lot. The same ISIN may be bought several times."""
+
+    isin: np.ndarray
+
+    nominal: np.ndarray
+
+    purchase_price: np.ndarray
+    """Clean price paid per 100 nominal, NaN when unknown."""
+
+    def __len__(self)-> int:
+        return len(self.isin)
+
+
+def load_holdings(path: str)-> Holdings:
+    """
+        Read a holdings CSV with ISIN and Nominal columns, and optionally a Purchase Price.
+
+        Amount is accepted for Nominal and Price for Purchase Price.
+    """
+    with open_input(path) as f:
+        reader = csv.reader(f)
+        header = [ h.strip().lower().replace(" ", "_") for h in next(reader, []) ]
+        names = [ HOLDING_COLUMNS.get(h) for h in header ]
+        for required in ["isin", "nominal"]:
+            if required not in names:
+                raise ValueError(f"holdings file {path} has no {required} column")
+
+        rows = [ r for r in reader if len(r) > 0 ]
+
+    columns = dict(zip(names, zip(*rows))) if len(rows) > 0 else { n: () for n in names }
+    isin = np.array([ v.strip() for v in columns["isin"] ], dtype=str)
+    try:
+        nominal = np.array(columns["nominal"], dtype=np.float64)
+        price = np.array([ v or "nan" for v in columns["purchase_price"] ], dtype=np.float64) if "purchase_price" in columns else np.full(len(isin), np.nan)
+    except ValueError as e:
+        raise ValueError(f"holdings file {path}: {e}")
+
+    return Holdings(isin, nominal, price)
+
+
+@dataclass
+class Portfolio:
+    """
+        Holdings joined against a market snapshot.
+
+        Lots of the same bond are summed up, so every bond held has one row in columns, and the
+        cash flow schedule is generated once per bond rather than per lot.
+    """
+
+    holdings: Holdings
+
+    columns: BondColumns
+    """Market rows of the bonds held, one per bond."""
+
+    position: np.ndarray
+    """Row in columns of every lot, -1 for lots not found in the snapshot."""
+
+    def missing(self)-> List[str]:
+        """ISINs held but not in the snapshot."""
+        return sorted(set(self.holdings.isin[self.position < 0].tolist()))
+
+    def nominal(self)-> np.ndarray:
+        """Nominal held of each bond, summed over its lots."""
+        found = self.position >= 0
+        return np.bincount(self.position[found], weights=self.holdings.nominal[found], minlength=len(self.columns))
+
+    def cost(self)-> np.ndarray:
+        """Amount paid for each bond, lots without a purchase price count at the market price."""
+        found = self.position >= 0
+        price = self.holdings.purchase_price[found]
+        price = np.where(np.isnan(price), self.columns["price"][self.position[found]], price)
+
+        return np.bincount(self.position[found], weights=price * self.holdings.nominal[found] / FACE, minlength=len(self.columns))
+
+    def schedule(self)-> Schedule:
+        return schedule(self.columns)
+
+    def flows(self)-> Flows:
+        return flows(self.columns)
+
+    def positions(self)-> DataFrame:
+        """One row per bond held: nominal, cost, market value, accrued interest and unrealized profit."""
+        from pandas import DataFrame
+
+        with timings.stage("positions", len(self.columns)):
+            nominal, cost = self.nominal(), self.cost()
+            value = self.columns["price"] * nominal / FACE
+            accrued = self.schedule().accrued * nominal / FACE
+
+            return DataFrame({
+                "Isin": self.columns["isin"],
+                "Ticker": self.columns["ticker"],
+                "Issuer": self.columns["company"],
+                "Currency": self.columns.values("currency"),
+                "Nominal": nominal,
+                "Cost": cost,
+                "Value": value,
+                "Accrued": accrued,
+                "Profit": value - cost,
+                "Yield": self.columns["ytm_ytc"],
+            })
+
+    def calendar(self, by: Sequence[str] = ("month", "currency", "issuer"))-> DataFrame:
+        """
+            Expected coupons and redemptions, summed by month, currency and issuer or any of them.
+
+            Every remaining cash flow of every bond comes out of one flat array of payments, scaled
+            by the nominal held. Groups are numbered with one integer key per payment and summed
+            with bincount, without looping over bonds or lots. Amounts are in the currency of each bond.
+        """
+        from pandas import DataFrame
+
+        unknown = [ k for k in by if k not in GROUPS ]
+        if len(unknown) > 0:
+            raise ValueError(f"unknown group: {', '.join(unknown)}, expected {', '.join(GROUPS)}")
+
+        with timings.stage("cash flow calendar") as s:
+            fl = self.flows()
+            scale = self.nominal() / FACE
+            amounts = fl.amounts * scale[fl.bond]
+            redemptions = fl.redemption * scale[fl.bond]
+            s.rows = len(fl)
+
+            # Codes and labels of every key, currency and issuer per bond, month per payment.
+            month = fl.dates.astype("datetime64[M]").astype(np.int64)
+            first_month = month.min() if len(month) > 0 else 0
+            currency = self.columns["currency"]
+            issuers, issuer_codes = np.unique(np.asarray(self.columns["company"]).astype(str), return_inverse=True)
+            keys = {
+                "month": (month - first_month, lambda c: (c + first_month).astype("datetime64[M]").astype("datetime64[ns]")),
+                "currency": (currency.codes.astype(np.int64)[fl.bond], lambda c: currency.categories[c]),
+                "issuer": (issuer_codes.reshape(-1)[fl.bond], lambda c: issuers[c]),
+            }
+
+            codes = [ keys[k][0] for k in by ]
+            sizes = tuple(int(c.max()) + 1 if len(c) > 0 else 1 for c in codes)
+            group = np.ravel_multi_index(codes, sizes) if len(by) > 0 else np.zeros(len(fl), dtype=np.int64)
+            groups, inverse = np.unique(group, return_inverse=True)
+            sums = { name: np.bincount(inverse, weights=v, minlength=len(groups)) for name, v in [("Redemptions", redemptions), ("Total", amounts)] }
+
+            labels = np.unravel_index(groups, sizes) if len(by) > 0 else []
+
+            return DataFrame({
+                **{ GROUPS[k]: keys[k][1](c) for k, c in zip(by, labels) },
+                "Coupons": sums["Total"] - sums["Redemptions"],
+                "Redemptions": sums["Redemptions"],
+                "Total": sums["Total"],
+            })
+
+
+def join(holdings: Holdings, columns: BondColumns)-> Portfolio:
+    """Match holdings to market rows on ISIN, by bisecting the sorted ISINs. A listed ISIN's first row wins."""
+    with timings.stage("join", len(holdings)):
+        isins = np.asarray(columns["isin"]).astype(str)
+        order = np.argsort(isins, kind="stable")
+        ordered = isins[order]
+        at = np.minimum(np.searchsorted(ordered, holdings.isin), max(len(ordered) - 1, 0))
+        found = ordered[at] == holdings.isin if len(ordered) > 0 else np.zeros(len(holdings), dtype=bool)
+        rows = np.where(found, order[at] if len(ordered) > 0 else 0, -1)
+
+        held = np.unique(rows[found])
+        position = np.where(found, np.searchsorted(held, rows), -1)
+
+    return Portfolio(holdings, columns.take(held), position)
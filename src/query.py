@@ -0,0 +1,84 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Callable, List, Tuple
+from dataclasses import dataclass
+import numpy as np
+from src import timings
+from src.columns import BondColumns
+
+if TYPE_CHECKING:
+    from src.index import Indexes
+
+
+SAMPLE_SIZE = 1024
+"""Rows used to estimate how selective each predicate is, before ordering the plan."""
+
+
+@dataclass
+class Predicate:
+    """A single recorded filter step, evaluated over columns as a boolean mask."""
+
+    name: str
+
+    fields: Tuple[str, ...]
+    """Columns the predicate reads, only these are gathered when it is evaluated."""
+
+    fn: Callable[[BondColumns], np.ndarray]
+
+    cost: int = 1
+    """Relative cost per row: 1 for plain comparisons, higher for derived metrics."""
+
+    pushdown: bool = True
+    """Simple predicates can be evaluated by the loader before the other columns are parsed."""
+
+    seek: Callable[[Indexes], np.ndarray] | None = None
+    """Answer the predicate from a sorted index instead of a scan, returning matching row positions."""
+
+    def __call__(self, columns: BondColumns)-> np.ndarray:
+        return np.asarray(self.fn(columns), dtype=bool)
+
+
+def order_plan(columns: BondColumns, plan: List[Predicate])-> List[Predicate]:
+    """Order predicates so cheap and selective ones run first and shrink the input of the rest."""
+    if len(plan) < 2:
+        return plan
+
+    n = len(columns)
+    if n <= SAMPLE_SIZE:
+        return sorted(plan, key=lambda p: p.cost)
+
+    sample = columns.take(np.linspace(0, n - 1, SAMPLE_SIZE).astype(np.int64))
+    def rank(p: Predicate)-> float:
+        passed = np.count_nonzero(p(sample.select(p.fields))) / SAMPLE_SIZE
+        return p.cost / max(1 - passed, 1e-3)
+
+    return sorted(plan, key=rank)
+
+def evaluate(columns: BondColumns, plan: List[Predicate], indexes: Indexes = None)-> np.ndarray:
+    """
+        Run the whole plan in a single fused pass, returning the positions of matching rows.
+
+        When indexes are given, the first predicate that can seek is answered by bisecting
+        its sorted index, and the rest of the plan only scans the rows it returned.
+    """
+    plan = order_plan(columns, plan)
+    seekable = [ p for p in plan if p.seek is not None ] if indexes is not None else []
+    if len(seekable) > 0:
+        with timings.stage(f"seek {seekable[0].name}") as s:
+            idx = seekable[0].seek(indexes)
+            s.rows = len(idx)
+        plan = [ p for p in plan if p is not seekable[0] ]
+    else:
+        idx = np.arange(len(columns))
+
+    for p in plan:
+        if len(idx) == 0:
+            break
+
+        with timings.stage(f"filter {p.name}") as s:
+            idx = idx[p(columns.select(p.fields).take(idx))]
+            s.rows = len(idx)
+
+    return idx
+
+def apply(columns: BondColumns, plan: List[Predicate])-> BondColumns:
+    return columns.take(evaluate(columns, plan)) if len(plan) > 0 else columns
@@ -1,6 +1,8 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from typing import ClassVar, Dict, Sequence, Tuple
+from dataclasses import dataclass, field
 from enum import Enum
+import numpy as np
 
 
 class RatingSystem(Enum):
@@ -70,8 +72,22 @@ RATE_MAP: dict = {
 }
 
 
-@dataclass
+NOT_RATED: dict = {
+    RatingSystem.SANDP: "NR",
+    RatingSystem.MOODY: "WR",
+    RatingSystem.FITCH: "WD",
+}
+"""Placeholder each agency uses for a missing or withdrawn rating."""
+
+
+@dataclass(eq=False)
 class Rating:
+    """
+        Credit rating of a bond, using S&P and falling back to Moody's then Fitch when missing.
+
+        Use Rating.of to get shared instances, there is one per distinct set of agency ratings
+        and its score and grade flags are computed once.
+    """
 
     snp_rate: str
 
@@ -81,19 +97,36 @@ class Rating:
 
     use_rating: str = RatingSystem.SANDP
 
-    def __post_init__(self):
-        if self.snp_rate == "" or self.snp_rate == "NR" or self.snp_rate is None:
-            self.snp_rate = "NR"
-            self.use_rating = RatingSystem.MOODY
+    _score: int = field(default=0, init=False, repr=False)
 
-        if self.moodys_rate == "" or self.moodys_rate == "WR" or self.moodys_rate is None:
-            self.moodys_rate = "WR"
-            self.use_rating = RatingSystem.FITCH
+    _interned: ClassVar[Dict[Tuple[str, str, str], Rating]] = {}
 
-        if self.fitch_rate == "" or self.fitch_rate == "WD" or self.fitch_rate is None:
-            self.fitch_rate = "WD"
+    def __post_init__(self):
+        self.snp_rate = self._prep_rate(self.snp_rate, RatingSystem.SANDP)
+        self.moodys_rate = self._prep_rate(self.moodys_rate, RatingSystem.MOODY)
+        self.fitch_rate = self._prep_rate(self.fitch_rate, RatingSystem.FITCH)
+
+        for system in [RatingSystem.SANDP, RatingSystem.MOODY, RatingSystem.FITCH]:
+            self.use_rating = system
+            if self.get_rate() != NOT_RATED[system]:
+                break
+        else:
             self.use_rating = RatingSystem.SANDP
 
+        self._score = RATE_MAP[self.use_rating].get(self.get_rate(), 0)
+
+    @classmethod
+    def of(cls, snp_rate: str, moodys_rate: str = None, fitch_rate: str = None)-> Rating:
+        """Get the shared rating instance for these agency ratings."""
+        key = (snp_rate, moodys_rate, fitch_rate)
+        if key not in cls._interned:
+            cls._interned[key] = cls(snp_rate, moodys_rate, fitch_rate)
+
+        return cls._interned[key]
+
+    def _prep_rate(self, value: str, system: RatingSystem)-> str:
+        return NOT_RATED[system] if value == "" or value is None else value
+
     def __eq__(self, ob: Rating)-> bool:
         return self.get_score() == ob.get_score()
 
@@ -104,7 +137,7 @@ class Rating:
         return self.get_score() < ob.get_score()
 
     def get_score(self)-> int:
-        return RATE_MAP[self.use_rating][self.get_rate()]
+        return self._score
 
     def get_rate(self)-> str:
         match self.use_rating:
@@ -114,18 +147,56 @@ class Rating:
                 return self.moodys_rate
             case RatingSystem.FITCH:
                 return self.fitch_rate
-    
+
+    def get_letter(self)-> str:
+        """Letter bucket of the rating: A, B, C or NR."""
+        if self.is_b_rate():
+            return "B"
+
+        if self.is_c_rate():
+            return "C"
+
+        return "NR" if self._score == 0 else "A"
+
     def is_a_rate(self)-> bool:
-        return 1 < self.get_score() <= 7
+        return 1 < self._score <= 7
 
     def is_b_rate(self)-> bool:
-        return 7 < self.get_score() <= 16
+        return 7 < self._score <= 16
 
     def is_c_rate(self)-> bool:
-        return 16 < self.get_score() <= 19
+        return 16 < self._score <= 19
 
     def is_investment_grade(self)-> bool:
-        return 0 < self.get_score() <= 10
+        return 0 < self._score <= 10
 
     def is_high_yield_grade(self)-> bool:
-        return self.get_score() > 10
+        return self._score > 10
+
+
+def rate_score(rate: str)-> int:
+    """Score of a single S&P/Fitch or Moody's rate, such as "BBB-" or "Baa3"."""
+    for rate_map in [S_P_RATE_MAP, MOODY_RATE_MAP]:
+        if rate in rate_map:
+            return rate_map[rate]
+
+    raise ValueError(f"unknown rating {rate}")
+
+def score_table(snp_rates: Sequence[str], moodys_rates: Sequence[str], fitch_rates: Sequence[str])-> np.ndarray:
+    """Scores for every combination of the given agency ratings, indexed [snp, moodys, fitch]."""
+    table = np.zeros((len(snp_rates), len(moodys_rates), len(fitch_rates)), dtype=np.int64)
+    for i, snp in enumerate(snp_rates):
+        for j, moodys in enumerate(moodys_rates):
+            for k, fitch in enumerate(fitch_rates):
+                table[i, j, k] = Rating(snp, moodys, fitch).get_score()
+
+    return table
+
+def rating_scores(snp_rates: Sequence[str], moodys_rates: Sequence[str], fitch_rates: Sequence[str])-> np.ndarray:
+    """Map whole columns of agency ratings to an array of scores."""
+    columns = [ np.unique(np.asarray(c, dtype=object), return_inverse=True) for c in [snp_rates, moodys_rates, fitch_rates] ]
+    if len(columns[0][1]) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    table = score_table(*[ c[0].tolist() for c in columns ])
+    return table[tuple(c[1].reshape(-1) for c in columns)]
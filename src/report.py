@@ -1,6 +1,13 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
 from dataclasses import dataclass
-from pandas import DataFrame
-from src.bonds import Bonds, bonds
+from src import simulation, timings
+from src.bond import Bond
+from src.bonds import Bonds, bonds, parse_sort
+from src.simulation import Simulation, distribution
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
 
 
 @dataclass
@@ -15,59 +22,83 @@ class Report:
         return f"{round(val, 2):,}"
 
     def _as_df(self, b: Bonds)-> DataFrame:
-        data = []
-        for bond in b:
-            data.append([
-                bond.ticker,
-                bond.company, 
-                self._fmt_money(bond.price), 
-                self._fmt_money(bond.get_total_yield()), 
-                self._fmt_percentage(bond.get_maturity_growth()), 
-                f"{bond.get_maturity_months()} months",
-                bond.is_investment_grade(),
-                bond.get_rating_score(),
-                bond.get_risk_score()
-            ])
-
-        columns=["Ticker", "Company", "Lose", "Win", "Rate", "Maturity", "Investable", "Rating score", "Risk"]
-
-        return DataFrame(data, columns=columns)
-
-    def generate_report(self, sort = None, direction = "desc")-> DataFrame:
+        """Report columns computed in one pass over the column arrays, kept as raw numbers."""
+        from pandas import DataFrame
+
+        with timings.stage("dataframe build", len(b)):
+            columns = b.columns
+            return DataFrame({
+                "Ticker": columns["ticker"],
+                "Company": columns["company"],
+                "Lose": columns["price"],
+                "Win": columns.total_yield(),
+                "Rate": columns.maturity_growth(),
+                "Maturity": columns.maturity_months(),
+                "Investable": columns.is_investment_grade(),
+                "Rating score": columns.rating_score(),
+                "Risk": columns.risk_score(),
+            })
+
+    def format(self, df: DataFrame)-> DataFrame:
+        """Money, percentages and maturities as display strings. Only for printing, the result no longer sorts numerically."""
+        with timings.stage("format", len(df)):
+            df = df.copy()
+            df["Lose"] = [ self._fmt_money(v) for v in df["Lose"].tolist() ]
+            df["Win"] = [ self._fmt_money(v) for v in df["Win"].tolist() ]
+            df["Rate"] = [ self._fmt_percentage(v) for v in df["Rate"].tolist() ]
+            df["Maturity"] = [ f"{v} months" for v in df["Maturity"].tolist() ]
+
+            return df
+
+    def generate_report(self, sort = None, direction = "desc", top: int = None)-> DataFrame:
+        """
+            Discounted bonds available to buy, sorted by one or more keys such as "yield:desc,risk:asc".
+
+            With top, only the best bonds are picked, without sorting the rest. Columns hold raw
+            numbers, pass the result to format for display.
+        """
         b = self.bonds.only_discount_price()\
             .only_bond_type()\
             .only_available()
 
         if sort is not None:
-            match sort:
-                case "length":
-                    b.sort_by_length(direction)
-                case "maturity":
-                    b.sort_by_maturity(direction)
-                case "score":
-                    b.sort_by_rating_score(direction)
-                case "yield":
-                    b.sort_by_total_yield(direction)
-                case "risk":
-                    b.sort_by_risk_score(direction)
+            spec = parse_sort(sort, direction)
+            if top is not None:
+                b = b.top(top, spec)
+            else:
+                b.sort_by(spec)
+        elif top is not None:
+            b = b.first(top)
 
         return self._as_df(b)
 
-    def simulate(self, ticker: str = None, isin: str = None, amount_invested: int = 0, reinvest: bool = True)-> DataFrame:
+    def simulate(
+        self,
+        ticker: str = None,
+        isin: str = None,
+        amount_invested: int = 0,
+        reinvest: bool = True,
+        paths: int = 10_000,
+        workers: int = 1,
+        seed: int = 0,
+        price_volatility: float = None)-> DataFrame:
+        """Monte Carlo simulation of holding a bond to maturity, returns the percentiles of terminal wealth."""
+        bond = self.find(ticker, isin)
+        assert amount_invested > 0, "Amount invested must be greater than £0"
+
+        sched = bonds(bond).cash_flows()
+        sim = Simulation.from_bond(bond, sched, amount_invested, reinvest=reinvest, price_volatility=price_volatility)
+
+        return distribution(simulation.simulate(sim, paths, workers, seed), amount_invested)
+
+    def find(self, ticker: str = None, isin: str = None)-> Bond:
+        bond = None
         if ticker is not None:
             bond = self.bonds.find_by_ticker(ticker)
-            assert bond is not None, "Could not find bond"
 
         if isin is not None:
             bond = self.bonds.find_by_isin(isin)
-            assert bond is not None, "Could not find bond"
 
-        assert amount_invested > 0, "Amount invested must be greater than £0"
-        
-        template = "Holding this bond to maturity and investing {amount} will yield in {years} years and {months} months a total amount of {total}"
-        return template.format(
-            amount=amount_invested,
-            years=bond.get_maturity_years(),
-            months=lambda: bond.get_maturity_months() % 12,
-            total=bond.get_total_yield(amount_invested),
-        )
+        assert bond is not None, "Could not find bond"
+
+        return bond
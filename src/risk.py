@@ -0,0 +1,323 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, List, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+import json
+import re
+import numpy as np
+from src import timings
+from src.cashflow import FACE, Flows, flows
+from src.columns import BondColumns
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
+
+RISK_FIELDS: List[str] = ["maturity", "next_payment", "coupon", "coupon_frequency", "ytm_ytc"]
+"""Columns the sensitivities are computed from."""
+
+BASIS_POINT = 1e-4
+
+DEFAULT_SHIFTS: List[float] = [-200, -100, -50, -25, 25, 50, 100, 200]
+"""Parallel shocks in basis points, when no scenario is given."""
+
+CHUNK = 1 << 22
+"""Most scenario by cash flow cells repriced at once, bounds the memory of a stress run."""
+
+TENOR = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([ym]?)\s*$", re.IGNORECASE)
+
+
+@dataclass
+class Sensitivities:
+    """
+        Interest rate sensitivities of many bonds at their listed yield, per 100 nominal.
+
+        Yields compound at the coupon frequency, with cash flows and times as in the cash flow
+        schedule. Bonds without remaining cash flows or without a yield get NaN.
+    """
+
+    dirty_price: np.ndarray
+    """Price of the cash flows discounted at the listed yield, accrued interest included."""
+
+    macaulay_duration: np.ndarray
+    """Present value weighted years to the cash flows."""
+
+    modified_duration: np.ndarray
+    """Relative price change for a change in yield, Macaulay duration over 1 + yield / frequency."""
+
+    convexity: np.ndarray
+
+    dv01: np.ndarray
+    """Price change for a one basis point fall in yield."""
+
+    def __len__(self)-> int:
+        return len(self.dirty_price)
+
+
+@dataclass
+class Scenario:
+    """
+        Yield shock by years to cash flow, linear between tenors and flat outside them.
+
+        A parallel shock has a single tenor. Each cash flow is discounted at the bond's yield
+        plus the shift at its time, so bucketed shocks move short and long cash flows apart.
+    """
+
+    name: str
+
+    tenors: np.ndarray
+    """Years, increasing."""
+
+    shifts: np.ndarray
+    """Change in yield at each tenor, as a fraction."""
+
+    def shift(self, times: np.ndarray)-> np.ndarray:
+        return np.interp(times, self.tenors, self.shifts)
+
+
+def parallel(bp: float)-> Scenario:
+    return Scenario(f"{bp:+g}bp", np.zeros(1), np.array([bp * BASIS_POINT]))
+
+def parse_tenor(text: str)-> float:
+    """Years of a tenor such as 5y, 18m or 2.5, which counts as years."""
+    m = TENOR.match(text)
+    if m is None:
+        raise ValueError(f"bad tenor: {text}, expected years like 5y or months like 18m")
+
+    value = float(m.group(1))
+
+    return value / 12 if m.group(2).lower() == "m" else value
+
+def bucketed(name: str, shifts: dict)-> Scenario:
+    """Scenario from basis points by tenor, such as { "2y": -25, "10y": 25 }."""
+    if len(shifts) == 0:
+        raise ValueError(f"scenario {name} has no tenors")
+
+    try:
+        points = sorted((parse_tenor(str(t)), float(bp)) for t, bp in shifts.items())
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"scenario {name}: {e}")
+
+    tenors = [ t for t, _ in points ]
+    if len(set(tenors)) < len(tenors):
+        raise ValueError(f"scenario {name} repeats a tenor")
+
+    return Scenario(name, np.array(tenors), np.array([ bp * BASIS_POINT for _, bp in points ]))
+
+def parse_scenario(text: str)-> Scenario:
+    """
+        Scenario from the command line, basis points by tenor with an optional name, such as
+        steepener=2y:-25,10y:25 or 30y:50. A lone number is a parallel shock.
+    """
+    name, _, body = text.rpartition("=")
+    try:
+        if ":" not in body:
+            return parallel(float(body)) if name == "" else Scenario(name.strip(), np.zeros(1), np.array([float(body) * BASIS_POINT]))
+
+        shifts = dict(p.split(":", 1) for p in body.split(",") if p.strip() != "")
+    except ValueError:
+        raise ValueError(f"bad scenario: {text}, expected basis points such as 50 or name=2y:-25,10y:25")
+
+    return bucketed(name.strip() or body.strip(), shifts)
+
+def parse_shifts(text: str)-> List[Scenario]:
+    """Parallel scenarios from a list of basis points, such as -100,-50,50,100."""
+    try:
+        return [ parallel(float(v)) for v in text.split(",") if v.strip() != "" ]
+    except ValueError:
+        raise ValueError(f"bad shifts: {text}, expected basis points such as -100,-50,50,100")
+
+def load_scenarios(path: str)-> List[Scenario]:
+    """
+        Scenarios from a JSON file, mapping each name to basis points, either one number for a
+        parallel shock or a mapping of tenors, such as
+
+            { "up_100": 100,
+              "bear_steepener": { "2y": 25, "10y": 75, "30y": 100 } }
+    """
+    definitions = json.loads(Path(path).read_text())
+    if not isinstance(definitions, dict) or len(definitions) == 0:
+        raise ValueError(f"{path} must map scenario names to basis points")
+
+    scenarios = []
+    for name, shifts in definitions.items():
+        if isinstance(shifts, dict):
+            scenarios.append(bucketed(name, shifts))
+        elif isinstance(shifts, (int, float)) and not isinstance(shifts, bool):
+            scenarios.append(Scenario(name, np.zeros(1), np.array([shifts * BASIS_POINT])))
+        else:
+            raise ValueError(f"scenario {name}: expected basis points or a mapping of tenors to basis points")
+
+    return scenarios
+
+
+def _bond_starts(fl: Flows)-> np.ndarray:
+    """Position of the first cash flow of every bond that has any, flows of a bond being contiguous."""
+    return np.flatnonzero(np.concatenate([[True], fl.bond[1:] != fl.bond[:-1]])) if len(fl) > 0 else np.zeros(0, dtype=np.int64)
+
+def _per_bond(values: np.ndarray, fl: Flows, starts: np.ndarray, count: int)-> np.ndarray:
+    """Sum of the last axis over each bond's cash flows, NaN for bonds without any."""
+    out = np.full((*values.shape[:-1], count), np.nan)
+    if len(starts) > 0:
+        out[..., fl.bond[starts]] = np.add.reduceat(values, starts, axis=-1)
+
+    return out
+
+def sensitivities(columns: BondColumns, fl: Flows = None)-> Sensitivities:
+    """Duration, convexity and DV01 of every bond at once, from its cash flows and listed yield."""
+    with timings.stage("sensitivities", len(columns)):
+        fl = flows(columns) if fl is None else fl
+        starts = _bond_starts(fl)
+        frequency = fl.frequency[fl.bond]
+        t = fl.times()
+        base = 1 + columns["ytm_ytc"][fl.bond] / frequency
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            pv = fl.amounts * base ** (-frequency * t)
+            sums = _per_bond(np.stack([pv, pv * t, pv * t * (t + 1 / frequency)]), fl, starts, len(columns))
+            price, weighted, curvature = sums
+            base = 1 + columns["ytm_ytc"] / fl.frequency
+            macaulay = weighted / price
+            modified = macaulay / base
+
+            return Sensitivities(price, macaulay, modified, curvature / (price * base ** 2), modified * price * BASIS_POINT)
+
+def reprice(columns: BondColumns, scenarios: Sequence[Scenario], fl: Flows = None, chunk: int = CHUNK)-> np.ndarray:
+    """
+        Dirty price of every bond under every scenario, one row per scenario.
+
+        Every cash flow is discounted at the bond's yield plus the scenario's shift at its time,
+        for a block of scenarios in one array operation, so that no more than chunk cells are
+        held at once. Parallel shocks move the yield of a whole bond, their compounding rate is
+        taken once per bond rather than per cash flow.
+    """
+    fl = flows(columns) if fl is None else fl
+    starts = _bond_starts(fl)
+    t = fl.times()
+    exponent = -fl.frequency[fl.bond] * t
+    ytm = columns["ytm_ytc"]
+
+    prices = np.full((len(scenarios), len(columns)), np.nan)
+    step = max(1, chunk // max(len(fl), 1))
+    parallel = [ i for i, s in enumerate(scenarios) if len(s.tenors) == 1 ]
+    bucketed = [ i for i, s in enumerate(scenarios) if len(s.tenors) > 1 ]
+    for group in [parallel, bucketed]:
+        for b in range(0, len(group), step):
+            block = group[b:b + step]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                if group is parallel:
+                    shifts = np.array([ scenarios[i].shifts[0] for i in block ])[:, None]
+                    rate = np.log1p((ytm + shifts) / fl.frequency)[:, fl.bond]
+                else:
+                    shifts = np.stack([ scenarios[i].shift(t) for i in block ])
+                    rate = np.log1p((ytm[fl.bond] + shifts) / fl.frequency[fl.bond])
+
+                # In place, the block is the largest array of the run.
+                pv = np.exp(np.multiply(rate, exponent, out=rate), out=rate)
+                pv *= fl.amounts
+
+            prices[block] = _per_bond(pv, fl, starts, len(columns))
+
+    return prices
+
+
+@dataclass
+class Stress:
+    """Price changes of positions under yield scenarios, with their sensitivities."""
+
+    columns: BondColumns
+
+    nominal: np.ndarray
+    """Nominal held of each bond, 100 for a universe without holdings."""
+
+    scenarios: List[Scenario]
+
+    measures: Sensitivities
+
+    change: np.ndarray
+    """Price change per 100 nominal, one row per scenario. Clean and dirty prices move alike."""
+
+    def pnl(self)-> np.ndarray:
+        """Profit and loss of each position under each scenario, NaN for bonds that could not be priced."""
+        return self.change * self.nominal / FACE
+
+    def value(self)-> np.ndarray:
+        """Market value of each position at the listed clean price."""
+        return self.columns["price"] * self.nominal / FACE
+
+    def unpriced(self)-> int:
+        """Bonds without a yield or remaining cash flows, left out of the P&L."""
+        return int(np.isnan(self.measures.dirty_price).sum())
+
+    def risk(self)-> DataFrame:
+        """One row per bond: yield, durations, convexity and DV01, per 100 nominal and for the position."""
+        from pandas import DataFrame
+
+        m = self.measures
+        return DataFrame({
+            "Isin": self.columns["isin"],
+            "Ticker": self.columns["ticker"],
+            "Currency": self.columns.values("currency"),
+            "Nominal": self.nominal,
+            "Price": self.columns["price"],
+            "Yield": self.columns["ytm_ytc"],
+            "Macaulay": m.macaulay_duration,
+            "Modified": m.modified_duration,
+            "Convexity": m.convexity,
+            "DV01": m.dv01,
+            "Position DV01": m.dv01 * self.nominal / FACE,
+        })
+
+    def per_bond(self)-> DataFrame:
+        """One row per bond and scenario, with the stressed price and P&L."""
+        from pandas import DataFrame
+
+        count, bonds = self.change.shape
+        price = self.columns["price"]
+        return DataFrame({
+            "Scenario": np.repeat([ s.name for s in self.scenarios ], bonds),
+            "Isin": np.tile(np.asarray(self.columns["isin"]), count),
+            "Ticker": np.tile(np.asarray(self.columns["ticker"]), count),
+            "Currency": np.tile(self.columns.values("currency"), count),
+            "Nominal": np.tile(self.nominal, count),
+            "Price": np.tile(price, count),
+            "Stressed": (price + self.change).reshape(-1),
+            "Change": self.change.reshape(-1),
+            "P&L": self.pnl().reshape(-1),
+        })
+
+    def summary(self)-> DataFrame:
+        """P&L of every scenario summed by currency, against the market value, with the first order DV01 estimate."""
+        from pandas import DataFrame
+
+        currency = self.columns["currency"]
+        codes, names = currency.codes.astype(np.int64), np.asarray(currency.categories)
+        present = np.unique(codes)
+        value = np.bincount(codes, weights=self.value(), minlength=len(names))[present]
+        dv01 = np.bincount(codes, weights=np.nan_to_num(self.measures.dv01 * self.nominal / FACE), minlength=len(names))[present]
+        pnl = np.stack([ np.bincount(codes, weights=np.nan_to_num(p), minlength=len(names))[present] for p in self.pnl() ]) if len(self.scenarios) > 0 else np.zeros((0, len(present)))
+
+        count = len(self.scenarios)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            returns = pnl / value
+
+        return DataFrame({
+            "Scenario": np.repeat([ s.name for s in self.scenarios ], len(present)),
+            "Currency": np.tile(names[present], count),
+            "Value": np.tile(value, count),
+            "DV01": np.tile(dv01, count),
+            "P&L": pnl.reshape(-1),
+            "Return": returns.reshape(-1),
+        })
+
+
+def stress(columns: BondColumns, scenarios: Sequence[Scenario], nominal: np.ndarray = None)-> Stress:
+    """Reprice every bond under every scenario, against the price at its listed yield."""
+    with timings.stage("stress", len(columns) * len(scenarios)):
+        fl = flows(columns)
+        measures = sensitivities(columns, fl)
+        change = reprice(columns, scenarios, fl) - measures.dirty_price
+
+    nominal = np.full(len(columns), FACE) if nominal is None else np.asarray(nominal, dtype=np.float64)
+
+    return Stress(columns, nominal, list(scenarios), measures, change)
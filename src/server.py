@@ -0,0 +1,391 @@
+from __future__ import annotations
+from typing import Callable, Dict, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from urllib.parse import parse_qsl, urlsplit
+import asyncio
+import json
+import os
+import signal
+import sys
+from src import clock
+from src.bonds import Bonds, screen
+from src.columns import BondColumns
+from src.index import Indexes
+from src.loader import load_columns
+from src.report import Report
+
+
+POLL_INTERVAL = 2.0
+"""Seconds between checks of the market file for changes."""
+
+CACHE_SIZE = 256
+"""Responses kept per server, least recently used ones are dropped first."""
+
+MAX_HEADER_SIZE = 16 * 1024
+
+TRUE_VALUES = ["1", "true", "yes", "on"]
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """
+        Immutable parsed market file. Queries hold on to the snapshot they started with.
+
+        Its indexes and memoized metrics are built before it is swapped in, and each query runs
+        on a collection of its own over the shared columns, against the snapshot's as of date.
+        Nothing a query reads is written while it runs.
+    """
+
+    version: int
+
+    path: str
+
+    stat: Tuple[int, int]
+    """Size and mtime of the file the snapshot was parsed from."""
+
+    columns: BondColumns
+
+    indexes: Indexes
+
+    as_of: datetime
+    """Date maturities count from: the load time, unless --as-of pinned one."""
+
+    loaded_at: datetime
+
+    def bonds(self)-> Bonds:
+        return Bonds.from_columns(self.columns, indexes=self.indexes)
+
+
+class QueryError(Exception):
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _flag(value: str)-> bool:
+    return value.lower() in TRUE_VALUES
+
+def _positive(value: str)-> int:
+    count = int(value)
+    if count < 1:
+        raise ValueError(f"{count} is smaller than 1")
+
+    return count
+
+FILTER_PARAMS: Dict[str, Callable[[str], object]] = {
+    "based": str,
+    "coupon": float,
+    "current_yield": float,
+    "maturity_months": int,
+    "maturity_years": int,
+    "investment_grade": _flag,
+    "high_yield_grade": _flag,
+    "premium": _flag,
+    "discount": _flag,
+    "available": _flag,
+    "where": str,
+}
+"""Same options as the filter subcommand."""
+
+REPORT_PARAMS: Dict[str, Callable[[str], object]] = {
+    "sort": str,
+    "asc": _flag,
+    "top": _positive,
+}
+
+SIMULATE_PARAMS: Dict[str, Callable[[str], object]] = {
+    "ticker": str,
+    "isin": str,
+    "amount": int,
+    "reinvest": _flag,
+    "paths": _positive,
+    "seed": int,
+    "price_volatility": float,
+}
+
+def parse_params(query: str, spec: Dict[str, Callable[[str], object]])-> Dict[str, object]:
+    """Typed query string parameters, unknown names and bad values are rejected."""
+    params = {}
+    for name, value in parse_qsl(query, keep_blank_values=True):
+        name = name.replace("-", "_")
+        if name not in spec:
+            raise QueryError(400, f"unknown parameter: {name}")
+        try:
+            params[name] = spec[name](value)
+        except ValueError as e:
+            raise QueryError(400, f"invalid {name}: {e}")
+
+    return params
+
+
+def _records(df)-> list:
+    return [] if df is None else json.loads(df.to_json(orient="records", date_format="iso"))
+
+def run_filter(snapshot: Snapshot, params: Dict[str, object])-> dict:
+    rows = _records(screen(snapshot.bonds(), **params).to_df())
+    return { "count": len(rows), "bonds": rows }
+
+def run_report(snapshot: Snapshot, params: Dict[str, object])-> dict:
+    direction = "asc" if params.get("asc", False) else "desc"
+    rows = _records(Report(snapshot.bonds()).generate_report(params.get("sort"), direction, params.get("top")))
+    return { "count": len(rows), "bonds": rows }
+
+def run_simulate(snapshot: Snapshot, params: Dict[str, object])-> dict:
+    if params.get("ticker") is None and params.get("isin") is None:
+        raise QueryError(400, "ticker or isin is required")
+
+    if params.get("amount", 0) <= 0:
+        raise QueryError(400, "amount must be greater than 0")
+
+    b = snapshot.bonds()
+    report = Report(b)
+    bond = b.find_by_ticker(params["ticker"]) if "ticker" in params else b.find_by_isin(params["isin"])
+    if bond is None:
+        raise QueryError(404, "could not find bond")
+
+    df = report.simulate(
+        params.get("ticker"),
+        params.get("isin"),
+        params["amount"],
+        params.get("reinvest", True),
+        params.get("paths", 10_000),
+        1,
+        params.get("seed", 0),
+        params.get("price_volatility"))
+
+    return {
+        "ticker": bond.ticker,
+        "isin": bond.isin,
+        "maturity_months": bond.get_maturity_months(),
+        "distribution": _records(df),
+    }
+
+def run_at(snapshot: Snapshot, run: Callable[[Snapshot, Dict[str, object]], dict], params: Dict[str, object])-> dict:
+    """Run a query against the as of date of its snapshot, whatever a reload set meanwhile."""
+    with clock.fixed(snapshot.as_of):
+        return run(snapshot, params)
+
+ROUTES: Dict[str, Tuple[Dict[str, Callable[[str], object]], Callable[[Snapshot, Dict[str, object]], dict]]] = {
+    "/filter": (FILTER_PARAMS, run_filter),
+    "/report": (REPORT_PARAMS, run_report),
+    "/simulate": (SIMULATE_PARAMS, run_simulate),
+}
+
+
+class Server:
+    """
+        Keeps a parsed market file resident and answers queries over HTTP, as JSON.
+
+        The file is polled for changes and reloaded in a worker thread. A new snapshot is swapped
+        in with a single assignment once it is fully parsed, so queries never wait for a reload
+        and never see a half loaded universe. Responses are cached by snapshot version, path and
+        parameters, so a reload invalidates them all at once.
+    """
+
+    def __init__(self, file_path: str, use_cache: bool = True, poll_interval: float = POLL_INTERVAL, cache_size: int = CACHE_SIZE):
+        self.file_path = file_path
+        self.use_cache = use_cache
+        self.poll_interval = poll_interval
+        self.cache_size = cache_size
+        self.snapshot: Snapshot | None = None
+        self._responses: OrderedDict[tuple, bytes] = OrderedDict()
+        self._reloading: asyncio.Lock | None = None
+        self._as_of = clock.as_of() if clock.is_set() else None
+
+    def _stat(self)-> Tuple[int, int]:
+        stat = os.stat(self.file_path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def _load(self, version: int)-> Snapshot:
+        stat = self._stat()
+        loaded_at = datetime.now()
+        # Maturities of a long running server count from the last reload, like a fresh CLI run.
+        as_of = loaded_at if self._as_of is None else self._as_of
+        columns = load_columns(self.file_path, self.use_cache)
+        indexes = Indexes(columns)
+
+        # Build everything lazily built on first use up front, so queries only ever read it.
+        with clock.fixed(as_of):
+            for field in Indexes.UNIQUE:
+                indexes.unique(field)
+
+            for field in Indexes.SORTED:
+                indexes.sorted(field)
+
+            columns.rating_score()
+            columns.total_yield()
+            columns.risk_score()
+
+        return Snapshot(version, self.file_path, stat, columns, indexes, as_of, loaded_at)
+
+    async def reload(self, force: bool = False)-> bool:
+        """Parse the market file again if it changed, and swap the new snapshot in. Returns whether it did."""
+        async with self._reloading:
+            try:
+                if not force and self.snapshot is not None and self._stat() == self.snapshot.stat:
+                    return False
+
+                version = 1 if self.snapshot is None else self.snapshot.version + 1
+                snapshot = await asyncio.get_running_loop().run_in_executor(None, self._load, version)
+            except Exception as e:
+                # Keep serving the last good snapshot, the file may still be half written.
+                _log(f"reload of {self.file_path} failed: {e}")
+                return False
+
+            self.snapshot = snapshot
+            self._responses.clear()
+            _log(f"loaded {self.file_path}, version {snapshot.version}, {len(snapshot.columns)} bonds")
+
+            return True
+
+    async def watch(self)-> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            await self.reload()
+
+    async def query(self, path: str, query: str)-> bytes:
+        """JSON response body of a query, from the cache when the same query ran on this snapshot."""
+        if path == "/health":
+            return _dumps(self._health())
+
+        if path not in ROUTES:
+            raise QueryError(404, f"unknown path: {path}")
+
+        spec, run = ROUTES[path]
+        params = parse_params(query, spec)
+        snapshot = self.snapshot
+        key = (snapshot.version, path, tuple(sorted(params.items())))
+        body = self._responses.get(key)
+        if body is not None:
+            self._responses.move_to_end(key)
+            return body
+
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(None, run_at, snapshot, run, params)
+        except (AssertionError, ValueError) as e:
+            raise QueryError(400, str(e))
+
+        body = _dumps({ "version": snapshot.version, **result })
+        if snapshot is self.snapshot:
+            self._responses[key] = body
+            if len(self._responses) > self.cache_size:
+                self._responses.popitem(last=False)
+
+        return body
+
+    def _health(self)-> dict:
+        snapshot = self.snapshot
+        return {
+            "version": snapshot.version,
+            "path": snapshot.path,
+            "bonds": len(snapshot.columns),
+            "as_of": snapshot.as_of.isoformat(),
+            "loaded_at": snapshot.loaded_at.isoformat(),
+            "cached_responses": len(self._responses),
+        }
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter)-> None:
+        """Serve HTTP/1.1 requests on one connection, keeping it alive unless the client asks not to."""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+
+                lines = head.decode("latin-1").split("\r\n")
+                parts = lines[0].split(" ")
+                headers = dict(_header(line) for line in lines[1:] if ":" in line)
+                keep_alive = len(parts) == 3 and parts[2] == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                length = int(headers.get("content-length", "0") or 0)
+                if length > 0:
+                    await reader.readexactly(length)
+
+                if len(parts) != 3:
+                    status, body = 400, _dumps({ "error": "bad request line" })
+                elif parts[0] != "GET":
+                    status, body = 405, _dumps({ "error": f"method not allowed: {parts[0]}" })
+                else:
+                    url = urlsplit(parts[1])
+                    try:
+                        status, body = 200, await self.query(url.path, url.query)
+                    except QueryError as e:
+                        status, body = e.status, _dumps({ "error": str(e) })
+                    except Exception as e:
+                        _log(f"{parts[1]} failed: {e!r}")
+                        status, body = 500, _dumps({ "error": "internal error" })
+
+                writer.write(_response(status, body, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8080, socket_path: str | None = None)-> None:
+        self._reloading = asyncio.Lock()
+        await self.reload(force=True)
+        if self.snapshot is None:
+            raise Exception(f"could not load {self.file_path}")
+
+        if socket_path is not None:
+            server = await asyncio.start_unix_server(self.handle, socket_path, limit=MAX_HEADER_SIZE)
+            _log(f"listening on {socket_path}")
+        else:
+            server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER_SIZE)
+            _log(f"listening on http://{host}:{port}")
+
+        loop = asyncio.get_running_loop()
+        if hasattr(signal, "SIGHUP"):
+            loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(self.reload(force=True)))
+
+        watcher = asyncio.ensure_future(self.watch())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+
+
+REASONS: Dict[int, str] = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+def _header(line: str)-> Tuple[str, str]:
+    name, _, value = line.partition(":")
+    return name.strip().lower(), value.strip()
+
+def _response(status: int, body: bytes, keep_alive: bool)-> bytes:
+    head = [
+        f"HTTP/1.1 {status} {REASONS[status]}",
+        "Content-Type: application/json",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+
+    return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body
+
+def _dumps(value: dict)-> bytes:
+    return json.dumps(value).encode()
+
+def _log(message: str)-> None:
+    print(f"{datetime.now().isoformat(timespec='seconds')} {message}", file=sys.stderr, flush=True)
+
+def serve(file_path: str, host: str = "127.0.0.1", port: int = 8080, socket_path: str | None = None, use_cache: bool = True, poll_interval: float = POLL_INTERVAL)-> None:
+    """Run the query server until interrupted."""
+    server = Server(file_path, use_cache, poll_interval)
+    try:
+        asyncio.run(server.serve(host, port, socket_path))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if socket_path is not None and os.path.exists(socket_path):
+            os.remove(socket_path)
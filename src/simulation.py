@@ -0,0 +1,164 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, List
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from src.bond import Bond
+from src.cashflow import Schedule
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
+
+DEFAULT_PROBABILITY: dict = {
+    0: 0.05,
+    **{ score: 0.0001 for score in [1] },
+    **{ score: 0.0002 for score in [2, 3, 4] },
+    **{ score: 0.0006 for score in [5, 6, 7] },
+    **{ score: 0.002 for score in [8, 9, 10] },
+    **{ score: 0.008 for score in [11, 12, 13] },
+    **{ score: 0.03 for score in [14, 15, 16] },
+    **{ score: 0.25 for score in [17, 18, 19] },
+}
+"""Annual probability of default by rating score, roughly following long run agency default studies."""
+
+HIGHEST_PROBABILITY = 0.5
+"""Annual probability of default for scores past CCC-."""
+
+PERCENTILES: List[int] = [1, 5, 25, 50, 75, 95, 99]
+
+BATCH_SIZE = 10_000
+"""Paths per batch. Batches, not workers, get their own seed, so results do not depend on the worker count."""
+
+
+def default_probability(score: int)-> float:
+    return DEFAULT_PROBABILITY.get(score, HIGHEST_PROBABILITY)
+
+
+@dataclass
+class Simulation:
+    """Parameters of a hold to maturity simulation of one bond, cash flows are per 100 nominal."""
+
+    amount: float
+
+    price: float
+    """Dirty price paid per 100 nominal."""
+
+    times: np.ndarray
+
+    cash_flows: np.ndarray
+
+    reinvest: bool = True
+
+    reinvest_rate: float = 0.04
+
+    rate_volatility: float = 0.01
+    """Annual volatility of the reinvestment rate, which follows a random walk."""
+
+    default_probability: float = 0.0
+
+    recovery: float = 0.4
+    """Share of nominal recovered on default."""
+
+    price_volatility: float | None = None
+    """When set, coupons buy more of the bond along a simulated price path instead of earning the reinvestment rate."""
+
+    @classmethod
+    def from_bond(cls, bond: Bond, sched: Schedule, amount: float, **options)-> Simulation:
+        """Build a simulation from a bond and its one row cash flow schedule."""
+        mask = sched.mask[0]
+        return cls(
+            amount=amount,
+            price=bond.price + sched.accrued[0],
+            times=sched.times[0][mask],
+            cash_flows=sched.amounts[0][mask],
+            default_probability=default_probability(bond.get_rating_score()),
+            reinvest_rate=bond.current_yield,
+            **options,
+        )
+
+    @property
+    def maturity(self)-> float:
+        return float(self.times[-1]) if len(self.times) > 0 else 0.0
+
+    def run(self, paths: int, seed: np.random.SeedSequence)-> np.ndarray:
+        """Terminal wealth at maturity of a batch of paths."""
+        rng = np.random.default_rng(seed)
+        nominal = np.full(paths, self.amount / self.price * 100)
+        k = len(self.times)
+        if k == 0:
+            return np.full(paths, float(self.amount))
+
+        dt = np.diff(self.times, prepend=0.0)
+        hazard = -np.log1p(-min(self.default_probability, 0.999999))
+        default_time = rng.exponential(1 / hazard, paths) if hazard > 0 else np.full(paths, np.inf)
+        alive = default_time[:, None] > self.times[None, :]
+
+        rates = self.reinvest_rate + np.cumsum(rng.normal(0, self.rate_volatility * np.sqrt(dt), (paths, k)), axis=1)
+        # Growth of one unit of cash from each cash flow date to maturity.
+        log_growth = np.cumsum((rates * dt)[:, ::-1], axis=1)[:, ::-1]
+        growth = np.exp(log_growth - rates * dt) if self.reinvest else np.ones((paths, k))
+
+        if self.reinvest and self.price_volatility is not None:
+            wealth, held = self._reinvest_in_bond(rng, nominal, alive, dt)
+            growth = np.ones((paths, k))
+        else:
+            wealth = (nominal[:, None] * self.cash_flows[None, :] / 100 * growth * alive).sum(axis=1)
+            held = np.broadcast_to(nominal[:, None], (paths, k))
+
+        defaulted = default_time < self.maturity
+        if np.any(defaulted):
+            # Recovery is paid at the cash flow date following the default.
+            after = np.argmax(~alive, axis=1)
+            rows = np.arange(paths)
+            recovered = held[rows, after] * self.recovery * growth[rows, after]
+            wealth = wealth + np.where(defaulted, recovered, 0)
+
+        return wealth
+
+    def _reinvest_in_bond(self, rng: np.random.Generator, nominal: np.ndarray, alive: np.ndarray, dt: np.ndarray):
+        """
+            Coupons buy more nominal at a simulated price, pulled back to par as maturity nears.
+
+            Returns the terminal wealth and the nominal held at each cash flow date.
+        """
+        paths, k = alive.shape
+        shocks = rng.normal(0, self.price_volatility * np.sqrt(dt), (paths, k))
+        pull = np.clip(1 - self.times / self.maturity, 0, 1)
+        price = 100 + (self.price - 100) * pull[None, :] + np.cumsum(shocks, axis=1) * 100 * pull[None, :]
+        price = np.maximum(price, 1.0)
+
+        held = np.empty((paths, k))
+        for i in range(k):
+            held[:, i] = nominal
+            cash = nominal * self.cash_flows[i] / 100 * alive[:, i]
+            nominal = nominal + cash / price[:, i] * 100
+
+        return cash, held
+
+
+def _run_batch(sim: Simulation, paths: int, seed: np.random.SeedSequence)-> np.ndarray:
+    return sim.run(paths, seed)
+
+def simulate(sim: Simulation, paths: int = 10_000, workers: int = 1, seed: int = 0)-> np.ndarray:
+    """Terminal wealth of every path, batches are spread across a process pool when workers > 1."""
+    assert paths > 0, "Number of paths must be greater than 0"
+    sizes = [ BATCH_SIZE ] * (paths // BATCH_SIZE) + ([ paths % BATCH_SIZE ] if paths % BATCH_SIZE else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    if workers <= 1 or len(sizes) == 1:
+        return np.concatenate([ sim.run(n, s) for n, s in zip(sizes, seeds) ])
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return np.concatenate(list(pool.map(_run_batch, [sim] * len(sizes), sizes, seeds)))
+
+def distribution(wealth: np.ndarray, amount: float)-> DataFrame:
+    """Percentile distribution of terminal wealth."""
+    from pandas import DataFrame
+
+    values = np.percentile(wealth, PERCENTILES)
+    return DataFrame({
+        "Percentile": PERCENTILES,
+        "Terminal wealth": values.round(2),
+        "Return": (values / amount - 1).round(4),
+    })
@@ -0,0 +1,160 @@
+from __future__ import annotations
+from typing import IO, Iterator, List
+from contextlib import contextmanager
+from datetime import date, datetime
+import csv
+import gzip
+import json
+import sys
+import numpy as np
+from src import timings
+from src.columns import BondColumns, DATE_FIELDS, FIELDS
+from src.loader import open_input, parse_columns_where
+from src.query import Predicate
+
+
+CHUNK_SIZE = 50_000
+"""Rows parsed and filtered at a time, memory use is bounded by one chunk."""
+
+KEYS: List[str] = FIELDS
+"""Exported fields. The generated id only serves lookups and joins, it is left out."""
+
+HEADER: List[str] = [ k.title() for k in KEYS ]
+"""Same column names as Bonds.to_df."""
+
+
+@contextmanager
+def open_output(path: str | None)-> Iterator[IO[str]]:
+    """Open the output for writing, None or "-" writes to stdout and .gz files are compressed."""
+    if path is None or path == "-":
+        yield sys.stdout
+    elif path.endswith(".gz"):
+        with gzip.open(path, "wt", newline="") as f:
+            yield f
+    else:
+        with open(path, "w", newline="") as f:
+            yield f
+
+def read_chunks(f: IO[str], size: int = CHUNK_SIZE)-> Iterator[List[List[str]]]:
+    reader = csv.reader(f, delimiter=",", quotechar="\"")
+    next(reader, None)
+    chunk = []
+    for row in reader:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+
+    if len(chunk) > 0:
+        yield chunk
+
+def filter_chunks(chunks: Iterator[List[List[str]]], plan: List[Predicate])-> Iterator[BondColumns]:
+    """Parse each chunk with the plan pushed down, yielding only the matching rows."""
+    for rows in chunks:
+        with timings.stage("parse") as s:
+            columns = parse_columns_where(rows, plan)
+            s.rows = len(columns)
+
+        if len(columns) > 0:
+            yield columns
+
+def records(columns: BondColumns)-> Iterator[tuple]:
+    """Rows as tuples in the order of HEADER, with dates as ISO strings."""
+    values = []
+    for key in KEYS:
+        col = columns.values(key)
+        if key in DATE_FIELDS:
+            col = np.datetime_as_string(col, unit="D")
+
+        values.append(col.tolist())
+
+    return zip(*values)
+
+def _json_values(col: np.ndarray)-> list:
+    """Column values as JSON types: dates as YYYY-MM-DD, NaN and NaT as null."""
+    col = np.asarray(col)
+    if np.issubdtype(col.dtype, np.datetime64):
+        return [ None if v == "NaT" else v for v in np.datetime_as_string(col, unit="D").tolist() ]
+
+    if np.issubdtype(col.dtype, np.floating):
+        return [ None if v != v else v for v in col.tolist() ]
+
+    if col.dtype == object:
+        # Mixed columns, such as the old and new values of a diff.
+        return [ _json_value(v) for v in col.tolist() ]
+
+    return col.tolist()
+
+def _json_value(value: object)-> object:
+    # NaN and NaT are the values not equal to themselves.
+    if isinstance(value, (float, datetime, np.generic)) and value != value:
+        return None
+
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%Y-%m-%d")
+
+    return value.item() if isinstance(value, np.generic) else value
+
+def json_lines(names: List[str], columns: List[np.ndarray])-> Iterator[str]:
+    """
+        One JSON object per row, keyed by names. The single JSON Lines encoding, shared by the
+        streaming writer and the DataFrame exports so both give the same bytes.
+    """
+    for row in zip(*[ _json_values(c) for c in columns ]):
+        yield json.dumps(dict(zip(names, row))) + "\n"
+
+class CsvWriter:
+
+    def __init__(self, f: IO[str]):
+        self._writer = csv.writer(f, lineterminator="\n")
+        self._writer.writerow(HEADER)
+
+    def write(self, columns: BondColumns)-> None:
+        self._writer.writerows(records(columns))
+
+class JsonLinesWriter:
+
+    def __init__(self, f: IO[str]):
+        self._f = f
+
+    def write(self, columns: BondColumns)-> None:
+        self._f.writelines(json_lines(HEADER, [ columns.values(k) for k in KEYS ]))
+
+WRITERS: dict = {
+    "csv": CsvWriter,
+    "jsonl": JsonLinesWriter,
+}
+
+def stream_filter(input_path: str, output_path: str | None, plan: List[Predicate], fmt: str = "csv", chunk_size: int = CHUNK_SIZE)-> int:
+    """Filter a market file of any size in constant memory, writing matches as they are found. Returns the match count."""
+    if fmt not in WRITERS:
+        return _stream_export(input_path, output_path, plan, fmt, chunk_size)
+
+    count = 0
+    with timings.stage("stream") as s, open_input(input_path) as f, open_output(output_path) as out:
+        writer = WRITERS[fmt](out)
+        for columns in filter_chunks(read_chunks(f, chunk_size), plan):
+            with timings.stage("write", len(columns)):
+                writer.write(columns)
+
+            count += len(columns)
+
+        s.rows = count
+
+    return count
+
+def _stream_export(input_path: str, output_path: str | None, plan: List[Predicate], fmt: str, chunk_size: int)-> int:
+    """Same as stream_filter, for the typed formats of src.export, chunks are written as typed frames."""
+    from src.export import frame, open_writer
+
+    count = 0
+    with timings.stage("stream") as s, open_input(input_path) as f, open_writer(output_path, fmt) as writer:
+        for columns in filter_chunks(read_chunks(f, chunk_size), plan):
+            with timings.stage("write", len(columns)):
+                writer.write(frame(columns, KEYS))
+
+            count += len(columns)
+
+        s.rows = count
+
+    return count
@@ -0,0 +1,181 @@
+from __future__ import annotations
+from typing import Dict, Iterator, List
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+import atexit
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+
+ENV_VAR = "BONDS_TIMINGS"
+"""Set to "table" or "json" (or "1" for a table) to record stages and print them to stderr on exit."""
+
+
+@dataclass
+class Stage:
+    """Wall time, CPU time and memory of one stage of a run, summed over its calls."""
+
+    name: str
+
+    depth: int = 0
+    """Stages run inside other stages are nested one level deeper."""
+
+    calls: int = 0
+
+    wall: float = 0.0
+
+    cpu: float = 0.0
+
+    allocated: int | None = None
+    """Bytes still allocated at the end of the stage, minus those at its start. None unless allocations are traced."""
+
+    peak: int | None = None
+    """Highest allocation above the start of the stage, in bytes."""
+
+    rows: int | None = None
+
+
+_enabled: bool = False
+
+_stages: List[Stage] = []
+"""Stage records in the order they were first entered."""
+
+_records: Dict[tuple, Stage] = {}
+"""Stage records by parent and name, repeated calls of a stage add up into one record."""
+
+_open: List[Stage] = []
+
+_peaks: List[int] = []
+"""Highest allocation seen by the children of each open stage, tracemalloc only keeps one peak."""
+
+
+def enable(memory: bool = True)-> None:
+    """Start recording stages, tracing allocations as well unless memory is False."""
+    global _enabled
+    _enabled = True
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def disable()-> None:
+    global _enabled
+    _enabled = False
+
+def enabled()-> bool:
+    return _enabled
+
+def stages()-> List[Stage]:
+    return list(_stages)
+
+def reset()-> None:
+    _stages.clear()
+    _records.clear()
+
+def _record(name: str)-> Stage:
+    key = (id(_open[-1]) if len(_open) > 0 else None, name)
+    if key not in _records:
+        _records[key] = Stage(name, len(_open))
+        _stages.append(_records[key])
+
+    return _records[key]
+
+@contextmanager
+def stage(name: str, rows: int | None = None)-> Iterator[Stage]:
+    """
+        Record a stage of the run. The call is yielded, so its row count can be set once known.
+
+        Does nothing but yield a detached stage while recording is off, so the hooks can stay in
+        the hot paths.
+    """
+    call = Stage(name, len(_open), rows=rows)
+    if not _enabled:
+        yield call
+        return
+
+    record = _record(name)
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        current, peak = tracemalloc.get_traced_memory()
+        if len(_peaks) > 0:
+            _peaks[-1] = max(_peaks[-1], peak)
+        tracemalloc.reset_peak()
+
+    _open.append(record)
+    _peaks.append(0)
+    start, start_cpu = time.perf_counter(), time.process_time()
+    try:
+        yield call
+    finally:
+        record.calls += 1
+        record.wall += time.perf_counter() - start
+        record.cpu += time.process_time() - start_cpu
+        if call.rows is not None:
+            record.rows = (record.rows or 0) + call.rows
+
+        _open.pop()
+        children_peak = _peaks.pop()
+        if tracing:
+            end, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, children_peak)
+            record.allocated = (record.allocated or 0) + end - current
+            record.peak = max(record.peak or 0, peak - current)
+            if len(_peaks) > 0:
+                _peaks[-1] = max(_peaks[-1], peak)
+
+def _mb(value: int | None)-> str:
+    return "" if value is None else f"{value / 2**20:.1f}"
+
+def to_table(items: List[Stage] = None)-> str:
+    items = stages() if items is None else items
+    width = max([ len(s.name) + 2 * s.depth for s in items ] + [ len("stage") ])
+    lines = [ f"{'stage':<{width}} {'calls':>6} {'wall s':>9} {'cpu s':>9} {'alloc MB':>9} {'peak MB':>9} {'rows':>10}" ]
+    for s in items:
+        name = "  " * s.depth + s.name
+        rows = "" if s.rows is None else f"{s.rows:,}"
+        lines.append(f"{name:<{width}} {s.calls:>6} {s.wall:>9.4f} {s.cpu:>9.4f} {_mb(s.allocated):>9} {_mb(s.peak):>9} {rows:>10}")
+
+    return "\n".join(lines)
+
+def to_json(items: List[Stage] = None)-> str:
+    items = stages() if items is None else items
+    return json.dumps([ asdict(s) for s in items ])
+
+def print_report(fmt: str = "table", file = None)-> None:
+    """Print the recorded stages, to stderr by default so they never mix with the command output."""
+    if len(_stages) == 0:
+        return
+
+    print(to_json() if fmt == "json" else to_table(), file=sys.stderr if file is None else file)
+
+@contextmanager
+def profile(path: str)-> Iterator[None]:
+    """Profile the block with cProfile, writing the stats to path for pstats or snakeviz."""
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+@contextmanager
+def trace_memory(path: str, frames: int = 25)-> Iterator[None]:
+    """Trace allocations made in the block, writing a tracemalloc snapshot to path."""
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(frames)
+    try:
+        yield
+    finally:
+        tracemalloc.take_snapshot().dump(path)
+        if started:
+            tracemalloc.stop()
+
+
+if os.environ.get(ENV_VAR, "") not in ["", "0"]:
+    enable()
+    atexit.register(print_report, "json" if os.environ[ENV_VAR] == "json" else "table")
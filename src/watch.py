@@ -0,0 +1,275 @@
+from __future__ import annotations
+from typing import IO, Dict, List, Set, Tuple
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+import asyncio
+import json
+import sys
+import numpy as np
+from src import clock, timings
+from src.batch import snapshot_date, snapshot_files
+from src.bonds import Bonds, screen
+from src.columns import BondColumns
+from src.diff import join_keys
+from src.loader import apply_rows, parse_columns, read_rows, row_hashes
+from src.query import Predicate, evaluate
+from src.stream import HEADER, records
+
+
+POLL_INTERVAL = 2.0
+"""Seconds between scans of the watched directory."""
+
+SCREEN_OPTIONS: List[str] = [
+    "based",
+    "coupon",
+    "current_yield",
+    "maturity_months",
+    "maturity_years",
+    "investment_grade",
+    "high_yield_grade",
+    "premium",
+    "discount",
+    "available",
+    "where",
+]
+"""Keys a saved screen can set, the same as the filter options."""
+
+TIME_FIELDS: List[str] = ["maturity"]
+"""Predicates reading these may change answer when only the as of date moves."""
+
+
+@dataclass
+class Screen:
+    """A saved, named filter, compiled once into a query plan."""
+
+    name: str
+
+    options: Dict[str, object]
+
+    plan: List[Predicate]
+
+    matches: Set[str] = field(default_factory=set)
+    """Keys of the bonds matching in the last ingested snapshot."""
+
+    @property
+    def time_dependent(self)-> bool:
+        return any(f in TIME_FIELDS for p in self.plan for f in p.fields)
+
+
+@dataclass
+class Universe:
+    """Last ingested snapshot: its columns, the raw hash and join key of every row, and its as of date."""
+
+    columns: BondColumns
+
+    hashes: np.ndarray
+
+    keys: List[str]
+
+    as_of: datetime
+
+
+def load_screens(path: str)-> List[Screen]:
+    """
+        Saved screens from a JSON file, mapping each name to filter options, such as
+
+            { "gb_high_coupon": { "based": "GB", "coupon": 0.07 },
+              "cheap_ig": { "where": "investment_grade and discount" } }
+
+        Every screen is compiled up front, so a bad one fails before anything is watched.
+    """
+    definitions = json.loads(Path(path).read_text())
+    if not isinstance(definitions, dict) or len(definitions) == 0:
+        raise ValueError(f"{path} must map screen names to filter options")
+
+    screens = []
+    for name, options in definitions.items():
+        unknown = [ k for k in options if k not in SCREEN_OPTIONS ]
+        if len(unknown) > 0:
+            raise ValueError(f"screen {name}: unknown options {', '.join(unknown)}, expected {', '.join(SCREEN_OPTIONS)}")
+        try:
+            plan = screen(Bonds(), **options).plan
+        except ValueError as e:
+            raise ValueError(f"screen {name}: {e}")
+
+        screens.append(Screen(name, options, plan))
+
+    return screens
+
+
+class Watcher:
+    """
+        Watches a directory for new or changed snapshots, and evaluates saved screens on them.
+
+        Each snapshot is parsed in a worker thread, off the event loop. Rows whose raw hash is
+        already in the previous snapshot are taken from its parsed columns, and screens only
+        run over the new and changed rows, unless the as of date moved and the screen reads
+        maturities. Screens emit an event when a bond starts matching (match), changes while
+        matching (update) or stops matching or disappears (unmatch).
+    """
+
+    def __init__(self, directory: str, screens: List[Screen], out: IO[str], poll_interval: float = POLL_INTERVAL, key: str = "isin"):
+        self.directory = directory
+        self.screens = screens
+        self.out = out
+        self.poll_interval = poll_interval
+        self.key = key
+        self.universe: Universe | None = None
+        self._seen: Dict[str, Tuple[int, int]] = {}
+        self._pending: Dict[str, Tuple[int, int]] = {}
+        self._pin_as_of = clock.is_set()
+
+    def _changed(self)-> List[str]:
+        """Snapshots new or changed since they were last ingested, once they stopped changing for a poll."""
+        ready = []
+        for path in snapshot_files(self.directory):
+            try:
+                stat = Path(path).stat()
+            except FileNotFoundError:
+                continue
+
+            current = (stat.st_size, stat.st_mtime_ns)
+            if self._seen.get(path) == current:
+                continue
+
+            # A file still being written changes between polls, wait until it settles.
+            if self._pending.get(path) == current:
+                ready.append(path)
+            else:
+                self._pending[path] = current
+
+        return ready
+
+    def ingest(self, path: str)-> List[dict]:
+        """Parse a snapshot against the previous one and run the screens over what changed. Returns the events."""
+        with timings.stage("ingest") as s:
+            as_of = clock.as_of() if self._pin_as_of else snapshot_date(path)
+            clock.set_as_of(as_of)
+
+            rows = read_rows(path)
+            hashes = row_hashes(rows)
+            keys = join_keys(rows, self.key)
+            previous = self.universe
+            if previous is None:
+                with timings.stage("parse", len(rows)):
+                    columns = parse_columns(rows)
+                changed = np.arange(len(rows))
+            else:
+                columns = apply_rows(previous.columns, previous.hashes, rows, hashes)
+                changed = np.flatnonzero(~np.isin(hashes, previous.hashes))
+
+            s.rows = len(changed)
+            events = []
+            present = set(keys)
+            moved = previous is not None and previous.as_of != as_of
+            for sc in self.screens:
+                idx = np.arange(len(rows)) if moved and sc.time_dependent else changed
+                with timings.stage(f"screen {sc.name}", len(idx)):
+                    events += self._evaluate(sc, path, columns, keys, idx, changed, present)
+
+            self.universe = Universe(columns, hashes, keys, as_of)
+
+        return events
+
+    def _evaluate(
+        self,
+        sc: Screen,
+        path: str,
+        columns: BondColumns,
+        keys: List[str],
+        idx: np.ndarray,
+        changed: np.ndarray,
+        present: Set[str])-> List[dict]:
+        matched = idx[evaluate(columns.take(idx), sc.plan)] if len(idx) > 0 else idx
+        hit = set(matched.tolist())
+        # Rows still matching are only reported when their content changed.
+        modified = set(changed.tolist())
+        report = np.array([ keys[i] not in sc.matches or i in modified for i in matched.tolist() ], dtype=bool)
+        matched = matched[report] if len(matched) > 0 else matched
+
+        events = []
+        # Matching rows first, with their fields, then the rows that stopped matching.
+        for i, values in zip(matched.tolist(), records(columns.take(matched))):
+            kind = "update" if keys[i] in sc.matches else "match"
+            events.append(self._event(kind, sc.name, path, keys[i], dict(zip(HEADER, values))))
+            sc.matches.add(keys[i])
+
+        for i in idx.tolist():
+            if i not in hit and keys[i] in sc.matches:
+                events.append(self._event("unmatch", sc.name, path, keys[i]))
+                sc.matches.discard(keys[i])
+
+        for k in sorted(sc.matches - present):
+            events.append(self._event("unmatch", sc.name, path, k))
+            sc.matches.discard(k)
+
+        return events
+
+    def _event(self, kind: str, name: str, path: str, key: str, bond: dict = None)-> dict:
+        event = { "event": kind, "screen": name, "snapshot": Path(path).name, "key": key }
+        if bond is not None:
+            event["bond"] = bond
+
+        return event
+
+    def emit(self, events: List[dict])-> None:
+        self.out.writelines(json.dumps(e) + "\n" for e in events)
+        self.out.flush()
+
+    async def process(self, paths: List[str])-> None:
+        loop = asyncio.get_running_loop()
+        for path in paths:
+            stat = Path(path).stat()
+            try:
+                events = await loop.run_in_executor(None, self.ingest, path)
+            except Exception as e:
+                # Keep the last good universe, the file may be malformed or still being replaced.
+                _log(f"ingest of {path} failed: {e}")
+            else:
+                self.emit(events)
+                _log(f"ingested {path}, {len(events)} events")
+
+            self._seen[path] = (stat.st_size, stat.st_mtime_ns)
+            self._pending.pop(path, None)
+
+    async def start(self, replay: bool = False)-> None:
+        """Ingest what the directory holds already: every snapshot in order with replay, else only the newest."""
+        files = snapshot_files(self.directory)
+        await self.process(files if replay else files[-1:])
+        for path in files:
+            stat = Path(path).stat()
+            self._seen[path] = (stat.st_size, stat.st_mtime_ns)
+
+    async def watch(self, once: bool = False)-> None:
+        while not once:
+            await asyncio.sleep(self.poll_interval)
+            await self.process(self._changed())
+
+
+def _log(message: str)-> None:
+    print(f"{datetime.now().isoformat(timespec='seconds')} {message}", file=sys.stderr, flush=True)
+
+def watch(
+    directory: str,
+    screens_path: str,
+    output: str | None = None,
+    poll_interval: float = POLL_INTERVAL,
+    replay: bool = False,
+    once: bool = False)-> None:
+    """Watch a directory until interrupted, writing events as JSON Lines to output or stdout."""
+    screens = load_screens(screens_path)
+    out = sys.stdout if output is None or output == "-" else open(output, "a")
+    watcher = Watcher(directory, screens, out, poll_interval)
+
+    async def run():
+        await watcher.start(replay)
+        await watcher.watch(once)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if out is not sys.stdout:
+            out.close()
@@ -0,0 +1,84 @@
+from __future__ import annotations
+from typing import Dict, List
+from datetime import datetime
+from pathlib import Path
+import csv
+import sys
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src import clock
+from src.bond import Bond
+
+
+AS_OF = datetime(2022, 11, 9)
+"""Date of the first fixture snapshot, so maturity based results do not move with the clock."""
+
+FIXTURES: List[Path] = sorted(ROOT.glob("wisealpha_market_*.csv"))
+
+
+BOND: Dict[str, str] = {
+    "company": "Acme Holdings",
+    "industry": "Industrials",
+    "ticker": "ACME",
+    "type": "Bond",
+    "market": "Main Market",
+    "seniority": "Senior Secured",
+    "isin": "XS0000000001",
+    "currency": "GBP",
+    "state": "Open",
+    "moodys_rate": "",
+    "snp_rate": "BBB",
+    "fitch_rate": "",
+    "country": "UK",
+    "ownership": "Public",
+    "maturity": "15-06-2027",
+    "next_payment": "15-06-2023",
+    "coupon_type": "Fixed",
+    "coupon_frequency": "Annual",
+    "coupon": "5%",
+    "current_yield": "5",
+    "ytm_ytc": "5",
+    "price": "100",
+    "available": "1000",
+}
+"""Raw CSV values of a plain synthetic bond, override any of them with make_bond."""
+
+
+def make_bond(**values: str)-> Bond:
+    return Bond(**{ **BOND, **values })
+
+def write_market(path: Path, bonds: List[Dict[str, str]])-> Path:
+    """Write a snapshot of synthetic bonds, each overriding some of the BOND values."""
+    with open(FIXTURES[0], newline="") as f:
+        header = next(csv.reader(f))
+
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows([ list({ **BOND, **b }.values()) for b in bonds ])
+
+    return path
+
+def csv_rows(path: Path)-> List[List[str]]:
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        next(reader)
+        return [ r for r in reader if len(r) > 0 ]
+
+@pytest.fixture(autouse=True)
+def as_of(monkeypatch, tmp_path):
+    monkeypatch.setenv("BONDS_CACHE_DIR", str(tmp_path / "cache"))
+    clock.set_as_of(AS_OF)
+    yield AS_OF
+    clock.set_as_of(None)
+
+@pytest.fixture
+def market()-> Path:
+    return FIXTURES[0]
+
+@pytest.fixture
+def market_bonds(market)-> List[Bond]:
+    return [ Bond(*row) for row in csv_rows(market) ]
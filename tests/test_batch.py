@@ -0,0 +1,41 @@
+import gzip
+import shutil
+import pytest
+from click.testing import CliRunner
+from conftest import FIXTURES
+from src.__main__ import cli
+from src.batch import batch_frame, snapshot_files
+
+
+@pytest.fixture
+def directory(tmp_path):
+    """The first snapshot as a plain CSV file, the others gzipped."""
+    shutil.copy(FIXTURES[0], tmp_path / FIXTURES[0].name)
+    for path in FIXTURES[1:]:
+        (tmp_path / f"{path.name}.gz").write_bytes(gzip.compress(path.read_bytes()))
+
+    return tmp_path
+
+def test_snapshot_files_include_gz_in_date_order(directory):
+    names = [ f.split("/")[-1] for f in snapshot_files(str(directory)) ]
+
+    assert names == [FIXTURES[0].name] + [ f"{p.name}.gz" for p in FIXTURES[1:] ]
+
+@pytest.mark.parametrize("use_cache", [False, True])
+def test_gz_snapshots_screen_like_plain_ones(directory, use_cache):
+    options = { "coupon": 0.05 }
+    mixed = batch_frame(snapshot_files(str(directory)), options, use_cache=use_cache)
+    plain = batch_frame([ str(p) for p in FIXTURES ], options, use_cache=use_cache)
+
+    assert mixed.equals(plain)
+    assert mixed["Snapshot"].nunique() == len(FIXTURES)
+
+def test_batch_cli_over_a_directory_with_gz(directory):
+    runner = CliRunner()
+    for _ in range(2):
+        # The second run reads the snapshots back from the cache.
+        result = runner.invoke(cli, ["batch", "-c", "0.05", "-o", str(directory / "out.jsonl"), str(directory)])
+        assert result.exit_code == 0, result.output
+
+    lines = (directory / "out.jsonl").read_text().splitlines()
+    assert len({ line.split('"Snapshot": ')[1][:12] for line in lines }) == len(FIXTURES)
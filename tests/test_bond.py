@@ -0,0 +1,48 @@
+import pytest
+from conftest import make_bond
+from src.bond import CATEGORICAL_FIELDS, PROPERTIES
+from src.columns import Categorical
+from src.loader import load_columns_from_csv
+
+
+def test_bonds_have_slots_and_no_dict():
+    bond = make_bond()
+
+    assert not hasattr(bond, "__dict__")
+    with pytest.raises(AttributeError):
+        bond.nickname = "acme"
+
+def test_categorical_fields_and_dates_are_shared():
+    # Strings built at runtime, so only interning can make them the same object.
+    a = make_bond(country="".join(["U", "K"]), maturity="".join(["15-06-", "2027"]))
+    b = make_bond(country="".join(["U", "K"]), maturity="".join(["15-06-", "2027"]))
+
+    for name in CATEGORICAL_FIELDS:
+        assert getattr(a, name) is getattr(b, name)
+
+    assert a.maturity is b.maturity
+
+def test_metric_cache_is_created_on_first_use():
+    bond = make_bond()
+    assert bond._cache is None
+
+    bond.get_maturity_months()
+    assert bond._cache is not None
+
+def test_properties_are_the_public_fields():
+    assert make_bond().get_properties() == PROPERTIES
+    assert "id" in PROPERTIES
+    assert all(not p.startswith("_") for p in PROPERTIES)
+
+def test_categorical_from_values_sorts_categories():
+    cat = Categorical.from_values(["b", "c", "a", "b", "c"])
+
+    assert cat.categories.tolist() == ["a", "b", "c"]
+    assert cat.codes.tolist() == [1, 2, 0, 1, 2]
+
+def test_rows_share_dates(market):
+    columns = load_columns_from_csv(str(market))
+    bonds = columns.rows(range(len(columns)))
+    by_day = {}
+    for b in bonds:
+        assert by_day.setdefault(b.maturity, b.maturity) is b.maturity
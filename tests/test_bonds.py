@@ -0,0 +1,63 @@
+import pytest
+from src.bonds import bonds
+
+
+def test_append_after_lookup_reaches_filters(market_bonds):
+    b = bonds(market_bonds[:10])
+    assert b.find_by_isin(market_bonds[0].isin) is not None
+
+    b.append(market_bonds[10])
+
+    assert len(b.only_coupon_gt(0)) == 11
+    assert market_bonds[10].isin in [ x.isin for x in b.only_coupon_gt(0) ]
+    assert b.find_by_isin(market_bonds[10].isin) is not None
+
+def test_append_after_filter_reaches_later_filters(market_bonds):
+    b = bonds(market_bonds[:10])
+    before = len(b.only_available())
+
+    b.append(market_bonds[10])
+
+    assert len(b.only_available()) == before + int(market_bonds[10].available > 0)
+
+@pytest.mark.parametrize("name, keep", [
+    ("only_investment_grade", lambda x: x.is_investment_grade()),
+    ("only_high_yield_grade", lambda x: x.is_high_yield_grade()),
+    ("only_premium_price", lambda x: x.is_premium()),
+    ("only_discount_price", lambda x: x.is_discount()),
+    ("only_available", lambda x: x.is_available()),
+    ("only_secured_seniority", lambda x: x.is_secured()),
+    ("only_public_companies", lambda x: x.is_public_company()),
+    ("only_uk_based", lambda x: x.country == "GB"),
+])
+def test_filters_match_the_bond_model(market_bonds, name, keep):
+    found = getattr(bonds(market_bonds), name)()
+
+    assert [ x.isin for x in found ] == [ x.isin for x in market_bonds if keep(x) ]
+
+def test_chained_filters_match_the_bond_model(market_bonds):
+    found = bonds(market_bonds).only_coupon_gt(0.06).only_max_maturity_years(5).only_available()
+    expected = [ x for x in market_bonds if x.coupon > 0.06 and x.get_maturity_years() < 5 and x.is_available() ]
+
+    assert [ x.isin for x in found ] == [ x.isin for x in expected ]
+
+@pytest.mark.parametrize("name, key", [
+    ("sort_by_total_yield", lambda x: x.get_total_yield()),
+    ("sort_by_risk_score", lambda x: x.get_risk_score()),
+    ("sort_by_rating_score", lambda x: x.get_rating_score()),
+    ("sort_by_length", lambda x: x.get_maturity_months()),
+])
+@pytest.mark.parametrize("direction", ["asc", "desc"])
+def test_sorts_match_the_bond_model(market_bonds, name, key, direction):
+    b = bonds(market_bonds)
+    getattr(b, name)(direction)
+    keys = [ key(x) for x in b ]
+
+    assert keys == sorted(keys, reverse=direction == "desc")
+    assert sorted(x.isin for x in b) == sorted(x.isin for x in market_bonds)
+
+def test_to_df_has_a_row_per_bond(market_bonds):
+    df = bonds(market_bonds).to_df()
+
+    assert len(df) == len(market_bonds)
+    assert df["Isin"].tolist() == [ x.isin for x in market_bonds ]
@@ -0,0 +1,48 @@
+import os
+import shutil
+import pytest
+from src import cache, loader
+
+
+@pytest.fixture
+def copy(market, tmp_path):
+    path = tmp_path / market.name
+    shutil.copy(market, path)
+    return str(path)
+
+def no_hash(file_path):
+    raise AssertionError(f"hashed {file_path}")
+
+def no_parse(file_path):
+    raise AssertionError(f"parsed {file_path}")
+
+
+def test_unchanged_file_is_not_hashed(copy, monkeypatch):
+    expected = len(loader.load_columns(copy))
+    monkeypatch.setattr(cache, "file_hash", no_hash)
+    monkeypatch.setattr(loader, "read_rows", no_parse)
+
+    assert len(loader.load_columns(copy)) == expected
+
+def test_touched_file_is_hashed_once(copy, monkeypatch):
+    expected = len(loader.load_columns(copy))
+    stat = os.stat(copy)
+    os.utime(copy, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    monkeypatch.setattr(loader, "read_rows", no_parse)
+
+    assert len(loader.load_columns(copy)) == expected
+
+    monkeypatch.setattr(cache, "file_hash", no_hash)
+    assert len(loader.load_columns(copy)) == expected
+
+def test_changed_file_is_reloaded(copy):
+    expected = len(loader.load_columns(copy))
+    with open(copy) as f:
+        lines = f.readlines()
+
+    stat = os.stat(copy)
+    with open(copy, "w") as f:
+        f.writelines(lines[:-1])
+
+    os.utime(copy, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert len(loader.load_columns(copy)) == expected - 1
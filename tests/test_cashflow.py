@@ -0,0 +1,98 @@
+from datetime import datetime
+import numpy as np
+import pytest
+from conftest import AS_OF, FIXTURES, make_bond
+from src import clock
+from src.bonds import Bonds
+from src.cashflow import Schedule, flows, price_from_yield, schedule, solve_ytm
+from src.columns import BondColumns
+from src.loader import load_columns
+
+
+def columns(*bonds)-> BondColumns:
+    return BondColumns.from_bonds(list(bonds))
+
+def dates(values):
+    return np.array(values, dtype="datetime64[D]")
+
+def test_annual_schedule_dates_and_amounts():
+    sched = schedule(columns(make_bond()))
+    paid = sched.mask[0]
+
+    assert sched.dates[0][paid].tolist() == dates(["2023-06-15", "2024-06-15", "2025-06-15", "2026-06-15", "2027-06-15"]).tolist()
+    assert sched.amounts[0][paid].tolist() == [5.0, 5.0, 5.0, 5.0, 105.0]
+    assert sched.accrued[0] == pytest.approx(5.0 * (AS_OF - datetime(2022, 6, 15)).days / 365)
+
+def test_month_end_dates_stay_on_the_month_end():
+    sched = schedule(columns(make_bond(maturity="31-08-2024", next_payment="28-02-2023", coupon_frequency="Biannual")))
+
+    assert sched.dates[0][sched.mask[0]].tolist() == dates(["2023-02-28", "2023-08-31", "2024-02-29", "2024-08-31"]).tolist()
+    assert sched.amounts[0][sched.mask[0]].tolist() == [2.5, 2.5, 2.5, 102.5]
+
+def test_short_stub_pays_part_of_a_coupon():
+    sched = schedule(columns(make_bond(maturity="15-12-2024", next_payment="15-06-2023")))
+    amounts = sched.amounts[0][sched.mask[0]]
+
+    assert sched.dates[0][sched.mask[0]].tolist() == dates(["2023-06-15", "2024-06-15", "2024-12-15"]).tolist()
+    assert amounts[-1] == pytest.approx(100 + 5.0 * 183 / 365)
+
+def test_flows_are_the_schedule_without_padding():
+    market = load_columns(str(FIXTURES[0]), False)
+    sched, flat = schedule(market), flows(market)
+
+    assert flat.bond.tolist() == np.nonzero(sched.mask)[0].tolist()
+    assert flat.dates.tolist() == sched.dates[sched.mask].tolist()
+    assert flat.amounts == pytest.approx(sched.amounts[sched.mask])
+    assert flat.times() == pytest.approx(sched.times[sched.mask])
+
+def test_price_and_yield_round_trip():
+    sched = schedule(load_columns(str(FIXTURES[0]), False))
+    prices = load_columns(str(FIXTURES[0]), False)["price"]
+    ytm = solve_ytm(sched, prices)
+
+    assert price_from_yield(sched, ytm) == pytest.approx(prices, abs=1e-6)
+
+    yields = np.linspace(-0.01, 0.25, len(sched))
+    assert solve_ytm(sched, price_from_yield(sched, yields)) == pytest.approx(yields, abs=1e-8)
+
+@pytest.mark.parametrize("path", FIXTURES, ids=lambda p: p.name)
+def test_yields_are_close_to_the_listed_ones(path):
+    clock.set_as_of(datetime.strptime(path.stem[-6:], "%y%m%d"))
+    b = Bonds.from_columns(load_columns(str(path), False))
+    deviation = np.abs(b.yields_to_maturity() - b.columns["ytm_ytc"]) * 10_000
+
+    assert np.median(deviation) < 3
+
+def test_bisection_finds_the_yield_without_newton_steps(monkeypatch):
+    sched = schedule(load_columns(str(FIXTURES[0]), False))
+    prices = price_from_yield(sched, np.full(len(sched), 0.08))
+    dirty_price_and_slope = Schedule._dirty_price_and_slope
+
+    def flat_slope(self, ytm):
+        price, slope = dirty_price_and_slope(self, ytm)
+        return price, np.zeros_like(slope)
+
+    monkeypatch.setattr(Schedule, "_dirty_price_and_slope", flat_slope)
+
+    assert solve_ytm(sched, prices) == pytest.approx(np.full(len(sched), 0.08), abs=1e-8)
+
+def test_zero_coupon_yield_is_closed_form():
+    sched = schedule(columns(make_bond(coupon="0%", maturity="09-11-2027", next_payment="09-11-2023")))
+    t = (datetime(2027, 11, 9) - AS_OF).days / 365
+
+    assert sched.accrued[0] == 0
+    assert sched.amounts[0][sched.mask[0]].tolist() == [0.0, 0.0, 0.0, 0.0, 100.0]
+    assert solve_ytm(sched, np.array([80.0]))[0] == pytest.approx((100 / 80) ** (1 / t) - 1)
+
+def test_long_perpetual_at_par_yields_its_coupon():
+    sched = schedule(columns(make_bond(type="Perpetual", maturity="09-11-2099", next_payment="09-11-2023")))
+
+    assert sched.mask[0].sum() == 77
+    # Actual/365 counts leap days, so the yield is only close to the coupon.
+    assert solve_ytm(sched, np.array([100.0]))[0] == pytest.approx(0.05, abs=1e-3)
+
+def test_matured_bond_has_no_yield():
+    sched = schedule(columns(make_bond(maturity="15-06-2022", next_payment="15-06-2022")))
+
+    assert not sched.mask.any()
+    assert np.isnan(solve_ytm(sched, np.array([100.0]))[0])
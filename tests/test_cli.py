@@ -0,0 +1,104 @@
+import gzip
+import json
+import re
+import pytest
+from click.testing import CliRunner
+from conftest import FIXTURES
+from src.__main__ import cli
+
+
+def run(*args: str)-> str:
+    result = CliRunner().invoke(cli, ["--no-cache", "--as-of", "2022-11-09", *args])
+    assert result.exit_code == 0, result.output
+
+    return result.output
+
+def test_simulate_reinvest_switch(market):
+    simulate = ["simulate", "-t", "BPLN", "-a", "1000", "-n", "200", "--seed", "0"]
+    reinvested = run(*simulate, "--reinvest", str(market))
+    kept = run(*simulate, "--no-reinvest", str(market))
+
+    assert reinvested == run(*simulate, str(market))
+    assert reinvested != kept
+
+def test_simulate_same_seed_any_worker_count(market):
+    simulate = ["simulate", "-t", "BPLN", "-a", "1000", "-n", "25000", "--seed", "3"]
+
+    assert run(*simulate, "-w", "1", str(market)) == run(*simulate, "-w", "2", str(market))
+
+@pytest.mark.parametrize("option", [["-n", "0"], ["-w", "0"], ["-w", "-2"]])
+def test_simulate_refuses_no_paths_or_workers(market, option):
+    simulate = ["simulate", "-t", "BPLN", "-a", "1000", *option, str(market)]
+    result = CliRunner().invoke(cli, ["--no-cache", "--as-of", "2022-11-09", *simulate])
+
+    assert result.exit_code == 2
+    assert "Invalid value" in result.output
+
+def test_json_lines_same_with_and_without_stream(market, tmp_path):
+    frame, streamed = tmp_path / "frame.jsonl", tmp_path / "streamed.jsonl"
+    run("filter", "-c", "0.05", "-o", str(frame), str(market))
+    run("filter", "-c", "0.05", "--stream", "-o", str(streamed), str(market))
+
+    assert frame.read_bytes() == streamed.read_bytes()
+    rows = [ json.loads(line) for line in frame.read_text().splitlines() ]
+    assert len(rows) > 0
+    assert all(re.fullmatch(r"\d{4}-\d{2}-\d{2}", r["Maturity"]) for r in rows)
+
+def test_diff_apply_refuses_no_cache(tmp_path):
+    old, new = FIXTURES[0], FIXTURES[1]
+    result = CliRunner().invoke(cli, ["--no-cache", "diff", "--apply", str(old), str(new)])
+
+    assert result.exit_code == 2
+    assert not (tmp_path / "cache").exists() or not any((tmp_path / "cache").iterdir())
+
+def test_diff_output_goes_through_the_exporters(tmp_path):
+    output = tmp_path / "diff.jsonl"
+    run("diff", "-o", str(output), str(FIXTURES[0]), str(FIXTURES[1]))
+
+    rows = [ json.loads(line) for line in output.read_text().splitlines() ]
+    assert len(rows) > 0
+
+def test_optimize_output_goes_through_the_exporters(market, tmp_path):
+    output = tmp_path / "allocation.out"
+    run("optimize", "-a", "10000", "-ic", "0.2", "-o", str(output), "-f", "jsonl", str(market))
+    rows = [ json.loads(line) for line in output.read_text().splitlines() ]
+
+    assert len(rows) >= 5
+    assert sum(r["Amount"] for r in rows) == pytest.approx(10000, abs=0.1)
+
+def test_optimize_rejects_an_unknown_min_rating(market):
+    result = CliRunner().invoke(cli, ["--no-cache", "optimize", "-a", "1000", "-r", "ZZZ", str(market)])
+
+    assert result.exit_code == 2
+
+@pytest.mark.parametrize("screen", [["-c", "0.05"], ["-ig", "-my", "5"], ["--where", "rating <= 'BB' and available > 0"]])
+def test_stream_matches_the_in_memory_filter(market, tmp_path, screen):
+    frame, streamed = tmp_path / "frame.csv", tmp_path / "streamed.csv"
+    run("filter", *screen, "-o", str(frame), str(market))
+    run("filter", *screen, "--stream", "-o", str(streamed), str(market))
+
+    assert streamed.read_bytes() == frame.read_bytes()
+    assert len(frame.read_text().splitlines()) > 1
+
+def test_stream_reads_gz_and_stdin(market, tmp_path):
+    compressed = tmp_path / "market.csv.gz"
+    compressed.write_bytes(gzip.compress(market.read_bytes()))
+    plain, from_gz, from_stdin = tmp_path / "plain.csv", tmp_path / "gz.csv", tmp_path / "stdin.csv"
+    run("filter", "-c", "0.05", "--stream", "-o", str(plain), str(market))
+    run("filter", "-c", "0.05", "--stream", "-o", str(from_gz), str(compressed))
+
+    result = CliRunner().invoke(
+        cli,
+        ["--no-cache", "--as-of", "2022-11-09", "filter", "-c", "0.05", "--stream", "-o", str(from_stdin), "-"],
+        input=market.read_bytes())
+    assert result.exit_code == 0, result.output
+
+    assert from_gz.read_bytes() == plain.read_bytes()
+    assert from_stdin.read_bytes() == plain.read_bytes()
+
+def test_stream_writes_gz_output(market, tmp_path):
+    plain, compressed = tmp_path / "plain.csv", tmp_path / "out.csv.gz"
+    run("filter", "-c", "0.05", "--stream", "-o", str(plain), str(market))
+    run("filter", "-c", "0.05", "--stream", "-o", str(compressed), str(market))
+
+    assert gzip.decompress(compressed.read_bytes()) == plain.read_bytes()
@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta
+from src import clock
+from src.bonds import bonds
+from src.columns import BondColumns
+
+
+def test_metrics_follow_the_as_of_date(market_bonds):
+    bond = market_bonds[0]
+    months = bond.get_maturity_months()
+    assert bond.get_maturity_months() == (bond.maturity - clock.as_of()).days // 30
+
+    clock.set_as_of(clock.as_of() + timedelta(days=365))
+    assert bond.get_maturity_months() < months
+    assert bond.get_maturity_months() == (bond.maturity - clock.as_of()).days // 30
+
+def test_cached_metrics_are_computed_once_per_as_of(market_bonds, monkeypatch):
+    bond = market_bonds[0]
+    first = bond.get_risk_score()
+    monkeypatch.setattr(type(bond), "get_maturity_years", lambda self: 1 / 0)
+
+    assert bond.get_risk_score() == first
+
+def test_unset_clock_is_taken_once():
+    clock.set_as_of(None)
+    assert not clock.is_set()
+
+    first = clock.as_of()
+    assert clock.as_of() is first
+
+def test_columns_agree_with_bonds_on_the_as_of(market_bonds):
+    clock.set_as_of(datetime(2024, 1, 1))
+    columns = BondColumns.from_bonds(market_bonds)
+
+    assert columns.maturity_months().tolist() == [ b.get_maturity_months() for b in market_bonds ]
+    assert columns.risk_score().tolist() == [ b.get_risk_score() for b in market_bonds ]
+    assert bonds(market_bonds).only_max_maturity_years(2).to_tickers() == [ b.ticker for b in market_bonds if b.get_maturity_years() < 2 ]
@@ -0,0 +1,60 @@
+import pytest
+from conftest import csv_rows, write_market
+from src.diff import diff_rows, join_keys
+
+
+def rows(tmp_path, name, bonds):
+    return csv_rows(write_market(tmp_path / name, bonds))
+
+def test_added_removed_and_moved_rows(tmp_path):
+    old = rows(tmp_path, "old.csv", [
+        { "isin": "X1", "price": "100" },
+        { "isin": "X2", "price": "100" },
+        { "isin": "X3", "snp_rate": "BBB" },
+        { "isin": "X4", "available": "1000" },
+        { "isin": "X5" },
+    ])
+    new = rows(tmp_path, "new.csv", [
+        { "isin": "X1", "price": "99" },
+        # Under the half point threshold.
+        { "isin": "X2", "price": "100.2" },
+        { "isin": "X3", "snp_rate": "BB+" },
+        { "isin": "X4", "available": "0" },
+        { "isin": "X6" },
+    ])
+
+    d = diff_rows(old, new)
+    found = sorted((c.kind, c.key, c.field) for c in d.changes)
+
+    assert found == [
+        ("added", "X6", None),
+        ("availability", "X4", "available"),
+        ("price", "X1", "price"),
+        ("rating", "X3", "snp_rate"),
+        ("removed", "X5", None),
+    ]
+    assert (d.unchanged, d.modified) == (0, 4)
+
+    price = next(c for c in d.changes if c.kind == "price")
+    assert (price.old, price.new) == (100, 99)
+
+def test_yield_threshold(tmp_path):
+    old = rows(tmp_path, "old.csv", [ { "isin": "X1", "ytm_ytc": "5" }, { "isin": "X2", "ytm_ytc": "5" } ])
+    new = rows(tmp_path, "new.csv", [ { "isin": "X1", "ytm_ytc": "5.2" }, { "isin": "X2", "ytm_ytc": "5.05" } ])
+
+    changes = diff_rows(old, new, yield_move=0.001).changes
+
+    assert [ (c.key, c.field) for c in changes ] == [("X1", "ytm_ytc")]
+
+def test_identical_snapshots_have_no_changes(market):
+    d = diff_rows(csv_rows(market), csv_rows(market))
+
+    assert d.changes == []
+    assert d.modified == 0
+
+def test_repeated_keys_are_numbered(tmp_path):
+    keys = join_keys(rows(tmp_path, "m.csv", [ { "isin": "X1" }, { "isin": "X2" }, { "isin": "X1", "state": "Suspended" } ]), "isin")
+
+    assert keys == ["X1", "X2", "X1#2"]
+    with pytest.raises(ValueError):
+        join_keys([], "sector")
@@ -0,0 +1,44 @@
+import csv
+import json
+import pytest
+from click.testing import CliRunner
+from src.__main__ import cli
+from src.bonds import bonds
+from src.export import exported, open_writer
+
+
+def test_exported_frame_has_no_id(market_bonds):
+    df = bonds(market_bonds).to_df()
+
+    assert "Id" in df.columns
+    assert "Id" not in exported(df).columns
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_csv_and_jsonl_exports_have_no_id(market, tmp_path, stream):
+    for name in ["out.csv", "out.jsonl"]:
+        out = tmp_path / name
+        args = ["--no-cache", "--as-of", "2022-11-09", "filter", "-o", str(out), str(market)]
+        result = CliRunner().invoke(cli, args + (["--stream"] if stream else []))
+        assert result.exit_code == 0, result.output
+
+        if name.endswith(".csv"):
+            with open(out, newline="") as f:
+                header = next(csv.reader(f))
+        else:
+            with open(out) as f:
+                header = list(json.loads(f.readline()).keys())
+
+        assert "Id" not in header
+        assert "Isin" in header
+
+def test_failed_write_removes_the_partial_file(market_bonds, tmp_path):
+    pytest.importorskip("pyarrow")
+    df = bonds(market_bonds).to_df()
+    for name in ["out.parquet", "out.feather"]:
+        out = tmp_path / name
+        with pytest.raises(RuntimeError):
+            with open_writer(str(out)) as writer:
+                writer.write(df)
+                raise RuntimeError("interrupted")
+
+        assert not out.exists()
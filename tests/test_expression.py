@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from src.bonds import Bonds
+from src.expression import ExpressionError, compile_where
+from src.loader import load_columns
+from src.rating import rate_score
+
+
+@pytest.fixture
+def universe(market)-> Bonds:
+    return Bonds.from_columns(load_columns(str(market), False))
+
+def scores(b: Bonds)-> np.ndarray:
+    return b.columns.rating_score()
+
+def test_rating_at_most_is_that_rating_or_worse(universe):
+    limit = rate_score("BBB-")
+    worse = universe.query("rating <= 'BBB-'")
+    everything = scores(universe)
+
+    assert len(worse) > 0
+    assert (scores(worse) >= limit).all()
+    assert len(worse) == int((everything >= limit).sum())
+
+def test_rating_at_least_is_that_rating_or_better(universe):
+    limit = rate_score("BBB-")
+    better = universe.query("rating >= 'BBB-'")
+    everything = scores(universe)
+
+    assert len(better) > 0
+    assert ((scores(better) > 0) & (scores(better) <= limit)).all()
+    assert len(better) == int(((everything > 0) & (everything <= limit)).sum())
+
+def test_rating_strictly_worse_excludes_the_limit(universe):
+    assert (scores(universe.query("rating < 'BBB-'")) > rate_score("BBB-")).all()
+
+def test_moodys_and_snp_literals_agree(universe):
+    assert len(universe.query("rating <= 'Baa3'")) == len(universe.query("rating <= 'BBB-'"))
+
+@pytest.mark.parametrize("expression", ["rating == 'C'", "rating in ['B', 'C']", "rating <= 3", "rating == 'ZZZ'"])
+def test_rejected_rating_comparisons(expression):
+    with pytest.raises(ExpressionError):
+        compile_where(expression)
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from src.bonds import Bonds
+from src.columns import BondColumns
+from src.index import SortedIndex
+from src.loader import load_columns
+
+
+@pytest.fixture
+def missing_maturity(market)-> Bonds:
+    """The market with the maturity of its first and last bond unknown."""
+    columns = load_columns(str(market), False)
+    maturity = np.array(columns["maturity"])
+    maturity[[0, -1]] = np.datetime64("NaT")
+
+    return Bonds.from_columns(BondColumns({ **columns.data, "maturity": maturity }))
+
+def test_seek_leaves_out_nat():
+    values = np.array(["2030-01-01", "NaT", "2025-01-01", "NaT"], dtype="datetime64[us]")
+    index = SortedIndex(values)
+    low, high = np.datetime64("2020-01-01", "us"), np.datetime64("2040-01-01", "us")
+
+    assert index.gt(low).tolist() == [0, 2]
+    assert index.ge(low).tolist() == [0, 2]
+    assert index.lt(high).tolist() == [0, 2]
+    assert index.between(low, high).tolist() == [0, 2]
+
+@pytest.mark.parametrize("expression", [
+    "maturity > '2023-01-01'",
+    "maturity >= '2023-01-01'",
+    "maturity < '2030-01-01'",
+    "maturity == '2025-06-30'",
+])
+def test_seek_matches_scan_with_missing_dates(missing_maturity, expression):
+    maturity = missing_maturity.columns["maturity"]
+    op, literal = expression.split(" ")[1:]
+    value = np.datetime64(literal.strip("'"), "us")
+    expected = {
+        ">": maturity > value, ">=": maturity >= value, "<": maturity < value, "==": maturity == value,
+    }[op]
+
+    found = missing_maturity.query(expression)
+    assert len(found) == int(expected.sum())
+    assert found.columns["isin"].tolist() == np.asarray(missing_maturity.columns["isin"])[expected].tolist()
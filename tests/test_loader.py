@@ -0,0 +1,19 @@
+import pytest
+from conftest import FIXTURES, csv_rows
+from src.bond import Bond
+from src.columns import FIELDS
+from src.loader import load_columns_from_csv
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=lambda p: p.name)
+def test_column_parse_matches_bond_parse(path):
+    expected = [ Bond(*row) for row in csv_rows(path) ]
+    columns = load_columns_from_csv(str(path))
+    parsed = columns.rows(range(len(columns)))
+
+    assert len(parsed) == len(expected)
+    for i, (got, want) in enumerate(zip(parsed, expected)):
+        for field in FIELDS + ["id"]:
+            assert getattr(got, field) == getattr(want, field), f"row {i} {field}"
+
+        assert got.get_rating_score() == want.get_rating_score(), f"row {i} rating"
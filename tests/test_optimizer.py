@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from conftest import make_bond
+from src.bonds import bonds
+from src.optimizer import InfeasibleError, optimize
+
+
+@pytest.fixture
+def universe():
+    """Two issuers in one industry and two in another, the best yields carry the most risk."""
+    return bonds([
+        make_bond(ticker="RISKY", company="Alpha", industry="Energy", ytm_ytc="12", snp_rate="CCC", seniority="Unsecured", available="1000"),
+        make_bond(ticker="ALPHA", company="Alpha", industry="Energy", ytm_ytc="9", available="1000"),
+        make_bond(ticker="BETA", company="Beta", industry="Retail", ytm_ytc="7", snp_rate="A", available="1000", price="80"),
+        make_bond(ticker="GAMMA", company="Gamma", industry="Retail", ytm_ytc="5", snp_rate="A", available="500"),
+        make_bond(ticker="SOLD", company="Delta", industry="Media", ytm_ytc="20", available="0"),
+    ])
+
+def by_ticker(allocation):
+    return dict(zip(allocation.bonds.to_tickers(), allocation.cash.tolist()))
+
+def group_totals(allocation, field):
+    keys = allocation.bonds.columns.values(field)
+    return { k: allocation.cash[keys == k].sum() for k in set(keys.tolist()) }
+
+def test_without_limits_the_best_yields_fill_up(universe):
+    allocation = optimize(universe, 2500)
+
+    assert by_ticker(allocation) == pytest.approx({ "RISKY": 1000, "ALPHA": 1000, "BETA": 500, "GAMMA": 0, "SOLD": 0 })
+
+def test_bonds_take_at_most_their_available_nominal(universe):
+    allocation = optimize(universe, 100_000)
+    capacity = universe.columns["available"] * universe.columns["price"] / 100
+
+    assert (allocation.cash <= capacity + 1e-9).all()
+    assert by_ticker(allocation)["SOLD"] == 0
+    assert allocation.total() == pytest.approx(capacity.sum())
+
+@pytest.mark.parametrize("issuer_cap, industry_cap", [(0.3, 1.0), (1.0, 0.5), (0.25, 0.4)])
+def test_issuer_and_industry_caps_hold(universe, issuer_cap, industry_cap):
+    amount = 2000
+    allocation = optimize(universe, amount, issuer_cap, industry_cap)
+
+    assert allocation.total() <= amount + 1e-9
+    assert max(group_totals(allocation, "company").values()) <= issuer_cap * amount + 1e-9
+    assert max(group_totals(allocation, "industry").values()) <= industry_cap * amount + 1e-9
+
+@pytest.mark.parametrize("max_risk", [8, 10, 15, 18])
+def test_average_risk_stays_under_the_limit(universe, max_risk):
+    unlimited = optimize(universe, 2000)
+    allocation = optimize(universe, 2000, max_risk=max_risk)
+
+    assert unlimited.average_risk() > max_risk
+    assert allocation.average_risk() <= max_risk + 1e-6
+    assert allocation.total() <= 2000 + 1e-9
+    assert allocation.expected_yield() <= unlimited.expected_yield()
+
+def test_unreachable_risk_limit_is_an_error():
+    universe = bonds([ make_bond(ticker="RISKY", snp_rate="CCC", seniority="Unsecured", ytm_ytc="12") ])
+    risk = universe.columns.risk_score()[0]
+
+    with pytest.raises(InfeasibleError):
+        optimize(universe, 1000, max_risk=risk - 1e-9)
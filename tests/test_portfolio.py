@@ -0,0 +1,53 @@
+import pytest
+from conftest import write_market
+from src.loader import load_columns
+from src.portfolio import join, load_holdings
+
+
+@pytest.fixture
+def portfolio(tmp_path):
+    market = write_market(tmp_path / "wisealpha_market_221109.csv", [
+        { "isin": "XS1", "company": "Acme", "coupon": "5%", "coupon_frequency": "Annual",
+          "maturity": "15-06-2024", "next_payment": "15-06-2023", "currency": "GBP" },
+        { "isin": "XS2", "company": "Beta", "coupon": "6%", "coupon_frequency": "Biannual",
+          "maturity": "01-03-2024", "next_payment": "01-03-2023", "currency": "EUR", "price": "98" },
+        { "isin": "XS3", "company": "Gamma" },
+    ])
+    holdings = tmp_path / "holdings.csv"
+    holdings.write_text("ISIN,Amount,Price\nXS1,1000,99\nXS1,1000,\nXS2,500,97\nXS9,100,100\n")
+
+    return join(load_holdings(str(holdings)), load_columns(str(market), False))
+
+def test_lots_are_summed_per_bond(portfolio):
+    positions = portfolio.positions().set_index("Isin")
+
+    assert portfolio.missing() == ["XS9"]
+    assert positions.index.tolist() == ["XS1", "XS2"]
+    assert positions["Nominal"].tolist() == [2000, 500]
+    # The lot without a purchase price counts at the market price.
+    assert positions["Cost"].tolist() == pytest.approx([990 + 1000, 485])
+    assert positions["Value"].tolist() == pytest.approx([2000, 490])
+
+def test_calendar_totals(portfolio):
+    total = portfolio.calendar(by=())
+
+    assert total["Coupons"].tolist() == pytest.approx([2 * 100 + 3 * 15])
+    assert total["Redemptions"].tolist() == pytest.approx([2500])
+    assert total["Total"].tolist() == pytest.approx([2745])
+
+def test_calendar_by_currency_and_month(portfolio):
+    by_currency = portfolio.calendar(by=("currency",)).set_index("Currency")
+
+    assert by_currency.loc["GBP", "Coupons"] == pytest.approx(200)
+    assert by_currency.loc["GBP", "Redemptions"] == pytest.approx(2000)
+    assert by_currency.loc["EUR", "Coupons"] == pytest.approx(45)
+    assert by_currency.loc["EUR", "Redemptions"] == pytest.approx(500)
+
+    by_month = portfolio.calendar(by=("month",))
+    months = by_month["Month"].dt.strftime("%Y-%m").tolist()
+    assert months == ["2023-03", "2023-06", "2023-09", "2024-03", "2024-06"]
+    assert by_month["Total"].tolist() == pytest.approx([15, 100, 15, 515, 2100])
+
+def test_unknown_group_is_rejected(portfolio):
+    with pytest.raises(ValueError):
+        portfolio.calendar(by=("sector",))
@@ -0,0 +1,46 @@
+import numpy as np
+from src.bonds import Bonds, bonds
+from src.loader import load_columns
+from src.query import Predicate, apply, order_plan
+
+
+def test_filters_are_recorded_until_used(market_bonds):
+    calls = []
+    def available(c):
+        calls.append(len(c))
+        return c["available"] > 0
+
+    b = bonds(market_bonds).where("available", ["available"], available).only_coupon_gt(0.05)
+
+    assert calls == []
+    assert [ p.name for p in b.plan ] == ["available", "coupon_gt"]
+
+    expected = [ x.isin for x in market_bonds if x.available > 0 and x.coupon > 0.05 ]
+    assert [ x.isin for x in b ] == expected
+    assert len(calls) == 1
+    assert b.plan == []
+
+def test_scan_pushes_the_plan_into_the_source(market):
+    seen = []
+    def source(plan):
+        seen.append([ p.name for p in plan ])
+        return load_columns(str(market), False, plan)
+
+    b = Bonds.scan(source).only_coupon_gt(0.05).only_investment_grade()
+    full = Bonds.from_columns(load_columns(str(market), False))
+
+    assert b.columns["isin"].tolist() == full.only_coupon_gt(0.05).only_investment_grade().columns["isin"].tolist()
+    assert seen == [["coupon_gt", "investment_grade"]]
+
+def test_pushdown_matches_filtering_after_the_parse(market):
+    plan = Bonds().only_coupon_gt(0.06).only_max_maturity_months(60).only_available().plan
+    full = load_columns(str(market), False)
+
+    assert load_columns(str(market), False, plan)["isin"].tolist() == apply(full, plan)["isin"].tolist()
+
+def test_cheap_predicates_run_first(market):
+    columns = load_columns(str(market), False)
+    costly = Predicate("costly", ("maturity",), lambda c: np.ones(len(c), dtype=bool), 3)
+    cheap = Predicate("cheap", ("coupon",), lambda c: np.ones(len(c), dtype=bool), 1)
+
+    assert [ p.name for p in order_plan(columns, [costly, cheap]) ] == ["cheap", "costly"]
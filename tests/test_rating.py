@@ -0,0 +1,29 @@
+import pytest
+from src.rating import Rating, rate_score, rating_scores
+
+
+def test_same_ratings_share_an_instance():
+    assert Rating.of("BBB-", "Baa3", "") is Rating.of("BBB-", "Baa3", "")
+    assert Rating.of("BBB-", "Baa3", "") is not Rating.of("BB+", "Baa3", "")
+
+@pytest.mark.parametrize("snp, moodys, fitch, score", [
+    ("BBB-", "", "", 10),
+    ("", "Ba1", "", 11),
+    ("", "", "A+", 5),
+    ("NR", "WR", "WD", 0),
+    ("", "", "", 0),
+])
+def test_score_falls_back_through_the_agencies(snp, moodys, fitch, score):
+    assert Rating.of(snp, moodys, fitch).get_score() == score
+
+def test_column_scores_match_single_ratings(market_bonds):
+    snp = [ b.snp_rate for b in market_bonds ]
+    moodys = [ b.moodys_rate for b in market_bonds ]
+    fitch = [ b.fitch_rate for b in market_bonds ]
+
+    assert rating_scores(snp, moodys, fitch).tolist() == [ b.get_rating_score() for b in market_bonds ]
+
+def test_unknown_rate_is_rejected():
+    assert rate_score("Baa3") == rate_score("BBB-")
+    with pytest.raises(ValueError):
+        rate_score("ZZZ")
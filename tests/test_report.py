@@ -0,0 +1,32 @@
+import pytest
+from src.bonds import bonds
+from src.report import Report
+
+
+def test_report_columns_match_the_bond_model(market_bonds):
+    df = Report(bonds(market_bonds)).generate_report()
+    expected = [ b for b in market_bonds if b.is_discount() and b.type == "Bond" and b.is_available() ]
+
+    assert df["Ticker"].tolist() == [ b.ticker for b in expected ]
+    assert df["Lose"].tolist() == [ b.price for b in expected ]
+    assert df["Win"].tolist() == pytest.approx([ b.get_total_yield() for b in expected ])
+    assert df["Rate"].tolist() == pytest.approx([ b.get_maturity_growth() for b in expected ])
+    assert df["Maturity"].tolist() == [ b.get_maturity_months() for b in expected ]
+    assert df["Investable"].tolist() == [ b.is_investment_grade() for b in expected ]
+    assert df["Rating score"].tolist() == [ b.get_rating_score() for b in expected ]
+    assert df["Risk"].tolist() == [ b.get_risk_score() for b in expected ]
+
+def test_sorted_report_with_top(market_bonds):
+    df = Report(bonds(market_bonds)).generate_report("yield", "desc", 10)
+
+    assert len(df) == 10
+    assert df["Win"].is_monotonic_decreasing
+
+def test_format_is_for_display_only(market_bonds):
+    report = Report(bonds(market_bonds))
+    df = report.generate_report()
+    shown = report.format(df)
+
+    assert shown["Rate"].str.endswith("%").all()
+    assert shown["Maturity"].str.endswith(" months").all()
+    assert df["Rate"].dtype.kind == "f"
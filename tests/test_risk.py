@@ -0,0 +1,49 @@
+from datetime import datetime
+import numpy as np
+import pytest
+from conftest import AS_OF, make_bond
+from src.columns import BondColumns
+from src.risk import parallel, parse_scenario, reprice, sensitivities, stress
+
+
+ZERO = make_bond(coupon="0%", ytm_ytc="6", maturity="09-11-2032", next_payment="09-11-2023")
+
+
+def columns(*bonds)-> BondColumns:
+    return BondColumns.from_bonds(list(bonds))
+
+def test_zero_coupon_sensitivities_are_closed_form():
+    m = sensitivities(columns(ZERO))
+    t = (datetime(2032, 11, 9) - AS_OF).days / 365
+    price = 100 * 1.06 ** -t
+
+    assert m.dirty_price[0] == pytest.approx(price)
+    assert m.macaulay_duration[0] == pytest.approx(t)
+    assert m.modified_duration[0] == pytest.approx(t / 1.06)
+    assert m.convexity[0] == pytest.approx(t * (t + 1) / 1.06 ** 2)
+    assert m.dv01[0] == pytest.approx(t / 1.06 * price * 1e-4)
+
+def test_dv01_matches_repricing():
+    c = columns(ZERO, make_bond(ytm_ytc="7"))
+    m = sensitivities(c)
+    up, down = reprice(c, [parallel(1), parallel(-1)])
+
+    assert (down - up) / 2 == pytest.approx(m.dv01, rel=1e-6)
+
+def test_stress_shocks_move_prices_against_yields():
+    s = stress(columns(ZERO, make_bond()), [parallel(100), parallel(-100)], nominal=np.array([1000, 500]))
+    up, down = s.change
+
+    assert (up < 0).all()
+    assert (down > 0).all()
+    # Convexity, a fall in yields gains more than the same rise loses.
+    assert (down > -up).all()
+    assert s.pnl() == pytest.approx(s.change * np.array([10, 5]))
+
+def test_bucketed_shock_only_moves_its_tenors():
+    s = stress(columns(ZERO), [parse_scenario("short=1y:100,2y:0"), parse_scenario("long=5y:0,10y:100")])
+    short, long = s.change[:, 0]
+
+    # The zero coupon bond pays once, in 10 years.
+    assert short == pytest.approx(0)
+    assert long < 0
@@ -0,0 +1,74 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import pytest
+from conftest import AS_OF
+from src import clock
+from src.server import QueryError, Server, run_at, run_filter, run_report
+
+
+def query(server: Server, path: str, params: str)-> dict:
+    async def go():
+        server._reloading = asyncio.Lock()
+        await server.reload(force=True)
+        return await server.query(path, params)
+
+    return json.loads(asyncio.run(go()))
+
+@pytest.fixture
+def snapshots(market):
+    """The same file loaded twice, as of the fixture date and three years later."""
+    server = Server(str(market), False)
+    first = server._load(1)
+    server._as_of = AS_OF + timedelta(days=3 * 365)
+
+    return first, server._load(2)
+
+def test_queries_count_maturities_from_their_snapshot(snapshots):
+    first, later = snapshots
+    params = { "maturity_years": 3 }
+    expected = len(first.bonds().only_max_maturity_years(3))
+    clock.set_as_of(AS_OF - timedelta(days=1000))
+
+    assert run_at(first, run_filter, params)["count"] == expected
+    assert run_at(later, run_filter, params)["count"] > expected
+
+def test_concurrent_queries_on_two_snapshots_do_not_mix(snapshots):
+    params = { "maturity_months": 30, "investment_grade": True }
+    expected = [ run_at(s, run_filter, params) for s in snapshots ]
+    assert expected[0] != expected[1]
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda i: run_at(snapshots[i % 2], run_filter, params), range(64)))
+
+    assert all(r == expected[i % 2] for i, r in enumerate(results))
+
+def test_queries_leave_the_snapshot_as_built(snapshots):
+    first, _ = snapshots
+    indexes = dict(first.indexes._sorted), dict(first.indexes._unique)
+    metrics = dict(first.columns._cache)
+
+    run_at(first, run_filter, { "coupon": 0.05, "where": "maturity > '2025-01-01'" })
+    run_at(first, run_report, { "sort": "yield", "top": 5 })
+
+    assert (first.indexes._sorted, first.indexes._unique) == indexes
+    assert first.columns._cache.keys() == metrics.keys()
+    assert first.bonds() is not first.bonds()
+
+def test_reload_leaves_the_global_clock_alone(market):
+    clock.set_as_of(None)
+    server = Server(str(market), False)
+    query(server, "/health", "")
+
+    assert not clock.is_set()
+
+def test_report_top_must_be_positive(market):
+    server = Server(str(market), False)
+    assert query(server, "/report", "sort=yield&top=3")["count"] == 3
+
+    for top in ["0", "-1"]:
+        with pytest.raises(QueryError) as e:
+            query(server, "/report", f"sort=yield&top={top}")
+
+        assert e.value.status == 400
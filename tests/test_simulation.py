@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from src.simulation import BATCH_SIZE, Simulation, simulate
+
+
+@pytest.fixture
+def sim()-> Simulation:
+    return Simulation(
+        amount=1000,
+        price=95.0,
+        times=np.array([0.5, 1.5, 2.5, 3.5]),
+        cash_flows=np.array([5.0, 5.0, 5.0, 105.0]),
+        default_probability=0.02,
+    )
+
+def test_same_seed_gives_the_same_paths_for_any_worker_count(sim):
+    paths = 2 * BATCH_SIZE + 500
+    single = simulate(sim, paths, workers=1, seed=7)
+
+    assert len(single) == paths
+    assert np.array_equal(single, simulate(sim, paths, workers=2, seed=7))
+    assert np.array_equal(single, simulate(sim, paths, workers=3, seed=7))
+    assert not np.array_equal(single, simulate(sim, paths, workers=1, seed=8))
+
+def test_without_reinvesting_coupons_are_kept_as_cash(sim):
+    sim.reinvest, sim.default_probability = False, 0.0
+    wealth = simulate(sim, 1000, seed=0)
+
+    assert wealth == pytest.approx(np.full(1000, 1000 / 95.0 * 120.0))
+
+def test_reinvesting_at_a_positive_rate_earns_more(sim):
+    sim.default_probability, sim.rate_volatility = 0.0, 0.0
+    reinvested = simulate(sim, 1000, seed=0)
+    sim.reinvest = False
+
+    assert (reinvested > simulate(sim, 1000, seed=0)).all()
+
+def test_defaults_recover_part_of_the_nominal(sim):
+    sim.reinvest, sim.default_probability = False, 0.5
+    wealth = simulate(sim, 5000, seed=0)
+
+    assert wealth.min() >= 1000 / 95.0 * 100 * sim.recovery
+    assert wealth.max() == pytest.approx(1000 / 95.0 * 120.0)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from src.bonds import Bonds, SORT_KEYS, parse_sort
+from src.loader import load_columns
+
+
+@pytest.fixture
+def universe(market)-> Bonds:
+    return Bonds.from_columns(load_columns(str(market), False))
+
+SPECS = ["yield", "risk:asc", "yield:desc,risk:asc", "score:asc,length:desc,yield", "maturity:asc"]
+
+@pytest.mark.parametrize("spec", SPECS)
+@pytest.mark.parametrize("count", [1, 5, 20, 1000])
+def test_top_is_the_head_of_the_full_sort(universe, spec, count):
+    sorted_ = Bonds.from_columns(universe.columns)
+    sorted_.sort_by(parse_sort(spec))
+
+    assert universe.top(count, parse_sort(spec)).to_tickers() == sorted_.to_tickers()[:count]
+
+@pytest.mark.parametrize("spec", SPECS)
+def test_sort_orders_every_key_in_turn(universe, spec):
+    parsed = parse_sort(spec)
+    universe.sort_by(parsed)
+    keys = [ np.asarray(SORT_KEYS[name](universe.columns), dtype=np.float64) for name, _ in parsed ]
+    keys = [ -k if direction == "desc" else k for k, (_, direction) in zip(keys, parsed) ]
+    rows = list(zip(*[ k.tolist() for k in keys ]))
+
+    assert rows == sorted(rows)
+
+def test_ties_keep_their_order_in_both_directions(universe):
+    order = universe.to_tickers()
+    for direction in ["asc", "desc"]:
+        b = Bonds.from_columns(universe.columns)
+        b.sort_by([("score", direction)])
+        scores = b.columns.rating_score()
+        tickers = b.to_tickers()
+        for score in set(scores.tolist()):
+            tied = [ t for t, s in zip(tickers, scores) if s == score ]
+            assert tied == [ t for t in order if t in tied ]
+
+def test_parse_sort_defaults_and_errors():
+    assert parse_sort("yield, risk:asc", "asc") == [("yield", "asc"), ("risk", "asc")]
+    assert parse_sort("yield") == [("yield", "desc")]
+
+    with pytest.raises(ValueError):
+        parse_sort("price")
+
+    with pytest.raises(ValueError):
+        parse_sort("yield:up")
@@ -0,0 +1,31 @@
+import subprocess
+import sys
+import pytest
+from conftest import ROOT
+from src.bond import prep_country
+from src.countries import COUNTRIES, generate_countries
+
+
+HEAVY_MODULES = ["numpy", "pandas", "pycountry"]
+
+
+def imported_after(code: str)-> list:
+    check = f"{code}; import sys; print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules), file=sys.stderr)"
+    out = subprocess.run([sys.executable, "-c", check], cwd=ROOT, check=True, capture_output=True, text=True)
+
+    return out.stderr.split()
+
+def test_cli_import_leaves_heavy_modules_out():
+    assert imported_after("import src.__main__") == []
+
+def test_help_leaves_heavy_modules_out():
+    assert imported_after("from src.__main__ import cli; cli(['--help'], standalone_mode=False)") == []
+
+def test_country_table_is_up_to_date():
+    pytest.importorskip("pycountry")
+
+    assert COUNTRIES == generate_countries()
+
+@pytest.mark.parametrize("name, code", [("UK", "GB"), ("USA", "US"), ("France", "FR"), ("Atlantis", "Atlantis")])
+def test_country_names_map_to_codes(name, code):
+    assert prep_country(name) == code
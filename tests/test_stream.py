@@ -0,0 +1,19 @@
+import io
+from src.bonds import Bonds
+from src.loader import load_columns
+from src.stream import filter_chunks, read_chunks
+
+
+def test_small_chunks_give_the_rows_of_one_pass(market):
+    plan = Bonds().only_coupon_gt(0.05).only_available().plan
+    with open(market, newline="") as f:
+        chunks = list(filter_chunks(read_chunks(f, 7), plan))
+
+    expected = load_columns(str(market), False, plan)
+    assert sum(len(c) for c in chunks) == len(expected)
+    assert [ isin for c in chunks for isin in c["isin"].tolist() ] == expected["isin"].tolist()
+
+def test_read_chunks_skips_the_header_and_splits_rows():
+    f = io.StringIO("a,b\n1,2\n3,4\n5,6\n")
+
+    assert list(read_chunks(f, 2)) == [[["1", "2"], ["3", "4"]], [["5", "6"]]]
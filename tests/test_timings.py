@@ -0,0 +1,64 @@
+import json
+import tracemalloc
+import pytest
+from click.testing import CliRunner
+from src import timings
+from src.__main__ import cli
+
+
+@pytest.fixture(autouse=True)
+def recording():
+    timings.reset()
+    yield
+    timings.disable()
+    timings.reset()
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+def by_name():
+    return { s.name: s for s in timings.stages() }
+
+def test_nothing_is_recorded_while_disabled():
+    with timings.stage("parse", 10) as s:
+        s.rows = 20
+
+    assert timings.stages() == []
+
+def test_nested_and_repeated_stages_add_up():
+    timings.enable(memory=False)
+    with timings.stage("load"):
+        for n in [3, 4]:
+            with timings.stage("parse", n):
+                pass
+
+    with timings.stage("write") as s:
+        s.rows = 5
+
+    stages = by_name()
+    assert [ s.name for s in timings.stages() ] == ["load", "parse", "write"]
+    assert (stages["parse"].depth, stages["parse"].calls, stages["parse"].rows) == (1, 2, 7)
+    assert stages["load"].wall >= stages["parse"].wall
+    assert stages["write"].rows == 5
+    assert stages["load"].peak is None
+
+def test_allocations_are_traced():
+    timings.enable()
+    with timings.stage("outer"):
+        with timings.stage("inner"):
+            block = bytearray(4 * 2**20)
+        del block
+
+    stages = by_name()
+    assert stages["inner"].peak >= 4 * 2**20
+    assert stages["outer"].peak >= stages["inner"].peak
+    assert stages["inner"].allocated >= 4 * 2**20
+
+def test_cli_prints_json_timings_to_stderr(market):
+    result = CliRunner().invoke(cli, ["--no-cache", "--timings", "--timings-format", "json", "filter", "-c", "0.05", str(market)])
+    assert result.exit_code == 0, result.output
+
+    stages = { s["name"]: s for s in json.loads(result.stderr.strip().splitlines()[-1]) }
+    assert stages["csv read"]["rows"] > 0
+    assert "parse" in stages
+    assert "dataframe build" in stages
+    assert "Company" not in result.stderr
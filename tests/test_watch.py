@@ -0,0 +1,68 @@
+import io
+import json
+import pytest
+from conftest import write_market
+from src import clock
+from src.watch import Watcher, load_screens
+
+
+def events_of(events):
+    return sorted((e["screen"], e["event"], e["key"]) for e in events)
+
+@pytest.fixture
+def watcher(tmp_path):
+    screens = tmp_path / "screens.json"
+    screens.write_text(json.dumps({ "high": { "coupon": 0.07 }, "short": { "maturity_months": 12 } }))
+    # Unpinned, so each snapshot is screened as of the date in its name.
+    clock.set_as_of(None)
+
+    return Watcher(str(tmp_path), load_screens(str(screens)), io.StringIO())
+
+def test_events_across_two_snapshots(tmp_path, watcher):
+    first = tmp_path / "wisealpha_market_221109.csv"
+    write_market(first, [
+        { "isin": "X1", "coupon": "8%" },
+        { "isin": "X2", "coupon": "8%" },
+        { "isin": "X3", "coupon": "8%" },
+        { "isin": "X4", "coupon": "4%" },
+        { "isin": "X5", "coupon": "8%" },
+        { "isin": "X6", "maturity": "01-12-2023" },
+    ])
+    second = tmp_path / "wisealpha_market_221215.csv"
+    write_market(second, [
+        { "isin": "X1", "coupon": "8%", "price": "97" },
+        { "isin": "X2", "coupon": "4%" },
+        { "isin": "X4", "coupon": "9%" },
+        { "isin": "X5", "coupon": "8%" },
+        { "isin": "X6", "maturity": "01-12-2023" },
+    ])
+
+    assert events_of(watcher.ingest(str(first))) == [
+        ("high", "match", "X1"),
+        ("high", "match", "X2"),
+        ("high", "match", "X3"),
+        ("high", "match", "X5"),
+    ]
+
+    events = watcher.ingest(str(second))
+    assert events_of(events) == [
+        ("high", "match", "X4"),
+        ("high", "unmatch", "X2"),
+        ("high", "unmatch", "X3"),
+        ("high", "update", "X1"),
+        # Unchanged, but 11 months from maturity once the as of date moved.
+        ("short", "match", "X6"),
+    ]
+
+    update = next(e for e in events if e["event"] == "update")
+    assert update["bond"]["Isin"] == "X1"
+    assert update["bond"]["Price"] == 97
+    assert "Id" not in update["bond"]
+
+def test_unchanged_snapshot_has_no_events(tmp_path, watcher):
+    bonds = [ { "isin": "X1", "coupon": "8%" }, { "isin": "X2" } ]
+    write_market(tmp_path / "wisealpha_market_221109.csv", bonds)
+    write_market(tmp_path / "wisealpha_market_221110.csv", bonds)
+
+    assert len(watcher.ingest(str(tmp_path / "wisealpha_market_221109.csv"))) == 1
+    assert watcher.ingest(str(tmp_path / "wisealpha_market_221110.csv")) == []